@@ -1,37 +1,35 @@
-
 # pylint: disable=invalid-name,too-few-public-methods,eval-used
 """
 The basic building blocks and utilities for graph queries are
 contained in this default import.
 """
 from itertools import repeat
+from os import getenv, getpid, register_at_fork
 from pathlib import Path
-from functools import reduce
-from json import dumps
-
-from connexion import App
-from flask_cors import CORS
-from prance import ResolvingParser, ValidationError
+from threading import Lock, Thread
+from time import sleep, monotonic, perf_counter
+from collections import Counter, OrderedDict
+import atexit
+from functools import reduce, partial, lru_cache
+from json import dumps, loads
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from hashlib import sha256
 
 from typing import Callable, Generator, Any
 
-from neo4j import Driver, GraphDatabase
+from neo4j import Driver, GraphDatabase, READ_ACCESS, WRITE_ACCESS
 from retry import retry
 from requests import post
 
-from datetime import datetime, date
-from collections import deque
-from multiprocessing import Pool
-from itertools import repeat
-from decimal import Decimal
-from typing import Coroutine, Any
-from asyncio import new_event_loop, set_event_loop, BaseEventLoop
-from json import dumps
+from contextvars import ContextVar
+from re import compile as regex
 
 import operator
 import pathlib
 from yaml import Loader, load as load_yml
 
+from bathysphere.monitoring import Registry
+
 def loadAppConfig(sources: (str) = ("bathysphere.yml", )) -> dict:
     """
     Load known entities and services at initialization.
@@ -112,9 +110,9 @@ def processKeyValueInbound(keyValue: (str, Any), null: bool = False) -> str or N
 
             coord = value["coordinates"]
             if len(coord) == 2:
-                values = f"x: {coord[1]}, y: {coord[0]}, crs:'wgs-84'"  
+                values = f"x: {coord[0]}, y: {coord[1]}, crs:'wgs-84'"  
             elif len(coord) == 3:
-                values = f"x: {coord[1]}, y: {coord[0]}, z: {coord[2]}, crs:'wgs-84-3d'"
+                values = f"x: {coord[0]}, y: {coord[1]}, z: {coord[2]}, crs:'wgs-84-3d'"
             else:
                 # TODO: deal with location stuff in a different way, and don't auto include
                 # the point type in processKeyValueOutbound. Seems to work for matching now.
@@ -146,36 +144,481 @@ def processKeyValueInbound(keyValue: (str, Any), null: bool = False) -> str or N
     return None
 
 
+def processValueParameter(keyValue: (str, Any)) -> Any:
+    """
+    Convert a value into the type sent to Neo4j as a query parameter.
+
+    GeoJSON Points become maps for the Cypher `point()` function, and other
+    collections are serialized as JSON strings, the same as for inline values.
+    """
+    key, value = keyValue
+    if "location" in key and isinstance(value, dict) and value.get("type") == "Point":
+        coord = value["coordinates"]
+        if len(coord) == 2:
+            return {"x": coord[0], "y": coord[1], "crs": "wgs-84"}
+        if len(coord) == 3:
+            return {"x": coord[0], "y": coord[1], "z": coord[2], "crs": "wgs-84-3d"}
+        return None
+
+    if isinstance(value, (list, tuple, dict)):
+        return dumps(value)
+
+    return value
+
+
+def processKeyValueParameter(
+    keyValue: (str, Any), symbol: str, parameters: dict
+) -> str or None:
+    """
+    Convert a String key and Any value into a Cypher representation that
+    refers to a `$` query parameter, and insert the value into `parameters`.
+
+    The query text only depends on the keys, so Neo4j can reuse the cached
+    plan for every request with the same shape.
+    """
+    key, value = keyValue
+    if key[0] == "_":
+        return None
+
+    converted = processValueParameter(keyValue)
+    if converted is None:
+        return None
+
+    name = f"{symbol}_{key}"
+    parameters[name] = converted
+    if isinstance(converted, dict):  # only Points are converted to maps
+        return f"{key}: point(${name})"
+    return f"{key}: ${name}"
+
+
+def encodeCursor(orderBy: str, after: (Any, str)) -> str:
+    """
+    Encode the sort order, and the sort value and `uuid` of the last item of a page,
+    as an opaque token for requesting the next page.
+    """
+    return urlsafe_b64encode(dumps([orderBy, *after]).encode()).decode()
+
+
+def decodeCursor(cursor: str) -> (str, (Any, str)):
+    """
+    Get the sort order and the position in it back from a page token.
+    """
+    try:
+        orderBy, value, uuid = loads(urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return orderBy, (value, uuid)
+
+
+metrics = Registry(
+    directory=getenv("METRICS_DIR"), interval=float(getenv("METRICS_INTERVAL", "5"))
+)
+metrics.histogram(
+    "bathysphere_session_acquire_seconds",
+    "Time until a transaction begins, including acquiring a pooled connection.",
+)
+metrics.histogram("bathysphere_transaction_seconds", "Duration of transactions.")
+metrics.counter(
+    "bathysphere_transaction_retries_total", "Transaction attempts retried by the driver."
+)
+metrics.counter("bathysphere_transaction_errors_total", "Transactions that failed.")
+metrics.counter("bathysphere_connections_total", "Attempts to create a driver.")
+metrics.histogram("bathysphere_connect_seconds", "Time to create a driver.")
+metrics.gauge("bathysphere_pool_connections", "Connections in the pools of shared drivers.")
+
+
+def measured(transact: Callable, method: Callable, mode: str, **kwargs: Any) -> Any:
+    """
+    Run a transaction function with `read_transaction` or `write_transaction`, and
+    record the time until the first attempt began, the number of retries, and the
+    total duration.
+    """
+    attempts = []
+    start = perf_counter()
+
+    def _attempt(tx: Any, **kw: Any) -> Any:
+        attempts.append(perf_counter())
+        return method(tx, **kw)
+
+    try:
+        return transact(_attempt, **kwargs)
+    except Exception:
+        metrics.inc("bathysphere_transaction_errors_total", mode=mode)
+        raise
+    finally:
+        if attempts:
+            metrics.observe("bathysphere_session_acquire_seconds", attempts[0] - start, mode=mode)
+        if len(attempts) > 1:
+            metrics.inc("bathysphere_transaction_retries_total", len(attempts) - 1, mode=mode)
+        metrics.observe("bathysphere_transaction_seconds", perf_counter() - start, mode=mode)
+
+
 def executeQuery(
     db: Driver, method: Callable, kwargs: (dict,)=(), read_only: bool = True
 ) -> None or (Any,):
     """
     Execute one or more cypher queries in an equal number of transactions against the
     Neo4j graph database.
+
+    If `db` is a `UnitOfWork`, write queries are added to it instead, and return nothing.
     """
+    if isinstance(db, UnitOfWork):
+        return db.add(method, kwargs, read_only)
+    mode = "read" if read_only else "write"
+    if _profile.get() is not None or SLOW_QUERY_SECONDS is not None:
+        method = traced(method, mode)
     with db.session() as session:
         _transact = session.read_transaction if read_only else session.write_transaction
         if kwargs:
-            return [_transact(method, **each) for each in kwargs]
-        return _transact(method)
+            return [measured(_transact, method, mode, **each) for each in kwargs]
+        return measured(_transact, method, mode)
+
+
+SLOW_QUERY_SECONDS = (
+    float(getenv("SLOW_QUERY_SECONDS")) if getenv("SLOW_QUERY_SECONDS") else None
+)
+_profile: ContextVar = ContextVar("profile", default=None)
+_literals = regex(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b")
+
+
+@lru_cache(maxsize=1024)
+def normalizeStatement(query: str) -> str:
+    """
+    Statement text with literal strings and numbers replaced by `?`, and whitespace
+    collapsed, so that statements that differ only in values are counted together.
+    """
+    return " ".join(_literals.sub("?", query).split())
+
+
+class TracedResult:
+    """
+    Result of a statement, which counts the records that are read, and keeps the
+    summary once consumed. Other attributes are those of the driver result.
+    """
+
+    def __init__(self, result: Any, query: str, parameters: dict, mode: str, start: float):
+        self._result = result
+        self.query = query
+        self.parameters = sum(
+            len(value) if isinstance(value, (list, tuple)) else 1
+            for value in parameters.values()
+        )
+        self.mode = mode
+        self.rows = 0
+        self.seconds = None
+        self.summary = None
+        self._start = start
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._result, name)
+
+    def __iter__(self) -> Generator:
+        for record in self._result:
+            self.rows += 1
+            yield record
+
+    def single(self) -> Any:
+        record = self._result.single()
+        self.rows += record is not None
+        return record
+
+    def values(self, *keys: str) -> [list]:
+        values = self._result.values(*keys)
+        self.rows += len(values)
+        return values
+
+    def data(self, *keys: str) -> [dict]:
+        data = self._result.data(*keys)
+        self.rows += len(data)
+        return data
+
+    def consume(self) -> Any:
+        if self.summary is None:
+            self.summary = self._result.consume()
+            self.seconds = perf_counter() - self._start
+        return self.summary
+
+    def stats(self) -> dict:
+        """
+        Statement, number of parameter values (counting the items of lists), records
+        read, and the time from running the statement until the result was consumed,
+        in seconds. The `server`
+        time is reported by the database, in milliseconds.
+        """
+        summary = self.consume()
+        return {
+            "statement": normalizeStatement(self.query),
+            "mode": self.mode,
+            "parameters": self.parameters,
+            "rows": self.rows,
+            "server": (getattr(summary, "result_available_after", None) or 0)
+            + (getattr(summary, "result_consumed_after", None) or 0),
+            "seconds": self.seconds,
+        }
+
+
+class TracedTransaction:
+    """
+    Transaction, or session, that traces the results of the statements it runs.
+    """
+
+    def __init__(self, tx: Any, mode: str):
+        self._tx = tx
+        self.mode = mode
+        self.results = []
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._tx, name)
+
+    def run(self, query: str, parameters: dict = None, **kwparameters: Any) -> TracedResult:
+        parameters = {**(parameters or {}), **kwparameters}
+        start = perf_counter()
+        result = TracedResult(
+            self._tx.run(query, parameters), query, parameters, self.mode, start
+        )
+        self.results.append(result)
+        return result
+
+    def report(self) -> None:
+        """
+        Add the statements to the active `QueryProfile`, and print those slower than
+        `SLOW_QUERY_SECONDS` as JSON lines. Results that were not consumed are
+        consumed now.
+        """
+        profile = _profile.get()
+        for result in self.results:
+            stats = result.stats()
+            if profile is not None:
+                profile.record(stats)
+            if SLOW_QUERY_SECONDS is not None and stats["seconds"] >= SLOW_QUERY_SECONDS:
+                print(dumps({"slowQuery": stats}))
+        self.results = []
+
+
+def traced(method: Callable, mode: str) -> Callable:
+    """
+    Wrap a transaction function, so that its statements are reported when it returns.
+    Attempts that fail, and are retried by the driver, are not reported.
+    """
+    def _traced(tx: Any, **kwargs: Any) -> Any:
+        tracer = TracedTransaction(tx, mode)
+        result = method(tracer, **kwargs)
+        tracer.report()
+        return result
+    return _traced
+
+
+class QueryProfile:
+    """
+    Statements run by `executeQuery` and `streamQuery` while the profile is active,
+    for example during one request.
+
+    As a context manager, the profile is active in the current context until exit.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.seconds = 0.0
+        self._start = None
+        self._token = None
+        self._lock = Lock()
+
+    def __enter__(self) -> "QueryProfile":
+        self._start = perf_counter()
+        self._token = _profile.set(self)
+        return self
+
+    def __exit__(self, *_: Any) -> bool:
+        _profile.reset(self._token)
+        self._token = None
+        self.seconds = perf_counter() - self._start
+        return False
+
+    def record(self, stats: dict) -> None:
+        """
+        Add the statistics of a statement, see `TracedResult.stats`.
+        """
+        with self._lock:
+            self.statements.append(stats)
+
+    def stats(self) -> dict:
+        """
+        Totals of the statements, and the normalized statements that ran more than
+        once, which are candidates for batching.
+        """
+        with self._lock:
+            statements = list(self.statements)
+        counts = Counter(each["statement"] for each in statements)
+        return {
+            "count": len(statements),
+            "writes": sum(each["mode"] == "write" for each in statements),
+            "rows": sum(each["rows"] for each in statements),
+            "seconds": sum(each["seconds"] for each in statements),
+            "server": sum(each["server"] for each in statements),
+            "repeated": {key: count for key, count in counts.items() if count > 1},
+        }
+
+    def header(self) -> str:
+        """
+        Value of a `Server-Timing` header, with the time spent on statements as `db`,
+        the part reported by the database as `db-server`, and the whole as `total`,
+        in milliseconds. The description counts statements, and repeats of the same
+        normalized statement.
+        """
+        stats = self.stats()
+        total = perf_counter() - self._start if self._token else self.seconds
+        repeats = sum(stats["repeated"].values()) - len(stats["repeated"])
+        description = f'{stats["count"]} queries' + (f", {repeats} repeated" if repeats else "")
+        return (
+            f'db;dur={stats["seconds"] * 1000:.1f};desc="{description}", '
+            f'db-server;dur={stats["server"]:.1f}, '
+            f"total;dur={total * 1000:.1f}"
+        )
+
+
+
+class UnitOfWork:
+    """
+    Write queries to commit together, in one transaction.
+
+    Give the unit as the `db` of methods like `Entity.create` and `Link.join`, and their
+    queries are kept until `commit`, instead of each running in a transaction of its own.
+    As a context manager, the unit commits on exit, unless an exception was raised, in
+    which case nothing is written.
+
+    Read queries cannot be added, since they would not see the uncommitted writes.
+    """
+
+    def __init__(self, db: Driver):
+        self.db = db
+        self.methods = []
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, kind: type, *_: Any) -> bool:
+        if kind is None:
+            self.commit()
+        else:
+            self.methods = []
+        return False
+
+    def add(self, method: Callable, kwargs: (dict,) = (), read_only: bool = False) -> None:
+        """
+        Keep a query for the transaction, once for each of `kwargs` if there are any.
+        """
+        if read_only:
+            raise ValueError("Read queries cannot be added to a unit of work.")
+        self.methods.extend(partial(method, **each) for each in kwargs or ({},))
+
+    def commit(self) -> None:
+        """
+        Run the queries in order in one write transaction, which is retried as a whole
+        if it fails with a transient error. Results that are still open are consumed,
+        while methods that read their results, like `Entity.delete`, return values.
+        """
+        methods, self.methods = self.methods, []
+
+        def _run(tx) -> None:
+            for method in methods:
+                result = method(tx)
+                if hasattr(result, "consume"):
+                    result.consume()
+
+        if methods:
+            executeQuery(self.db, _run, read_only=False)
+
+
+def streamQuery(
+    db: Driver, method: Callable, read_only: bool = True, fetchSize: int = 1000
+) -> Generator:
+    """
+    Execute a cypher query in an auto-commit transaction, and yield records as they
+    are pulled from the result cursor, in batches of `fetchSize`.
+
+    The `method` has the same signature as for `executeQuery`, but receives the session.
+    The session stays open until the generator is exhausted or closed, so that large
+    results are never held in memory at once.
+    """
+    with db.session(
+        default_access_mode=READ_ACCESS if read_only else WRITE_ACCESS,
+        fetch_size=fetchSize,
+    ) as session:
+        if _profile.get() is None and SLOW_QUERY_SECONDS is None:
+            yield from method(session)
+            return
+        tracer = TracedTransaction(session, "read" if read_only else "write")
+        try:
+            yield from method(tracer)
+        finally:
+            tracer.report()
+
+
+
+def writeColumns(
+    db: Driver, cmd: str, columns: dict, chunkSize: int = 10000, **parameters: dict
+) -> dict:
+    """
+    Run a write query once for each chunk of `chunkSize` rows of some columns of equal
+    length, each in its own transaction. The query should `UNWIND range(0, size($...) - 1)`
+    over one of the columns, which are NumPy arrays or lists.
+
+    Returns the throughput, see `Meter`.
+    """
+    total = len(next(iter(columns.values())))
+    meter = Meter()
+    for start in range(0, total, chunkSize):
+        chunk = {
+            key: list(values[start:start + chunkSize]) if isinstance(values, list)
+            else values[start:start + chunkSize].tolist()
+            for key, values in columns.items()
+        }
+        began = perf_counter()
+        executeQuery(
+            db=db,
+            read_only=False,
+            method=lambda tx: tx.run(cmd, {**parameters, **chunk}).consume(),
+        )
+        meter.record(min(chunkSize, total - start), perf_counter() - began)
+    return meter.stats()
 
 
 @retry(tries=2, delay=1, backoff=1)
-def connect(host: str, port: int, accessKey: str, default: str = "neo4j") -> Driver:
+def connect(
+    host: str, port: int, accessKey: str, default: str = "neo4j", **options: dict
+) -> Driver:
     """
     Connect to a database manager. Try docker networking, or fallback to local host.
     likely that the db has been accessed and setup previously
 
+    Additional `options` are passed to the driver, for configuring the connection pool.
+    Use `getDriver` to share one driver within a process.
+
+    The `memory` host is an in-memory stand-in (`bathysphere.memory.MemoryDriver`) that
+    records queries instead of running them, and waits `MEMORY_DRIVER_LATENCY` seconds
+    for each.
+
     TODO: should use SSL, but Neo4j 4.0 introduced some bugs
     https://community.neo4j.com/t/neo4j-python-driver-throwing-errors/13822/2
     """
+    if host == "memory":
+        from bathysphere.memory import MemoryDriver  # pylint: disable=import-outside-toplevel
+        return MemoryDriver(latency=float(getenv("MEMORY_DRIVER_LATENCY", "0")))
+
     db = None
     for auth in ((default, accessKey), (default, default)):
+        start = perf_counter()
         try:
-            db = GraphDatabase.driver(uri=f"bolt://{host}:{port}", auth=auth, encrypted=False)
+            db = GraphDatabase.driver(
+                uri=f"bolt://{host}:{port}", auth=auth, encrypted=False, **options
+            )
         except Exception as ex:  # pylint: disable=broad-except
             print(f"{ex} on {host}:{port} with {auth}")
+            metrics.inc("bathysphere_connections_total", outcome="failed")
             continue
+        finally:
+            metrics.observe("bathysphere_connect_seconds", perf_counter() - start)
+        metrics.inc("bathysphere_connections_total", outcome="connected")
         if auth == (default, default) and accessKey != default:
             response = post(
                 f"http://{host}:7474/user/neo4j/password",
@@ -190,167 +633,410 @@ def connect(host: str, port: int, accessKey: str, default: str = "neo4j") -> Dri
         print(f"Could not connect to Neo4j database @ {host}:{port}")
 
 
+DRIVER_OPTIONS = {
+    "max_connection_pool_size": int(getenv("NEO4J_POOL_SIZE", "20")),
+    "max_connection_lifetime": int(getenv("NEO4J_CONNECTION_LIFETIME", "3600")),
+    "connection_acquisition_timeout": int(getenv("NEO4J_ACQUISITION_TIMEOUT", "60")),
+}
+_drivers: dict = dict()
+_forkedDrivers: list = []
+_driversLock = Lock()
+
+
+def getDriver(host: str, port: int, accessKey: str, **options: dict) -> Driver or None:
+    """
+    Get the process-wide `Driver` for a database, connecting on first use.
+
+    All handlers and commands share one connection pool per process, so only the
+    first call pays for connecting. Pool settings come from `DRIVER_OPTIONS`, which
+    reads the `NEO4J_POOL_SIZE`, `NEO4J_CONNECTION_LIFETIME` and
+    `NEO4J_ACQUISITION_TIMEOUT` environment variables, and can be overridden
+    with keyword arguments.
+
+    Failed connections are not cached, so the next call will try again.
+    """
+    key = (host, port, accessKey)
+    with _driversLock:
+        db = _drivers.get(key)
+        if db is None:
+            db = connect(host, port, accessKey, **{**DRIVER_OPTIONS, **options})
+            if db is not None:
+                _drivers[key] = db
+    return db
+
+
+def closeDrivers() -> None:
+    """
+    Close and forget all shared drivers in this process.
+    """
+    with _driversLock:
+        while _drivers:
+            _, db = _drivers.popitem()
+            db.close()
+
+
+def _forgetDriversAfterFork() -> None:
+    """
+    Forked workers (e.g. `gunicorn --preload`) must not use or close the sockets
+    of the parent's pool. Keep a reference so the drivers are not garbage collected,
+    which would close the connections, and connect again on first use.
+    """
+    global _driversLock  # pylint: disable=global-statement
+    _driversLock = Lock()
+    _forkedDrivers.extend(_drivers.values())
+    _drivers.clear()
+
+
+register_at_fork(after_in_child=_forgetDriversAfterFork)
+
+
+class TimedCache:
+    """
+    Bounded, thread-safe mapping whose items expire `ttl` seconds after being stored.
+    When full, the least recently used item is evicted.
+
+    Hits and misses are counted for monitoring.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Any) -> Any or None:
+        """
+        Get a value that has not expired, or None.
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < monotonic():
+                self._items.pop(key, None)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Any, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used if full.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = (monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, predicate: Callable = None) -> int:
+        """
+        Remove values for which the predicate is true, or all of them.
+        Returns the number removed.
+        """
+        with self._lock:
+            keys = [
+                key for key, (_, value) in self._items.items()
+                if predicate is None or predicate(value)
+            ]
+            for key in keys:
+                del self._items[key]
+        return len(keys)
+
+    def stats(self) -> dict:
+        """
+        Counters for monitoring.
+        """
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+class Meter:
+    """
+    Thread-safe totals of items processed, time spent, and requests turned away,
+    for monitoring throughput.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.rejected = 0
+        self._lock = Lock()
+
+    def record(self, count: int, seconds: float) -> None:
+        """
+        Add processed items and elapsed time.
+        """
+        with self._lock:
+            self.count += count
+            self.seconds += seconds
+
+    def reject(self) -> None:
+        """
+        Count a request that was turned away.
+        """
+        with self._lock:
+            self.rejected += 1
+
+    def stats(self) -> dict:
+        """
+        Counters for monitoring, and the mean rate while busy.
+        """
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "rejected": self.rejected,
+            "rate": self.count / self.seconds if self.seconds else 0.0,
+        }
+
+
+def quoteName(name: str) -> str:
+    """
+    Label or relationship type read from the database, quoted to be written into a query.
+    """
+    return "`" + name.replace("`", "``") + "`"
+
+
+class RankAccumulator:
+    """
+    Aggregate `rank` increments of relationships in memory, and write them in one
+    transaction every `interval` seconds from a background thread.
+
+    Read queries stay read-only, and many requests for the same entity become a single
+    update. Counts that have not been flushed are lost if the process is killed.
+    """
+
+    def __init__(self, interval: float = 10.0, enabled: bool = True):
+        """
+        Counting can be disabled, in which case increments are ignored.
+        """
+        self.interval = interval
+        self.enabled = enabled
+        self._reset()
+
+    def _reset(self) -> None:
+        """
+        Forget pending counts and the flushing thread, e.g. after forking.
+        """
+        self._lock = Lock()
+        self._annotations: dict = dict()
+        self._traversals: dict = dict()
+        self._thread = None
+
+    def _start(self) -> None:
+        """
+        Start the flushing thread in this process, if it is not running.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def _loop():
+            while True:
+                sleep(self.interval)
+                self.flush()
+
+        self._thread = Thread(target=_loop, daemon=True)
+        self._thread.start()
+
+    def annotate(
+        self, db: Driver, label: str, annotate: str, user: str, nodes: (str,)
+    ) -> None:
+        """
+        Count that a user retrieved nodes, for example with a `Get` relationship.
+        """
+        if not self.enabled or not user:
+            return
+        with self._lock:
+            counts = self._annotations.setdefault((db, label, annotate), Counter())
+            counts.update((user, node) for node in nodes if node)
+            self._start()
+
+    def traverse(self, db: Driver, relationships: ((str, str, str, str, str),)) -> None:
+        """
+        Count traversals of relationships, by the label and `uuid` of the start node,
+        the type, and the label and `uuid` of the end node. Internal identifiers are
+        not used, since Neo4j reuses them after a delete, before counts are written.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._traversals.setdefault(db, Counter()).update(
+                tuple(each) for each in relationships if each and all(each)
+            )
+            self._start()
+
+    def flush(self) -> int:
+        """
+        Write pending counts, with one `UNWIND` query per relationship type and
+        one transaction per database. Returns the number of updated relationships.
+        """
+        with self._lock:
+            annotations, self._annotations = self._annotations, dict()
+            traversals, self._traversals = self._traversals, dict()
+
+        queries = dict()
+        for (db, label, annotate), counts in annotations.items():
+            entity = "" if label == "Entity" else f":{label}"
+            cmd = (
+                "UNWIND $rows AS row "
+                f"MATCH (u:User {{ uuid: row.user }}), (n{entity} {{ uuid: row.node }}) "
+                f"MERGE (n)<-[r:{annotate}]-(u) "
+                "ON CREATE SET r.rank = row.count "
+                "ON MATCH SET r.rank = coalesce(r.rank, 0) + row.count"
+            )
+            rows = [
+                {"user": user, "node": node, "count": count}
+                for (user, node), count in counts.items()
+            ]
+            queries.setdefault(db, []).append((cmd, rows))
+
+        for db, counts in traversals.items():
+            grouped = dict()
+            for (start, a, kind, end, b), count in counts.items():
+                grouped.setdefault((start, kind, end), []).append(
+                    {"a": a, "b": b, "count": count}
+                )
+            for (start, kind, end), rows in grouped.items():
+                start, kind, end = (quoteName(each) for each in (start, kind, end))
+                cmd = (
+                    "UNWIND $rows AS row "
+                    f"MATCH (a:{start} {{ uuid: row.a }})-[r:{kind}]->(b:{end} {{ uuid: row.b }}) "
+                    "SET r.rank = coalesce(r.rank, 0) + row.count"
+                )
+                queries.setdefault(db, []).append((cmd, rows))
+
+        total = 0
+        for db, statements in queries.items():
+
+            def _write(tx):
+                for cmd, rows in statements:
+                    tx.run(cmd, {"rows": rows})
+
+            try:
+                executeQuery(db, _write, read_only=False)
+            except Exception as ex:  # pylint: disable=broad-except
+                print(f"Could not flush rank counts: {ex}")
+                continue
+            total += sum(len(rows) for _, rows in statements)
+        return total
+
+
+ranks = RankAccumulator(
+    interval=float(getenv("RANK_FLUSH_INTERVAL", "10")),
+    enabled=getenv("RANK_COUNTING", "true").lower() not in ("0", "false", "no"),
+)
+register_at_fork(after_in_child=ranks._reset)  # pylint: disable=protected-access
+atexit.register(ranks.flush)
+register_at_fork(after_in_child=metrics._reset)  # pylint: disable=protected-access
+atexit.register(metrics.dump)
+
+
+@metrics.collect
+def poolConnections() -> Generator:
+    """
+    Connections in use and idle, in the pools of the drivers shared by `getDriver`.
+    """
+    counts = Counter()
+    for db in list(_drivers.values()):
+        pool = getattr(db, "_pool", None)
+        for connections in list(getattr(pool, "connections", {}).values()):
+            counts.update("in_use" if each.in_use else "idle" for each in list(connections))
+    for state in ("in_use", "idle"):
+        yield "bathysphere_pool_connections", {"state": state}, counts[state]
+
+
 __pdoc__ = {
     "test": False
     # submodules will be skipped in doc generation
 }
-app = App(__name__, options={"swagger_ui": False})
-CORS(app.app)
+SPEC_CACHE = getenv("SPEC_CACHE", str(Path.home() / ".cache" / "bathysphere"))
+
+
+def loadSpecification(path: str, cache: str = SPEC_CACHE) -> dict:
+    """
+    Resolve and validate the OpenAPI specification.
+
+    The resolved document is cached as JSON in the `cache` directory, under the hash of
+    the source file, so that only the first process to start after the specification
+    changes pays for parsing it. An empty `cache` disables this.
+    """
+    source = Path(path).absolute()
+    try:
+        digest = sha256(source.read_bytes()).hexdigest()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Specification not found: {path}")
+
+    cached = Path(cache) / f"{source.stem}-{digest}.json" if cache else None
+    if cached is not None:
+        try:
+            with open(cached, "r") as fid:
+                return loads(fid.read())
+        except (OSError, ValueError):
+            pass
+
+    from prance import ResolvingParser, ValidationError
 
-try:
-    appConfig = loadAppConfig()
-    services = filter(
-        lambda x: "bathysphere-api" == x["spec"]["name"], appConfig["Locations"]
+    try:
+        parser = ResolvingParser(str(source), lazy=True, strict=True)
+        parser.parse()
+    except ValidationError as ex:
+        print(ex.args[0])
+        raise Exception("Could not parse OpenAPI specification.")
+
+    if cached is not None:
+        try:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            temporary = cached.with_suffix(f".{getpid()}")
+            with open(temporary, "w") as fid:
+                fid.write(dumps(parser.specification))
+            temporary.replace(cached)  # atomic, when workers start together
+        except OSError:
+            pass
+    return parser.specification
+
+
+def createApp(sources: (str) = ("bathysphere.yml",)) -> Any:
+    """
+    Application factory. Build the connexion `App` from the configuration and
+    OpenAPI specification.
+
+    Database drivers are not created here, but on the first request that needs one.
+    """
+    from connexion import App
+    from flask_cors import CORS
+
+    try:
+        appConfig = loadAppConfig(sources)
+        services = filter(
+            lambda x: "bathysphere-api" == x["spec"]["name"], appConfig["Locations"]
+        )
+        config = next(services)["metadata"]["config"]
+    except StopIteration:
+        raise ValueError("Invalid YAML configuration file.")
+
+    application = App(__name__, options={"swagger_ui": False})
+    CORS(application.app)
+    application.add_api(
+        loadSpecification(config.get("specPath")), base_path=config.get("basePath")
     )
-    config = next(services)["metadata"]["config"]
-    relativePath = config.get("specPath")
-except StopIteration:
-    raise ValueError("Invalid YAML configuration file.")
-
-try:
-    absolutePath = str(Path(relativePath).absolute())
-except FileNotFoundError as ex:
-    raise FileNotFoundError(f"Specification not found: {relativePath}")
-
-try:
-    parser = ResolvingParser(absolutePath, lazy=True, strict=True)
-    parser.parse()
-except ValidationError as ex:
-    print(ex.args[0])
-    raise Exception("Could not parse OpenAPI specification.")
-else:
-    app.add_api(parser.specification, base_path=config.get("basePath"))
-
-
-
-# def locations(vertex_buffer: array, after=0, before=None, bs=100):
-#     """
-#     Create a bunch of points in the graph
-#     """
-#     cls = "Locations"
-#     n = min(len(vertex_buffer), before)
-#     np = count(cls)
-
-#     while after < n:
-#         size = min(n - after, bs)
-#         indices = [ii + np for ii in range(after, after + size)]
-#         subset = vertex_buffer[indices, :]
-#         batch(cls, list(subset), indices)
-#         after += size
-
-#     return {"after": after, "before": before}
-
-
-# def _edges(points, indices, topology, neighbors, cells):
-#     """Initialize edge arrays"""
-
-#     tri = len(indices)
-#     shape = (tri, 3)
-#     full = (*shape, 2)
-#     nodes = zeros(full, dtype=int) - 1  # indices of side-of nodes
-#     cells = zeros(full, dtype=int) - 1  # indices of side-of elements
-#     center = zeros(full, dtype=float)
-#     ends = zeros((*full, 2), dtype=float)
-#     bound = zeros(shape, dtype=bool)
-
-#     for cell in range(tri):
-#         children = topology[cell, :]
-#         count = 0
-#         for each in neighbors[cell]:  # edges which have been not set already
-
-#             cells[cell, count, :] = [cell, each]
-#             side_of = intersect1d(children, topology[each, :], assume_unique=True)
-#             nodes[cell, count, :] = side_of
-#             center[cell, count, :] = points[side_of, :2].mean(dim=1)  # edge center
-#             ends[cell, count, :, :] = cells[each], center[cell, count]
-#             count += 1
-
-#         boundary[cell, :2] = True  # mark edges as boundaries
-
-#     dx = ends[:, :, 1, 0] - ends[:, :, 0, 0]
-#     dy = ends[:, :, 1, 1] - ends[:, :, 0, 1]
-
-#     return {
-#         "boundary": bound,
-#         "length": (dx ** 2 + dy ** 2) ** 0.5,
-#         "angle": arctan2(dx, dy),
-#         "cells": cells,
-#         "center": center,
-#         "nodes": nodes,
-#         "ends": ends,
-#     }
-
-
-#
-# def vertexNeighbors(cls, tx, node):
-#     """
-#     Get node parents and node neighbors
-#
-#     :param tx:
-#     :param node:
-#     :return:
-#     """
-#     a = cls._match("Nodes", node, "a")
-#     b = cls._match("Nodes", "b")
-#     chain = "(a)-[:SIDE_OF]->(:Element)<-[:SIDE_OF]-"
-#     command = " ".join([a, "MATCH", chain + b, "MERGE", "(a)-[:NEIGHBORS]-(b)"])
-#     tx.run(command, id=node)
-#
-#
-# def _topology(tx, nodes, index):
-#     """
-#     Create parent-child relationships
-#
-#     :param tx: Implicit transmit
-#     :param nodes: vertices, indices
-#     :param index: element identifier
-#     :return:
-#     """
-#     tx.run(
-#         "MATCH (n1:Node {id: $node1}) "
-#         + "MATCH (n2:Node {id: $node2}) "
-#         + "MATCH (n3:Node {id: $node3}) "
-#         + "MATCH (e:Element {id: $index}) "
-#         + "CREATE (n1)-[: SIDE_OF]->(e) "
-#         + "CREATE (n2)-[: SIDE_OF]->(e) "
-#         + "CREATE (n3)-[: SIDE_OF]->(e) ",
-#         node1=int(nodes[0]),
-#         node2=int(nodes[1]),
-#         node3=int(nodes[2]),
-#         index=index,
-#     )
-#
-#
-# def _neighbors(mesh):
-#     """
-#     Make queries and use results to build topological relationships.
-#
-#     :param mesh:
-#     :return:
-#     """
-#     kwargs = [{"identity": ii for ii in range(mesh.nodes.n)}]
-#     _write(_neighbors, kwargs)
-#
-#
-# def _create_blanks(graph, nn, ne):
-#     """
-#     Setup new sphere
-#     """
-#     graph.create("Elements", range(ne), repeat(None, ne))
-#     graph.index("Elements", "id")
-#     graph.create("Nodes", range(nn), repeat(None, nn))
-#     graph.index("Nodes", "id")
-#
-# #
-# def _neighbor(root, cls, tx, id):
-#     """
-#     Get node parents and node neighbors
-#
-#     :param tx:
-#     :param node:
-#     :return:
-#     """
-#     a = _node("a", cls, id)
-#     b = _node("b", cls, id)
-#     command = f"MATCH {a}-[:SIDE_OF]->(:{root})<-{b} MERGE (a)-[:Neighbors]-(b)"
-#     tx.run(command, id=id)
+    return application
+
+
+_lazy = {"app": createApp, "appConfig": loadAppConfig}
+_lazyLock = Lock()
+
+
+def __getattr__(name: str) -> Any:
+    """
+    The default `app` (e.g. `gunicorn bathysphere:app`) and `appConfig` are built on
+    first access, so that importing the package, for instance in the command line
+    interface, does not load the configuration and specification.
+    """
+    if name not in _lazy:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _lazyLock:
+        if name not in globals():
+            globals()[name] = _lazy[name]()
+    return globals()[name]
@@ -1,21 +1,42 @@
-# pylint: disable=invalid-name,line-too-long,eval-used,unused-import
+# pylint: disable=invalid-name,line-too-long,eval-used,unused-import,protected-access
 """
 The functions module of the graph API contains handlers for secure
 calls. These are exposed as a Cloud Function calling Connexion/Flask.
 """
-from itertools import chain
+from copy import copy
+from hashlib import sha256
+from json import loads
+from urllib.parse import urlencode
+from csv import reader
+from io import StringIO
+from threading import BoundedSemaphore
+from time import monotonic, perf_counter
 from os import getenv
 from datetime import datetime
 from inspect import signature
 from uuid import uuid4
-from typing import Callable, Any
+from typing import Callable, Generator, Any
 from passlib.apps import custom_app_context
-from flask import request
+from flask import request, json, Response, stream_with_context
 from neo4j import Record
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 from itsdangerous.exc import BadSignature
 
-from bathysphere import connect, Driver, executeQuery, RESTRICTED
+from bathysphere import (
+    getDriver,
+    Driver,
+    executeQuery,
+    UnitOfWork,
+    QueryProfile,
+    metrics,
+    encodeCursor,
+    decodeCursor,
+    TimedCache,
+    Meter,
+    RESTRICTED,
+)
+from bathysphere.series import SegmentStore, aggregate, downsample, records, window
+from bathysphere.spatial import GEOMETRY, PolygonIndex
 from bathysphere.models import (
     Actuators,
     Assets,
@@ -50,55 +71,135 @@ if not accessKey and not DEBUG:
 api_port = 5000
 default_service = host + (f":{api_port}" if api_port else "")
 graph_error_response = ({"Error": "No graph backend"}, 500)
+principals = TimedCache(
+    maxsize=int(getenv("AUTH_CACHE_SIZE", "1024")),
+    ttl=float(getenv("AUTH_CACHE_TTL", "60")),
+)
+ingestion = Meter()
+ingestSlots = BoundedSemaphore(int(getenv("INGEST_CONCURRENCY", "4")))
+observationStore = (
+    SegmentStore(getenv("OBSERVATION_STORE"))
+    if getenv("OBSERVATION_STORE")
+    else None
+)
+profiling = getenv("SERVER_TIMING", "true").lower() not in ("0", "false", "no")
+metrics.histogram("bathysphere_request_seconds", "Latency of requests, by operationId.")
+metrics.counter("bathysphere_auth_total", "Authentication attempts, by method and outcome.")
+metrics.counter("bathysphere_auth_cache_hits_total", "Credentials found in the cache.")
+metrics.counter("bathysphere_auth_cache_misses_total", "Credentials not found in the cache.")
+metrics.gauge("bathysphere_auth_cache_size", "Cached credentials.")
+metrics.counter("bathysphere_ingested_total", "Observations ingested.")
+metrics.counter("bathysphere_ingest_seconds_total", "Time spent ingesting Observations.")
+metrics.counter("bathysphere_ingest_rejected_total", "Ingestion requests turned away.")
+polygonIndexes = {
+    label: PolygonIndex(ttl=float(getenv("POLYGON_INDEX_TTL", "60"))) for label in GEOMETRY
+}
+
 
 def context(fcn: Callable) -> Callable:
     """
     Decorator to authenticate and inject user into request.
     Validate/verify JWT token.
 
+    The `User` and `Providers` of verified credentials are cached in `principals`,
+    so repeated requests skip the database queries and password hashing.
+
+    The shared driver is looked up on each call, rather than connecting when the
+    module is imported.
+
+    Unless `SERVER_TIMING` is false, the queries of each request are profiled, and
+    summarized in a `Server-Timing` header. Queries made while a response streams
+    are not included.
+
+    The latency of each request is recorded in `metrics`, by operation and status,
+    and so are the outcomes of authentication.
     """
-    db = connect(host, port, accessKey)
-  
+    operation = f"{fcn.__module__}.{fcn.__name__}"
+
     def _wrapper(**kwargs: dict) -> Any:
         """
         The produced decorator
         """
+        start = perf_counter()
+        status = 500
+        try:
+            if not profiling:
+                response = _handle(**kwargs)
+            else:
+                with QueryProfile() as profile:
+                    response = _handle(**kwargs)
+                response = serverTiming(response, profile)
+            status = response.status_code if isinstance(response, Response) else response[1]
+            return response
+        finally:
+            metrics.observe(
+                "bathysphere_request_seconds", perf_counter() - start,
+                operation=operation, status=status,
+            )
 
+    def _handle(**kwargs: dict) -> Any:
+        """
+        Authenticate, and call the handler.
+        """
+        db = getDriver(host, port, accessKey)
         if db is None:
             return graph_error_response
 
         username, password = request.headers.get("authorization", ":").split(":")
 
         if username and "@" in username:  # Basic Auth
-            accounts = User(name=username).load(db=db)
-            user = accounts.pop() if len(accounts) == 1 else None
-
-            if user is None or not custom_app_context.verify(password, user.credential):
-                return {
-                    "message": f"Invalid username or password"
-                }, 403
+            key = ("basic", sha256(f"{username}:{password}".encode()).hexdigest())
+            principal = principals.get(key)
+            if principal is None:
+                accounts = User(name=username).load(db=db)
+                user = accounts.pop() if len(accounts) == 1 else None
+
+                if user is None or not custom_app_context.verify(password, user.credential):
+                    metrics.inc("bathysphere_auth_total", method="basic", outcome="rejected")
+                    return {
+                        "message": f"Invalid username or password"
+                    }, 403
+            metrics.inc(
+                "bathysphere_auth_total", method="basic",
+                outcome="verified" if principal is None else "cached",
+            )
 
         else: # Bearer Token
             secretKey = request.headers.get("x-api-key", "salt")
             try:
                 decoded = Serializer(secretKey).loads(password)
             except BadSignature:
+                metrics.inc("bathysphere_auth_total", method="token", outcome="rejected")
                 return {"Error": "Missing authorization and/or x-api-key headers"}, 403
-            uuid = decoded["uuid"]
-            accounts = User(uuid=uuid).load(db=db)
-            candidates = len(accounts)
-            if candidates != 1:
-                return {
-                    "Message": f"There are {candidates} accounts matching UUID {uuid}"
-                }, 403
-            user = accounts.pop()
-
-        provider = Providers(domain=user.name.split("@").pop()).load(db=db)
-        if len(provider) != 1:
-            raise ValueError
+            key = ("token", secretKey, password)
+            principal = principals.get(key)
+            if principal is None:
+                uuid = decoded["uuid"]
+                accounts = User(uuid=uuid).load(db=db)
+                candidates = len(accounts)
+                if candidates != 1:
+                    metrics.inc("bathysphere_auth_total", method="token", outcome="rejected")
+                    return {
+                        "Message": f"There are {candidates} accounts matching UUID {uuid}"
+                    }, 403
+                user = accounts.pop()
+            metrics.inc(
+                "bathysphere_auth_total", method="token",
+                outcome="verified" if principal is None else "cached",
+            )
+
+        if principal is None:
+            provider = Providers(domain=user.name.split("@").pop()).load(db=db)
+            if len(provider) != 1:
+                raise ValueError
+            principal = (user, provider.pop())
+            principals.put(key, principal)
+
+        # copies, because queries change the symbols of the entities
+        user, provider = map(copy, principal)
         arg = "provider"
         if arg in signature(fcn).parameters.keys():
-            kwargs[arg] = provider.pop()
+            kwargs[arg] = provider
 
         try:
             return fcn(db=db, user=user, **kwargs)
@@ -120,12 +221,48 @@ def context(fcn: Callable) -> Callable:
     return _wrapper if DEBUG else handleUncaughtExceptions
 
 
+def serverTiming(response: Any, profile: QueryProfile) -> Any:
+    """
+    Add the `Server-Timing` header of a query profile to a handler response.
+    """
+    header = {"Server-Timing": profile.header()}
+    if isinstance(response, Response):
+        response.headers.extend(header)
+        return response
+    if len(response) == 3:
+        body, status, headers = response
+        return body, status, {**headers, **header}
+    return (*response, header)
+
+
+@metrics.collect
+def cacheAndIngestStats() -> Generator:
+    """
+    Statistics of `principals` and `ingestion` in this process.
+    """
+    cache, ingested = principals.stats(), ingestion.stats()
+    yield "bathysphere_auth_cache_hits_total", {}, cache["hits"]
+    yield "bathysphere_auth_cache_misses_total", {}, cache["misses"]
+    yield "bathysphere_auth_cache_size", {}, cache["size"]
+    yield "bathysphere_ingested_total", {}, ingested["count"]
+    yield "bathysphere_ingest_seconds_total", {}, ingested["seconds"]
+    yield "bathysphere_ingest_rejected_total", {}, ingested["rejected"]
+
+
+def prometheus() -> Response:
+    """
+    Metrics of all worker processes, in the Prometheus text format. Workers share
+    values through `METRICS_DIR`, if it is set, or else this is only one of them.
+    """
+    return Response(metrics.exposition(), mimetype="text/plain; version=0.0.4")
+
+
 def register(body: dict) -> ResponseJSON:
     """
     Register a new user account
     """
     # pylint: disable=too-many-return-statements
-    db = connect(host, port, accessKey)
+    db = getDriver(host, port, accessKey)
     if db is None:
         return {"message": "no graph backend"}, 500
 
@@ -162,18 +299,14 @@ def register(body: dict) -> ResponseJSON:
 
     _hash = custom_app_context.hash(body.get("password"))
 
-    user = User(
-        name=username,
-        uuid=uuid4().hex,
-        credential=_hash,
-        ip=request.remote_addr,
-    ).create(db=db)
-
-    try:
-        Link(label="Member", rank=0).join(db=db, nodes=(user, entryPoint))
-    except Exception as ex:
-        user.delete(db=db)  # make sure not to leave an orphaned User
-        raise ex
+    with UnitOfWork(db) as work:  # the User is not created unless it is linked
+        user = User(
+            name=username,
+            uuid=uuid4().hex,
+            credential=_hash,
+            ip=request.remote_addr,
+        ).create(db=work)
+        Link(label="Member", rank=0).join(db=work, nodes=(user, entryPoint))
 
     return {"message": f"Registered as a member of {entryPoint.name}."}, 200
 
@@ -191,6 +324,7 @@ def manage(db: Driver, user: User, body: dict) -> ResponseJSON:
         user.delete(db=db)
     else:
         user.mutate(db=db, data=body)  # pylint: disable=no-value-for-parameter
+    principals.invalidate(lambda principal: principal[0].uuid == user.uuid)
     return None, 204
 
 
@@ -242,11 +376,14 @@ def create(
     Attach to db, and find available ID number to register the entity.
     """
     _ = body.pop("entityClass")  # only used for API discriminator
-    entity = eval(entity)(uuid=uuid4().hex, **body).create(db=db)
-    data = entity.serialize(db, service=service)
+    label = entity
     linkPattern = Link(label="Post", props={"confidence": 1.0},)
-    linkPattern.join(db=db, nodes=(user, entity))
-    linkPattern.join(db=db, nodes=(provider, entity))
+    with UnitOfWork(db) as work:
+        entity = eval(label)(uuid=uuid4().hex, **body).create(db=work)
+        linkPattern.join(db=work, nodes=(copy(user), copy(entity)))  # joins set symbols
+        linkPattern.join(db=work, nodes=(copy(provider), copy(entity)))
+    updatePolygons(label, entity.uuid, body)
+    data = entity.serialize(db, service=service)
 
     # declaredLinks = map(
     #     lambda k, v: (each.update({"cls": k}) for each in v), body.pop("links", {}).items()
@@ -255,6 +392,213 @@ def create(
     return {"message": f"Create {entity}", "value": data}, 200
 
 
+@context
+def batch(
+    db: Driver,
+    user: User,
+    entity: str,
+    body: Any,
+    provider: Providers,
+    chunkSize: int = 500,
+) -> ResponseJSON:
+    """
+    Create many entities of one type from a JSON array or NDJSON lines, writing
+    each chunk in a single transaction. Failed chunks are reported, not retried.
+    """
+    if request.mimetype == "application/x-ndjson":
+        items = (loads(line) for line in body.splitlines() if line.strip())
+    elif isinstance(body, (bytes, str)):  # connexion passes raw bytes to this operation
+        items = loads(body)
+    else:
+        items = body
+
+    def _dropDiscriminator(item: dict) -> dict:
+        _ = item.pop("entityClass", None)  # only used for API discriminator
+        return item
+
+    linkPattern = Link(label="Post", props={"confidence": 1.0},)
+    report = eval(entity).createMany(
+        db=db,
+        items=map(_dropDiscriminator, items),
+        links=((user, linkPattern), (provider, linkPattern)),
+        chunkSize=chunkSize,
+    )
+    if entity in polygonIndexes:
+        polygonIndexes[entity].expire()
+    created = sum(each["count"] for each in report if "error" not in each)
+    return {"@iot.count": created, "value": report}, 200
+
+
+@context
+def ingest(
+    db: Driver,
+    user: User,
+    uuid: str,
+    body: Any,
+    chunkSize: int = 10000,
+) -> ResponseJSON:
+    """
+    Create Observations of one DataStream from columns of `phenomenonTime`, `result`,
+    and optionally `resultQuality` and `resultTime`, as JSON arrays or CSV with a header.
+
+    Concurrent ingestion is limited to `INGEST_CONCURRENCY` requests per process, and
+    additional requests are turned away until a slot is free.
+
+    When `OBSERVATION_STORE` is set, Observations are written to segment files in that
+    directory instead of the graph.
+    """
+    if request.mimetype == "text/csv":
+        text = body.decode() if isinstance(body, bytes) else body
+        rows = reader(StringIO(text))
+        header = next(rows, [])
+        columns = {
+            key: [value or None for value in values]
+            for key, values in zip(header, zip(*rows))
+        }
+        if "result" in columns:
+            columns["result"] = [parseResult(value) for value in columns["result"]]
+    elif isinstance(body, (bytes, str)):  # connexion passes raw bytes to this operation
+        columns = loads(body)
+    else:
+        columns = body
+
+    unknown = set(columns) - {"phenomenonTime", "result", "resultQuality", "resultTime"}
+    if unknown or "result" not in columns or "phenomenonTime" not in columns:
+        return {
+            "message": "Expected phenomenonTime and result columns, and optionally "
+            f"resultQuality and resultTime. Unknown: {sorted(unknown)}"
+        }, 400
+
+    if not ingestSlots.acquire(blocking=False):  # pylint: disable=consider-using-with
+        ingestion.reject()
+        return {"message": "Too many concurrent ingestion requests"}, 503, {"Retry-After": "1"}
+    try:
+        datastreams = DataStreams(uuid=uuid).load(db=db)
+        if len(datastreams) != 1:
+            return {"message": f"There are {len(datastreams)} DataStreams matching {uuid}"}, 404
+        start = monotonic()
+        try:
+            report = DataStreams(uuid=uuid).ingest(
+                db=db, chunkSize=chunkSize, store=observationStore, **columns
+            )
+        except ValueError as ex:
+            return {"message": f"{ex}"}, 400
+        elapsed = monotonic() - start
+    finally:
+        ingestSlots.release()
+
+    created = sum(each["count"] for each in report if "error" not in each)
+    ingestion.record(created, elapsed)
+    return {
+        "@iot.count": created,
+        "value": report,
+        "seconds": elapsed,
+        "rate": created / elapsed if elapsed else 0.0,
+    }, 200
+
+
+@context
+def observations(
+    db: Driver,
+    user: User,
+    uuid: str,
+    start: str = None,
+    end: str = None,
+    top: int = 100,
+    skip: int = 0,
+    service: str = default_service,
+    interval: float = None,
+    points: int = None,
+) -> ResponseJSON:
+    """
+    Get a page of the Observations of a DataStream, from `start` to `end`.
+
+    Series in the `observationStore` are read from memory-mapped segments. Others are
+    related entities in the graph, in order of `phenomenonTime`, where the time range is
+    not supported for pages.
+
+    Instead of a page, the whole range can be summarized, as the count, minimum, maximum
+    and mean in buckets of `interval` seconds, or reduced to a number of `points` that
+    keep the shape of the series for plotting.
+    """
+    if interval or points:
+        try:
+            times, values = seriesArrays(db, uuid, start, end)
+            if interval:
+                value = aggregate(times, values, interval)
+            else:
+                selected = downsample(times, values, points)
+                value = records(times[selected], values[selected])
+        except ValueError as ex:
+            return {"message": f"{ex}"}, 400
+        return {"@iot.count": len(value), "value": value}, 200
+
+    if observationStore is None or not observationStore.manifest(uuid):
+        if start or end:
+            return {"message": "Time ranges are only supported for stored Observations"}, 400
+        try:
+            related = Link().query(
+                db=db,
+                nodes=(DataStreams(uuid=uuid), Observations()),
+                result="b",
+                navigation=True,
+                **paging(top, skip, "phenomenonTime", None),
+            )
+        except ValueError as ex:
+            return {"message": f"{ex}"}, 400
+        result = [Observations._fromNode(node, navigation) for node, navigation, _ in related]
+        items = tuple(item.serialize(db=db, service=service) for item in result[:top])
+        return {
+            "@iot.count": len(items),
+            "value": items,
+            **skipLink(result, top, skip),
+        }, 200
+
+    try:
+        items = observationStore.page(uuid, start, end, skip=skip, limit=top + 1)
+    except ValueError as ex:
+        return {"message": f"{ex}"}, 400
+    return {
+        "@iot.count": len(items[:top]),
+        "value": items[:top],
+        **skipLink(items, top, skip),
+    }, 200
+
+
+def seriesArrays(db: Driver, uuid: str, start: str, end: str) -> (Any, Any):
+    """
+    Sorted times and results of the Observations of a DataStream, from the
+    `observationStore` if it has any, or else the graph.
+
+    The graph is only asked for the time range, already sorted, in one read
+    transaction. Traversals are not counted, because this is a bulk read.
+    """
+    if observationStore is not None and observationStore.manifest(uuid):
+        return observationStore.arrays(uuid, start, end)
+    cmd = (
+        "MATCH (:DataStreams { uuid: $uuid })--(b:Observations) "
+        "WHERE ($start IS NULL OR b.phenomenonTime >= $start) "
+        "AND ($end IS NULL OR b.phenomenonTime <= $end) "
+        "RETURN b.phenomenonTime, b.result ORDER BY b.phenomenonTime"
+    )
+    rows = executeQuery(
+        db=db,
+        read_only=True,
+        method=lambda tx: tx.run(cmd, uuid=uuid, start=start, end=end).values(),
+    )
+    return window([r[0] for r in rows], [r[1] for r in rows], start, end)
+
+
+def parseResult(value: str) -> float or str:
+    """
+    CSV results are numbers where possible.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
 @context
 def mutate(
     body: dict,
@@ -269,75 +613,320 @@ def mutate(
     """
     _ = body.pop("entityClass")  # only used for API discriminator
     cls = eval(entity)
-    _ = cls.mutate(db=db, data=body, identity=uuid, props={})
-    createLinks = chain(
-        ({"cls": repr(user), "uuid": user.uuid, "label": "Put"},),
-        (
-            {"cls": Providers.__name__, "uuid": r[0], "label": "Provider"}
-            for r in Link(label="Member").query(
-                db=db, nodes=(user, provider), result="b.uuid"
-            )
+    with UnitOfWork(db) as work:
+        cls.mutate(db=work, data=body, pattern={"uuid": uuid})
+        Link(label="Put", props={"confidence": 1.0}).join(
+            db=work, nodes=(user, cls(uuid=uuid))
         )
-        if entity != Providers.__name__
-        else (),
-    )
-
-    Link().join(db=db, nodes=(cls(uuid=uuid), createLinks))
+    updatePolygons(entity, uuid, body)
+    if entity in (Providers.__name__, User.__name__):
+        principals.invalidate()
     return None, 204
 
 
+def polygonIndex(db: Driver, entity: str) -> PolygonIndex:
+    """
+    Index of the polygons of an entity class, loaded from the graph if it has expired.
+    """
+    if entity not in polygonIndexes:
+        raise ValueError(f"{entity} has no polygon geometry.")
+    index = polygonIndexes[entity]
+    if index.expired():
+        key = GEOMETRY[entity]
+        index.reset(executeQuery(db, lambda tx: [
+            (r[0], r[1]) for r in tx.run(
+                f"MATCH (n:{entity}) WHERE n.{key} IS NOT NULL RETURN n.uuid, n.{key}"
+            )
+        ]))
+    return index
+
+
+def updatePolygons(entity: str, uuid: str, data: dict or None) -> None:
+    """
+    Apply a change made by this process to a loaded polygon index, instead of waiting
+    for it to expire. Deleted entities have no `data`.
+    """
+    index = polygonIndexes.get(entity)
+    if index is None or index.loaded is None:
+        return
+    if data is None:
+        index.remove(uuid)
+    elif GEOMETRY[entity] in data:
+        index.insert(uuid, data[GEOMETRY[entity]])
+
+
+def spatialMatches(db: Driver, user: User, entity: str, keys: [str]) -> ResponseJSON:
+    """
+    Load the entities found in a polygon index, in one query.
+    """
+    result = eval(entity).load(db=db, user=user, navigation=True, uuids=keys) if keys else []
+    items = tuple(item.serialize(db=db, service=default_service) for item in result)
+    return {"@iot.count": len(items), "value": items}, 200
+
+
 @context
-def collection(db: Driver, user: User, entity: str) -> ResponseJSON:
+def containing(db: Driver, user: User, entity: str, point: [float]) -> ResponseJSON:
     """
-    Usage 2. Get all entities of a single class
+    Get entities with a polygon that contains a longitude and latitude.
     """
+    try:
+        keys = polygonIndex(db, entity).containing(*point)
+    except ValueError as ex:
+        return {"message": f"{ex}"}, 400
+    return spatialMatches(db, user, entity, keys)
 
-    result: (Record) = eval(entity).load(db=db, user=user)
+
+@context
+def intersecting(db: Driver, user: User, entity: str, body: dict) -> ResponseJSON:
+    """
+    Get entities with a polygon that intersects a GeoJSON Polygon or MultiPolygon.
+    """
+    try:
+        keys = polygonIndex(db, entity).intersecting(body)
+    except ValueError as ex:
+        return {"message": f"{ex}"}, 400
+    return spatialMatches(db, user, entity, keys)
+
+
+def paging(top: int, skip: int, orderby: str, cursor: str) -> dict:
+    """
+    Convert `$top`, `$skip`, `$orderby` and `$cursor` query parameters into paging
+    arguments for `Entity.load` and `Link.query`. One extra item is requested, to
+    know whether there is a next page.
+    """
+    if cursor:
+        orderby, after = decodeCursor(cursor)
+        return {"orderBy": orderby, "after": after, "limit": top + 1}
+    return {"orderBy": orderby, "skip": skip, "limit": top + 1}
+
+
+def pageLink(updates: dict) -> str:
+    """
+    URL of this request, with query parameters replaced by `updates`, or removed
+    where the update is None. Filters like `$bbox` are kept, so that every page
+    has the same ones.
+    """
+    query = request.args.to_dict(flat=False)
+    for key, value in updates.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = [value]
+    return f"{request.base_url}?{urlencode(query, doseq=True)}"
+
+
+def skipLink(items: list, top: int, skip: int) -> dict:
+    """
+    Link to the next page, by skipping the items up to the end of this one, if there
+    are more items.
+    """
+    if len(items) <= top:
+        return {}
+    return {"@iot.nextLink": pageLink({"$top": top, "$skip": skip + top})}
+
+
+def nextLink(items: list, top: int, orderBy: str) -> dict:
+    """
+    Link to the next page, starting after the last item on this one, if there are more items.
+    The cursor replaces `$skip`, and holds the order, so `$orderby` is not needed either.
+    """
+    if len(items) <= top:
+        return {}
+    last = items[top - 1]
+    key = (orderBy or "uuid").split()[0]
+    cursor = encodeCursor(orderBy, (getattr(last, key), last.uuid))
+    return {
+        "@iot.nextLink": pageLink(
+            {"$top": top, "$cursor": cursor, "$skip": None, "$orderby": None}
+        )
+    }
+
+
+def streaming(stream: bool, paged: bool = True) -> dict or None:
+    """
+    Streaming is opt-in, with `Accept: application/x-ndjson` for newline delimited
+    JSON, or the `$stream` query flag for a chunked JSON document.
+
+    Streamed responses are not paged, unless paging parameters are given explicitly.
+    The returned dict holds updates to the arguments from `paging`.
+    """
+    ndjson = request.accept_mimetypes.best_match(
+        ("application/json", "application/x-ndjson")
+    ) == "application/x-ndjson"
+    if not (ndjson or stream):
+        return None
+    mode = {"mimetype": "application/x-ndjson" if ndjson else "application/json"}
+    if paged:
+        mode["limit"] = int(request.args["$top"]) if "$top" in request.args else None
+    return mode
+
+
+def streamResponse(items: Generator, mimetype: str) -> Response:
+    """
+    Write serialized entities to the response as they are read from the database,
+    either one per line, or as the `value` array of a collection document.
+    """
+    if mimetype == "application/x-ndjson":
+        body = (json.dumps(item) + "\n" for item in items)
+    else:
+        def chunks():
+            count = 0
+            yield '{"value": ['
+            for item in items:
+                yield ("," if count else "") + json.dumps(item)
+                count += 1
+            yield f'], "@iot.count": {count}}}'
+        body = chunks()
+
+    return Response(stream_with_context(body), mimetype=mimetype)
+
+
+@context
+def collection(
+    db: Driver,
+    user: User,
+    entity: str,
+    top: int = 100,
+    skip: int = 0,
+    orderby: str = None,
+    cursor: str = None,
+    stream: bool = False,
+    bbox: [float] = None,
+    near: [float] = None,
+    radius: float = None,
+) -> ResponseJSON:
+    """
+    Usage 2. Get a page of entities of a single class
+
+    Entities with a `location` can be filtered by a `bbox`, or by `radius` meters
+    from the point they are `near`.
+    """
+    spatial = {"bbox": bbox, "near": near, "radius": radius}
+    mode = streaming(stream)
+    try:
+        page = paging(top, skip, orderby, cursor)
+        if mode:
+            page["limit"] = mode["limit"]
+            result = eval(entity).load(
+                db=db, user=user, navigation=True, stream=True, **page, **spatial
+            )
+            return streamResponse(
+                (item.serialize(db=db, service=default_service) for item in result),
+                mode["mimetype"],
+            )
+        result = eval(entity).load(db=db, user=user, navigation=True, **page, **spatial)
+    except ValueError as ex:
+        return {"message": f"{ex}"}, 400
 
     items = tuple(
         item.serialize(db=db, service=default_service)
-        for item in result
+        for item in result[:top]
     )
     
-    return {"@iot.count": len(items), "value": items}, 200
+    return {
+        "@iot.count": len(items),
+        "value": items,
+        **nextLink(result, top, page["orderBy"]),
+    }, 200
 
 
 @context
 def metadata(
-    db: Driver, user: User, entity: str, uuid: str, service: str, key=None
+    db: Driver,
+    user: User,
+    entity: str,
+    uuid: str,
+    service: str = default_service,
+    key=None,
+    stream: bool = False,
 ) -> ResponseJSON:
     """
     Format the entity metadata response.
     """
+    mode = streaming(stream, paged=False)
+    if mode:
+        result = eval(entity).load(
+            db=db, user=user, uuid=uuid, navigation=not key, stream=True
+        )
+        return streamResponse(
+            (
+                getattr(item, key) if key else item.serialize(db=db, service=service)
+                for item in result
+            ),
+            mode["mimetype"],
+        )
+
     value = tuple(
         getattr(item, key) if key else item.serialize(db=db, service=service)
-        for item in (eval(entity).load(db=db, user=user, uuid=uuid) or ())
+        for item in (
+            eval(entity).load(db=db, user=user, uuid=uuid, navigation=not key) or ()
+        )
     )
     return {"@iot.count": len(value), "value": value}, 200
 
 
 @context
 def query(
-    db: Driver, root: str, rootId: str, entity: str, service: str
+    db: Driver,
+    user: User,
+    root: str,
+    rootId: str,
+    entity: str,
+    service: str = default_service,
+    top: int = 100,
+    skip: int = 0,
+    orderby: str = None,
+    cursor: str = None,
+    stream: bool = False,
 ) -> ResponseJSON:
     """
-    Get the related entities of a certain type.
+    Get a page of the related entities of a certain type.
     """
-    items = tuple(
-        item.serialize(db=db, service=service)
-        for item in Link().query(
-            db=db, nodes=({"cls": root, "id": rootId}, {"cls": entity}), result="b"
+    cls = eval(entity)
+    mode = streaming(stream)
+    try:
+        page = paging(top, skip, orderby, cursor)
+        if mode:
+            page["limit"] = mode["limit"]
+        records = Link().query(
+            db=db,
+            nodes=(eval(root)(uuid=rootId), cls()),
+            result="b",
+            navigation=True,
+            stream=bool(mode),
+            count=True,
+            **page,
         )
-    )
-    return {"@iot.count": len(items), "value": items}, 200
+    except ValueError as ex:
+        return {"message": f"{ex}"}, 400
+
+    if mode:
+        return streamResponse(
+            (
+                cls._fromNode(node, navigation).serialize(db=db, service=service)
+                for node, navigation, _ in records
+            ),
+            mode["mimetype"],
+        )
+
+    result = [cls._fromNode(node, navigation) for node, navigation, _ in records]
+    items = tuple(item.serialize(db=db, service=service) for item in result[:top])
+    return {
+        "@iot.count": len(items),
+        "value": items,
+        **nextLink(result, top, page["orderBy"]),
+    }, 200
 
 
 @context
-def delete(db: Driver, entity: str, uuid: str) -> ResponseJSON:
+def delete(db: Driver, user: User, entity: str, uuid: str) -> ResponseJSON:
     """
     Delete a pattern from the graph
     """
-    eval(entity).delete(db, uuid=uuid)
+    eval(entity).delete(db=db, pattern={"uuid": uuid})
+    updatePolygons(entity, uuid, None)
+    if entity in (Providers.__name__, User.__name__):
+        principals.invalidate()
     return None, 204
 
 
@@ -352,29 +941,30 @@ def join(
 
     rootPattern = eval(root)(uuid=rootId)
     childPattern = eval(entity)(uuid=uuid)
-    Link(
+    linked = Link(
         label="Linked",
         props={
             "confidence": 1.0,
             "cost": 1.0,
             **body.get("props", dict())
             }
-    ).join(
-        db=db, 
-        nodes=(rootPattern, childPattern)
     )
     linkPattern = Link(label="Put", props={"confidence": 1.0},)
-    linkPattern.join(db=db, nodes=(user, rootPattern))
-    linkPattern.join(db=db, nodes=(user, childPattern))
+    with UnitOfWork(db) as work:  # joins set the symbols of their nodes, so use copies
+        linked.join(db=work, nodes=(copy(rootPattern), copy(childPattern)))
+        linkPattern.join(db=work, nodes=(copy(user), copy(rootPattern)))
+        linkPattern.join(db=work, nodes=(copy(user), copy(childPattern)))
     return None, 204
 
 
 @context
 def drop(
-    db: Driver, root: str, rootId: str, entity: str, uuid: str, props: dict
+    db: Driver, user: User, root: str, rootId: str, entity: str, uuid: str,
+    label: str = None
 ) -> ResponseJSON:
     """
-    Break connections between linked nodes.
+    Break connections between linked nodes, with a `label` or all of them.
     """
+    props = {"label": label} if label else {}
     Link.drop(db, (eval(root)(uuid=rootId), eval(entity)(uuid=uuid)), props)
     return None, 204
@@ -0,0 +1,177 @@
+# pylint: disable=invalid-name
+"""
+In-memory stand-in for the Neo4j driver, for measuring the application without
+a database.
+
+Queries are not evaluated. Each statement is recorded with its parameters, and
+answered with the rows of the first rule whose pattern is found in the query
+text. Like the server, the driver keeps the plans of the query texts it has seen,
+and can be made to take longer for texts that it has to plan.
+
+Use `connect("memory", ...)`, or set `NEO4J_HOSTNAME=memory`, to get one through
+the usual `getDriver`.
+"""
+from collections import namedtuple
+from re import compile as regex
+from threading import Lock
+from time import perf_counter, sleep
+from typing import Any, Callable
+
+from neo4j import Record, READ_ACCESS, WRITE_ACCESS
+
+Statement = namedtuple("Statement", ["query", "parameters", "mode"])
+
+
+class MemorySummary:
+    """
+    Result summary with the same timing attributes as the driver, in milliseconds.
+    """
+
+    def __init__(self, query: str, parameters: dict, available: float):
+        self.query = query
+        self.parameters = parameters
+        self.result_available_after = available
+        self.result_consumed_after = 0
+
+
+class MemoryResult:
+    """
+    Records of a statement, which can be iterated over like a driver result.
+    """
+
+    def __init__(self, records: [Record], summary: MemorySummary):
+        self._records = records
+        self._summary = summary
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self) -> Record or None:
+        return self._records[0] if self._records else None
+
+    def values(self) -> [list]:
+        return [list(record.values()) for record in self._records]
+
+    def data(self) -> [dict]:
+        return [dict(record) for record in self._records]
+
+    def consume(self) -> MemorySummary:
+        return self._summary
+
+
+class MemoryTransaction:
+    """
+    Transaction that runs statements against the driver rules.
+    """
+
+    def __init__(self, driver: "MemoryDriver", mode: str):
+        self._driver = driver
+        self._mode = mode
+
+    def run(self, query: str, parameters: dict = None, **kwparameters: Any) -> MemoryResult:
+        return self._driver.respond(query, {**(parameters or {}), **kwparameters}, self._mode)
+
+
+class MemorySession:
+    """
+    Session with the transaction functions and auto-commit `run` of the driver.
+    """
+
+    def __init__(self, driver: "MemoryDriver", default_access_mode: str = WRITE_ACCESS, **_):
+        self._driver = driver
+        self._mode = default_access_mode
+
+    def __enter__(self) -> "MemorySession":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+    def run(self, query: str, parameters: dict = None, **kwparameters: Any) -> MemoryResult:
+        return MemoryTransaction(self._driver, self._mode).run(query, parameters, **kwparameters)
+
+    def read_transaction(self, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        return method(MemoryTransaction(self._driver, READ_ACCESS), *args, **kwargs)
+
+    def write_transaction(self, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        return method(MemoryTransaction(self._driver, WRITE_ACCESS), *args, **kwargs)
+
+
+class MemoryDriver:
+    """
+    Driver that records statements, and waits `latency` seconds for each of them,
+    and another `planning` seconds for those with query text it has not seen before.
+    Plan cache hits and misses are counted.
+
+    The `rules` are (pattern, rows) pairs. Rows are a list, or a function of the
+    query and parameters that returns one. Each row is a dictionary, or a tuple whose
+    values can be read by position. Queries that match no rule return no rows.
+    """
+
+    def __init__(self, rules: ((str, Any),) = (), latency: float = 0.0, planning: float = 0.0):
+        self.latency = latency
+        self.planning = planning
+        self.log = []
+        self.plans = set()
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self.rules = rules
+
+    @property
+    def rules(self) -> [(Any, Any)]:
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules: ((str, Any),)) -> None:
+        self._rules = [(regex(pattern), rows) for pattern, rows in rules]
+
+    def session(self, **config: Any) -> MemorySession:
+        return MemorySession(self, **config)
+
+    def close(self) -> None:
+        pass
+
+    def clear(self) -> [Statement]:
+        """
+        Forget the recorded statements and plans, and return the statements.
+        """
+        with self._lock:
+            log, self.log = self.log, []
+            self.plans = set()
+            self.hits = self.misses = 0
+        return log
+
+    def respond(self, query: str, parameters: dict, mode: str) -> MemoryResult:
+        """
+        Record a statement, and answer it from the first matching rule.
+        """
+        start = perf_counter()
+        with self._lock:
+            self.log.append(Statement(query, parameters, mode))
+            planned = query in self.plans
+            if planned:
+                self.hits += 1
+            else:
+                self.plans.add(query)
+                self.misses += 1
+        delay = self.latency + (0.0 if planned else self.planning)
+        if delay:
+            sleep(delay)
+
+        rows = []
+        for pattern, answer in self._rules:
+            if pattern.search(query):
+                rows = answer(query, parameters) if callable(answer) else answer
+                break
+        records = [
+            Record(row.items() if isinstance(row, dict) else (
+                (f"_{ii}", value) for ii, value in enumerate(row)
+            ))
+            for row in rows
+        ]
+        available = (perf_counter() - start) * 1000
+        return MemoryResult(records, MemorySummary(query, parameters, available))
@@ -0,0 +1,219 @@
+# pylint: disable=invalid-name
+"""
+Import of unstructured triangular meshes, like those of ocean circulation models.
+
+Vertices become `Nodes` and triangles become `Elements`, each with the name of the
+mesh and an integer `id`. Each node is `SIDE_OF` the elements it belongs to. Nodes
+joined by an edge, and elements that share an edge, are `NEIGHBORS`.
+
+The topology is computed for all elements at once with NumPy, and written in chunks
+of columns with one `UNWIND` query and transaction each.
+"""
+from pathlib import Path
+
+from numpy import (
+    append, argsort, arange, arctan2, asarray, concatenate, diff, flatnonzero, float64,
+    full, hypot, int64, load, ndarray, repeat, roll, searchsorted, stack, zeros
+)
+
+from bathysphere import Driver, executeQuery, writeColumns
+
+
+def read2dm(path: str) -> (ndarray, ndarray):
+    """
+    Vertices (x, y, z) and triangles of an SMS 2DM file, as arrays. Element
+    vertices are positions in the vertex array, rather than the 1-based
+    identifiers of the file.
+    """
+    nodes, triangles = [], []
+    with open(path) as source:
+        for line in source:
+            if line.startswith("ND "):
+                nodes.append(line.split()[1:5])
+            elif line.startswith("E3T "):
+                triangles.append(line.split()[1:5])
+    nodes = asarray(nodes, dtype=float64).reshape(-1, 4)
+    triangles = asarray(triangles, dtype=int64).reshape(-1, 4)
+
+    identifiers = nodes[:, 0].astype(int64)
+    order = argsort(identifiers)
+    position = searchsorted(identifiers, triangles[:, 1:], sorter=order)
+    position = order[position.clip(max=len(order) - 1)]
+    if (identifiers[position] != triangles[:, 1:]).any():
+        raise ValueError("Elements refer to nodes that are not in the mesh.")
+    return nodes[:, 1:], position
+
+
+def readMesh(path: str) -> (ndarray, ndarray):
+    """
+    Vertices and triangles from a 2DM file, or from the `vertices` and `elements`
+    arrays of a NumPy `.npz` file.
+    """
+    if Path(path).suffix == ".npz":
+        with load(path) as arrays:
+            return arrays["vertices"], arrays["elements"]
+    return read2dm(path)
+
+
+def topology(vertices: ndarray, elements: ndarray) -> dict:
+    """
+    Edges of a triangular mesh, and derived properties, from vertex coordinates and
+    the vertex indices of each element.
+
+    Edges are the unique sides of all elements, found by sorting the sides once.
+    Each edge has the one or two elements it is a side of, so that interior edges
+    give neighboring elements and the others are on the boundary. Lengths and angles
+    (counter-clockwise from the x-axis, in radians) are in the units of the vertex
+    coordinates.
+    """
+    vertices = asarray(vertices, dtype=float64)
+    elements = asarray(elements, dtype=int64)
+    count = len(vertices)
+    if elements.ndim != 2 or elements.shape[1] != 3:
+        raise ValueError("Elements must be triangles.")
+    if elements.size and (elements.min() < 0 or elements.max() >= count):
+        raise ValueError("Elements refer to vertices that are not in the mesh.")
+
+    sides = stack((elements, roll(elements, -1, axis=1)), axis=2).reshape(-1, 2)
+    sides.sort(axis=1)
+    keys = sides[:, 0] * count + sides[:, 1]
+    order = argsort(keys, kind="stable")
+    keys = keys[order]
+    owners = repeat(arange(len(elements)), 3)[order]
+
+    starts = flatnonzero(concatenate(([True], keys[1:] != keys[:-1])))
+    multiplicity = diff(append(starts, keys.size))
+    if (multiplicity > 2).any():
+        raise ValueError("Edges may be sides of at most two elements.")
+    interior = multiplicity == 2
+
+    edges = stack((keys[starts] // count, keys[starts] % count), axis=1)
+    cells = full((len(starts), 2), -1, dtype=int64)
+    cells[:, 0] = owners[starts]
+    cells[interior, 1] = owners[starts[interior] + 1]
+
+    delta = vertices[edges[:, 1], :2] - vertices[edges[:, 0], :2]
+    corners = vertices[elements, :2]
+    first, second = corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+    boundary = zeros(count, dtype=bool)
+    boundary[edges[~interior].ravel()] = True
+
+    return {
+        "edges": edges,
+        "cells": cells,
+        "boundary": ~interior,
+        "length": hypot(delta[:, 0], delta[:, 1]),
+        "angle": arctan2(delta[:, 1], delta[:, 0]),
+        "area": abs(first[:, 0] * second[:, 1] - first[:, 1] * second[:, 0]) / 2,
+        "vertexBoundary": boundary,
+    }
+
+
+def loadMesh(
+    db: Driver,
+    mesh: str,
+    vertices: ndarray,
+    elements: ndarray,
+    crs: str = "cartesian",
+    chunkSize: int = 10000,
+) -> dict:
+    """
+    Create the nodes, elements and relationships of a new mesh. The `crs` of the
+    vertex locations is `cartesian`, or `wgs-84` for longitude and latitude.
+
+    The composite indexes on `mesh` and `id` are created first, because relationships
+    are matched by them. Returns the throughput of each step.
+
+    Chunks are written in separate transactions, so if one fails, whatever was written
+    of the mesh is deleted before the error is raised, and loading can be retried.
+    """
+    vertices = asarray(vertices, dtype=float64)
+    elements = asarray(elements, dtype=int64)
+    derived = topology(vertices, elements)
+
+    exists = executeQuery(db, lambda tx: tx.run(
+        "MATCH (n:Nodes {mesh: $mesh}) RETURN count(n) > 0", mesh=mesh
+    ).single()[0])
+    if exists:
+        raise ValueError(f"Mesh {mesh} already exists.")
+    for label in ("Nodes", "Elements"):
+        executeQuery(db, read_only=False, method=lambda tx: tx.run(
+            f"CREATE INDEX ON :{label}(mesh, id)"
+        ).consume())
+
+    depth = vertices[:, 2] if vertices.shape[1] > 2 else zeros(len(vertices))
+    cells = derived["cells"]
+    interior = cells[:, 1] >= 0
+    unwind = "UNWIND range(0, size($id) - 1) AS i "
+    match = (
+        "UNWIND range(0, size($a) - 1) AS i "
+        "MATCH (a:{0} {{mesh: $mesh, id: $a[i]}}) "
+        "MATCH (b:{1} {{mesh: $mesh, id: $b[i]}}) "
+    )
+    steps = (
+        ("Nodes", unwind + (
+            "CREATE (:Nodes { mesh: $mesh, id: $id[i], depth: $depth[i], "
+            "boundary: $boundary[i], location: point({x: $x[i], y: $y[i], crs: $crs}) })"
+        ), {
+            "id": arange(len(vertices)),
+            "x": vertices[:, 0],
+            "y": vertices[:, 1],
+            "depth": depth,
+            "boundary": derived["vertexBoundary"],
+        }),
+        ("Elements", unwind + (
+            "CREATE (:Elements { mesh: $mesh, id: $id[i], area: $area[i] })"
+        ), {
+            "id": arange(len(elements)),
+            "area": derived["area"],
+        }),
+        ("SIDE_OF", match.format("Nodes", "Elements") + "CREATE (a)-[:SIDE_OF]->(b)", {
+            "a": elements.ravel(),
+            "b": repeat(arange(len(elements)), 3),
+        }),
+        ("Nodes NEIGHBORS", match.format("Nodes", "Nodes") + (
+            "CREATE (a)-[:NEIGHBORS { length: $length[i], angle: $angle[i], "
+            "boundary: $boundary[i] }]->(b)"
+        ), {
+            "a": derived["edges"][:, 0],
+            "b": derived["edges"][:, 1],
+            "length": derived["length"],
+            "angle": derived["angle"],
+            "boundary": derived["boundary"],
+        }),
+        ("Elements NEIGHBORS", match.format("Elements", "Elements") + (
+            "CREATE (a)-[:NEIGHBORS]->(b)"
+        ), {
+            "a": cells[interior, 0],
+            "b": cells[interior, 1],
+        }),
+    )
+    try:
+        return {
+            name: writeColumns(db, cmd, columns, chunkSize, mesh=mesh, crs=crs)
+            for name, cmd, columns in steps
+        }
+    except Exception:
+        deleteMesh(db, mesh, chunkSize)
+        raise
+
+
+def deleteMesh(db: Driver, mesh: str, chunkSize: int = 10000) -> int:
+    """
+    Remove the nodes and elements of a mesh, with their relationships, in transactions
+    of `chunkSize` nodes so that large meshes fit in memory. Returns the number removed.
+    """
+    total = 0
+    for label in ("Nodes", "Elements"):
+        cmd = (
+            f"MATCH (n:{label} {{mesh: $mesh}}) WITH n LIMIT $limit "
+            "DETACH DELETE n RETURN count(n)"
+        )
+        while True:
+            removed = executeQuery(db, read_only=False, method=lambda tx: tx.run(
+                cmd, mesh=mesh, limit=chunkSize
+            ).single()[0])
+            total += removed
+            if removed < chunkSize:
+                break
+    return total
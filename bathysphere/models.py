@@ -4,15 +4,16 @@ The models module of the graph API contains extensions to the common
 models, for storing and accessing data in a Neo4j database.
 """
 from inspect import isclass
-from typing import Type, Callable, Any
+from typing import Type, Callable, Generator, Any
 from types import MethodType
 from datetime import datetime
 from pickle import load as unpickle
 from uuid import uuid4, UUID
-from json import dumps
+from json import dumps, loads
 from inspect import signature
 from time import time
 from functools import reduce
+from itertools import islice
 
 from neo4j import Driver, Record, GraphDatabase
 from neo4j.spatial import WGS84Point
@@ -20,12 +21,199 @@ import attr
 
 from bathysphere import (
     processKeyValueInbound,
+    processKeyValueParameter,
+    processValueParameter,
     executeQuery,
+    streamQuery,
     polymorphic,
+    ranks,
     RESTRICTED
 )
+from bathysphere.series import envelope, toTime
 
-@attr.s(repr=False)
+
+def streamRecords(
+    db: Driver,
+    cmd: str,
+    parameters: dict,
+    count: Callable,
+    key: Callable,
+    transducer: Callable,
+) -> Generator:
+    """
+    Yield transformed records from a query as the result cursor is consumed.
+
+    The `key` of each record is counted once streaming stops, including when the
+    client disconnects before the end of the result.
+    """
+    keys = []
+    try:
+        for record in streamQuery(db, lambda tx: tx.run(cmd, parameters)):
+            keys.append(key(record))
+            yield transducer(record)
+    finally:
+        count(keys)
+
+
+def neighborLabels(symbol: str) -> str:
+    """
+    Expression for the distinct label sets of the neighbors of a node. It is a pattern
+    comprehension evaluated for each row, rather than an aggregation, so that rows are
+    returned as soon as they are matched, which keeps streamed responses streaming.
+    """
+    return (
+        f"reduce(s = [], each IN [({symbol})--(c) | labels(c)] | "
+        "CASE WHEN each IN s THEN s ELSE s + [each] END)"
+    )
+
+
+def pageClauses(
+    symbol: str,
+    carry: str,
+    order: (str, bool),
+    skip: int = None,
+    limit: int = None,
+    after: (Any, str) = None,
+    parameters: dict = None,
+) -> (str, str, str):
+    """
+    Render the `WHERE` and `WITH ... ORDER BY ... SKIP ... LIMIT` clauses that page
+    through the nodes matched as `symbol`, keeping the `carry` variables in scope.
+    The `ORDER BY` clause is also returned.
+
+    Nodes are sorted by the `order` key, and then by `uuid`, so that pages are stable.
+    The `after` tuple is the key value and `uuid` of the last node of the previous
+    page. Starting after it, instead of skipping, makes the cost of a page
+    independent of how deep it is. Neo4j sorts nulls last when ascending, and first
+    when descending, so nodes without the key are handled separately.
+    """
+    key, descending = order
+    compare = "<" if descending else ">"
+    direction = "DESC" if descending else "ASC"
+    orderBy = f"ORDER BY {symbol}.{key} {direction}"
+    if key != "uuid":
+        orderBy += f", {symbol}.uuid {direction}"
+
+    where = ""
+    if after is not None:
+        value, uuid = after
+        parameters["after_uuid"] = uuid
+        tieBreak = f"{symbol}.uuid {compare} $after_uuid"
+        if key == "uuid":
+            where = f"WHERE {tieBreak} "
+        elif value is None:
+            where = (
+                f"WHERE ({symbol}.{key} IS NOT NULL OR {tieBreak}) "
+                if descending
+                else f"WHERE ({symbol}.{key} IS NULL AND {tieBreak}) "
+            )
+        else:
+            parameters["after_value"] = value
+            where = (
+                f"WHERE ({symbol}.{key} {compare} $after_value "
+                f"OR ({symbol}.{key} = $after_value AND {tieBreak})"
+                + ("" if descending else f" OR {symbol}.{key} IS NULL")
+                + ") "
+            )
+
+    page = f"WITH {carry} {orderBy} "
+    if skip:
+        parameters["skip"] = skip
+        page += "SKIP $skip "
+    if limit is not None:
+        parameters["limit"] = limit
+        page += "LIMIT $limit "
+    return where, page, orderBy
+
+
+def spatialClause(
+    symbol: str,
+    key: str,
+    bbox: (float, float, float, float) = None,
+    near: (float, float) = None,
+    radius: float = None,
+    parameters: dict = None,
+) -> str:
+    """
+    Render predicates on the WGS84 point property `key`, for nodes inside a `bbox` of
+    (west, south, east, north), and/or within `radius` meters of the (longitude, latitude)
+    point `near`. Both can use an index on the property.
+    """
+    predicates = []
+    if bbox is not None:
+        west, south, east, north = bbox
+        if west > east or south > north:
+            raise ValueError("Bounding boxes crossing the antimeridian are not supported.")
+        parameters["bbox_lower"] = {"x": west, "y": south, "crs": "wgs-84"}
+        parameters["bbox_upper"] = {"x": east, "y": north, "crs": "wgs-84"}
+        predicates.append(
+            f"point($bbox_lower) <= {symbol}.{key} <= point($bbox_upper)"
+        )
+    if near is not None:
+        if radius is None:
+            raise ValueError("A radius is required to search near a point.")
+        longitude, latitude = near
+        parameters["near"] = {"x": longitude, "y": latitude, "crs": "wgs-84"}
+        parameters["radius"] = radius
+        predicates.append(f"distance({symbol}.{key}, point($near)) <= $radius")
+    return " AND ".join(predicates)
+
+
+_manifests: dict = dict()
+_patterns: dict = dict()
+
+
+def memoized(instance: Any, key: tuple, parameters: dict or None, render: Callable) -> str:
+    """
+    Pattern of an entity or link, rendered once and reused while the `key` of
+    symbol and values is equal. With `parameters`, the values of the rendered
+    pattern are added to them.
+
+    Renderings are replaced rather than updated, since copies of an instance share
+    them. Values that are changed in place, instead of assigned, are not noticed.
+    """
+    mode = parameters is not None
+    rendered = getattr(instance, "_rendered", None) or {}
+    previous = rendered.get(mode)
+    try:
+        hit = previous is not None and previous[0] == key
+    except ValueError:  # values without a truth value for equality, like arrays
+        hit = False
+    if not hit:
+        values = dict() if mode else None
+        previous = (key, render(values), values)
+        instance._rendered = {**rendered, mode: previous}
+    if mode:
+        parameters.update(previous[2])
+    return previous[1]
+
+
+def describeCapability(name: str, fcn: Callable) -> dict:
+    """
+    Properties of the `TaskingCapabilities` node for a method.
+    """
+    return {
+        "name": name,
+        "description": fcn.__doc__,
+        "taskingParameters": processValueParameter((
+            "taskingParameters",
+            [
+                {
+                    "name": b.name,
+                    "description": "",
+                    "type": "",
+                    "allowedTokens": [""],
+                }
+                for b in signature(fcn).parameters.values()
+            ],
+        )),
+    }
+
+
+SORTABLE = (str, int, float, bool, datetime, UUID)  # types of properties for `_orderBy`
+
+
+@attr.s(repr=False, slots=True)
 class Link:
     """
     Links are the relationships between two entities.
@@ -37,6 +225,7 @@ class Link:
     uuid: UUID = attr.ib(default=None)
     props: dict = attr.ib(default=None)
     label: str = attr.ib(default=None)
+    _rendered: dict = attr.ib(default=None, init=False, eq=False)  # see `memoized`
 
     def __repr__(self) -> str:
         """
@@ -45,15 +234,33 @@ class Link:
 
         [ r:Label { <key>:<value>, <key>:<value> } ]
         """
-        labelStr = f":{self.label}" if self.label else ""
-        combined = {"uuid": self.uuid, "rank": self.rank, **(self.props or {})}
-        nonNullValues = tuple(
-            filter(lambda x: x, map(processKeyValueInbound, combined.items()))
-        )
-        pattern = (
-            "" if len(nonNullValues) == 0 else f"""{{ {', '.join(nonNullValues)} }}"""
-        )
-        return f"[ {self._symbol}{labelStr} {pattern} ]"
+        return self._pattern()
+
+    def _pattern(self, parameters: dict = None) -> str:
+        """
+        Format the Link pattern. If a `parameters` dictionary is supplied, values
+        are added to it and referenced as `$<symbol>_<key>` instead of being
+        written into the query text.
+
+        [ r:Label { <key>: $r_<key>, <key>: $r_<key> } ]
+
+        The pattern is memoized, see `memoized`.
+        """
+        combined = (("uuid", self.uuid), ("rank", self.rank), *(self.props or {}).items())
+
+        def _render(rendered: dict or None) -> str:
+            labelStr = f":{self.label}" if self.label else ""
+            if rendered is None:
+                render = processKeyValueInbound
+            else:
+                render = lambda x: processKeyValueParameter(x, self._symbol, rendered)
+            nonNullValues = tuple(filter(lambda x: x, map(render, combined)))
+            pattern = (
+                "" if len(nonNullValues) == 0 else f"""{{ {', '.join(nonNullValues)} }}"""
+            )
+            return f"[ {self._symbol}{labelStr} {pattern} ]"
+
+        return memoized(self, (self._symbol, self.label, combined), parameters, _render)
 
     @classmethod
     def drop(cls: Type, db: Driver, nodes: (Type, Type), props: dict) -> None:
@@ -62,8 +269,14 @@ class Link:
         """
         r = cls(**props)
         a, b = nodes
-        cmd = f"MATCH {repr(a)}-{repr(r)}-{repr(b)} DELETE {r._symbol}"
-        return executeQuery(db, lambda tx: tx.run(cmd), read_only=False)
+        a._setSymbol("a")
+        b._setSymbol("b")
+        parameters = dict()
+        cmd = (
+            f"MATCH {a._pattern(parameters)}-{r._pattern(parameters)}-"
+            f"{b._pattern(parameters)} DELETE {r._symbol}"
+        )
+        return executeQuery(db, lambda tx: tx.run(cmd, parameters), read_only=False)
 
     @polymorphic
     def join(
@@ -99,10 +312,14 @@ class Link:
             a._setSymbol("a")
             b._setSymbol("b")
 
-        cmd = f"MATCH {repr(a)}, {repr(b)} MERGE ({a._symbol})-{repr(L)}->({b._symbol})"
+        parameters = dict()
+        cmd = (
+            f"MATCH {a._pattern(parameters)}, {b._pattern(parameters)} "
+            f"MERGE ({a._symbol})-{L._pattern(parameters)}->({b._symbol})"
+        )
         if echo:
-            print(cmd)
-        executeQuery(db, lambda tx: tx.run(cmd), read_only=False)
+            print(cmd, parameters)
+        executeQuery(db, lambda tx: tx.run(cmd, parameters), read_only=False)
 
     @polymorphic
     def query(
@@ -111,11 +328,28 @@ class Link:
         nodes: (Any, Any),
         props: dict = None,
         result: str = "labels(b)",
+        navigation: bool = False,
+        orderBy: str = None,
+        skip: int = None,
+        limit: int = None,
+        after: (Any, str) = None,
+        stream: bool = False,
+        count: bool = False,
     ) -> (Any,):
         """
         Match and return the label set for connected entities.
 
-        Increment the pageRank every time the link is traversed.
+        With `navigation`, the label sets of the neighbors of `b` are returned
+        in the second column, for serializing without additional queries. The last
+        column is the label and `uuid` of the start node, the type, and the label
+        and `uuid` of the end node of the relationship.
+
+        The connected entities can be paged through, see `Entity.load`. With `stream`,
+        a generator of records is returned instead of a list.
+
+        With `count`, increment the pageRank of each link that is traversed, for
+        requests of users rather than bulk or internal reads. The query is read-only,
+        and counts are written later by the shared `ranks` accumulator.
         """
         if isclass(self):
             L = self(**(props or {}))  # pylint: disable=not-callable
@@ -132,26 +366,61 @@ class Link:
         a._setSymbol("a")
         b._setSymbol("b")
 
+        parameters = dict()
+        carry = f"{a._symbol}, {L._symbol}, {b._symbol}"
+        where, page = "", ""
+        if orderBy or skip or limit is not None or after is not None:
+            where, page, _ = pageClauses(
+                b._symbol, carry, type(b)._orderBy(orderBy), skip, limit, after, parameters
+            )
+
+        start, end = f"startNode({L._symbol})", f"endNode({L._symbol})"
+        key = (
+            f"[head(labels({start})), {start}.uuid, type({L._symbol}), "
+            f"head(labels({end})), {end}.uuid]"
+        )
         cmd = (
-            f"MATCH {repr(a)}-{repr(L)}-{repr(b)}"
-            f"SET r.rank = r.rank + 1 "
-            f"RETURN {result}"
+            f"MATCH {a._pattern(parameters)}-{L._pattern(parameters)}-"
+            f"{b._pattern(parameters)} "
+            + where
+            + page
+            + (
+                f"WITH {carry}, {neighborLabels(b._symbol)} AS navigation "
+                f"RETURN {result}, navigation, {key}"
+                if navigation
+                else f"RETURN {result}, {key}"
+            )
         )
 
+        traverse = (lambda keys: ranks.traverse(db, keys)) if count else (lambda _: None)
+        last = 2 if navigation else 1  # records do not support negative indices
+        if stream:
+            return streamRecords(
+                db, cmd, parameters, traverse, lambda record: record[last], lambda record: record
+            )
+
         def runQuery(tx):
-            return [r for r in tx.run(cmd)]
+            return [r for r in tx.run(cmd, parameters)]
 
-        return executeQuery(db=db, method=runQuery, read_only=True)
+        records = executeQuery(db=db, method=runQuery, read_only=True)
+        traverse(r[last] for r in records)
+        return records
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Entity:
     """
     Primitive object/entity, may have name and location
+
+    Entities are slotted, so that large results take less memory. The properties
+    are the attributes that can be given to the constructor, see `_properties`.
     """
 
     uuid: UUID = attr.ib(default=None)
     _symbol: str = attr.ib(default="n")
+    _navigation: set = attr.ib(default=None)  # labels of neighbors, if loaded
+    _rendered: dict = attr.ib(default=None, init=False, eq=False)  # see `memoized`
+    _methods: dict = attr.ib(default=None, init=False, eq=False)  # see `_bind`
 
     def __repr__(self):
         """
@@ -160,20 +429,72 @@ class Entity:
 
         (<symbol>:<class> { <var>: $<var>, <k>: <v>, <k>: <v> })
         """
-        className = str(self)
-        entity = "" if className == Entity.__name__ else f":{className}"
-        pattern = tuple(
-            filter(
-                lambda x: x is not None,
-                map(processKeyValueInbound, self._properties().items()),
+        return self._pattern()
+
+    def _pattern(self, parameters: dict = None) -> str:
+        """
+        Format the node pattern. If a `parameters` dictionary is supplied, values
+        are added to it and referenced as `$<symbol>_<key>`, so that the query
+        text is the same for every entity with the same non-null properties.
+
+        (<symbol>:<class> { <k>: $<symbol>_<k>, <k>: $<symbol>_<k> })
+
+        The label and property names come from `_compiled`, and the pattern is
+        memoized, see `memoized`.
+        """
+        entity, fields = self._compiled()
+        values = tuple(getattr(self, key) for key in fields)
+
+        def _render(rendered: dict or None) -> str:
+            if rendered is None:
+                render = processKeyValueInbound
+            else:
+                render = lambda x: processKeyValueParameter(x, self._symbol, rendered)
+            pattern = tuple(
+                filter(
+                    lambda x: x is not None,
+                    map(render, zip(fields, values)),
+                )
             )
-        )
-       
-        return f"( {self._symbol}{entity} {{ {', '.join(pattern)} }} )"
+            return f"( {self._symbol}{entity} {{ {', '.join(pattern)} }} )"
+
+        return memoized(self, (self._symbol, values), parameters, _render)
+
+    @classmethod
+    def _compiled(cls) -> (str, (str,)):
+        """
+        Label and public property names of the class, in the order they are declared,
+        which are computed once.
+        """
+        compiled = _patterns.get(cls)
+        if compiled is None:
+            label = "" if cls is Entity else f":{cls.__name__}"
+            fields = tuple(each for each in cls._fields() if each[0] != "_")
+            compiled = _patterns[cls] = (label, fields)
+        return compiled
 
     def __str__(self):
         return type(self).__name__
 
+    def _bind(self, *methods: Callable) -> Type:
+        """
+        Bind external functions as methods of this instance, to extend its capabilities
+        in an ad hoc way. They can be called as attributes.
+        """
+        self._methods = {
+            **(self._methods or {}), **{fcn.__name__: MethodType(fcn, self) for fcn in methods}
+        }
+        return self
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Methods bound to the instance by `_bind`, since slotted instances have no other
+        place for them.
+        """
+        if name != "_methods" and self._methods and name in self._methods:
+            return self._methods[name]
+        raise AttributeError(f"{type(self).__name__} has no attribute {name}")
+
     def _setSymbol(
         self, symbol: str,
     ):
@@ -185,6 +506,14 @@ class Entity:
         self._symbol = symbol
         return self
 
+    @classmethod
+    def _fields(cls) -> (str,):
+        """
+        Names of the attributes of the class that can be given to the constructor,
+        in the order they are declared, including private ones.
+        """
+        return tuple(each.name for each in attr.fields(cls) if each.init)
+
     def _properties(self, select: (str) = (), private: str = "") -> dict:
         """
         Create a filtered dictionary from the object properties.
@@ -200,12 +529,107 @@ class Entity:
             key, value = keyValue
             return (
                 not isinstance(value, Callable)
-                and isinstance(key, str)
                 and (key[: len(private)] != private if private else True)
                 and (key in select if select else True)
             )
 
-        return dict(filter(_filter, self.__dict__.items()))
+        return dict(filter(_filter, ((key, getattr(self, key)) for key in self._fields())))
+
+    @classmethod
+    def _fromNode(cls, node: Any, navigation: ([str],) = None) -> Type:
+        """
+        Create an instance from the properties of a Neo4j <Node> or dictionary.
+
+        The label sets of neighboring nodes, if any, are reduced to the distinct
+        names of the entity collections that can be navigated to.
+        """
+        def processKeyValueOutbound(keyValue: (str, Any),) -> (str, Any):
+            """
+            Special parsing for serialization on query
+            """
+            key, value = keyValue
+
+            if key[0] == "_":
+                key = key[1:]
+
+            if isinstance(value, WGS84Point):
+
+                value = {
+                    "type": "Point",
+                    "coordinates": f"{[value.longitude, value.latitude]}"
+                }
+                 
+            return key, value
+
+        entity = cls(**dict(map(processKeyValueOutbound, dict(node).items())))
+        if navigation is not None:
+            entity._navigation = set(
+                labels[0] for labels in navigation
+                if labels and not set(labels) & RESTRICTED
+            )
+        return entity
+
+    @classmethod
+    def _orderBy(cls, orderBy: str = None) -> (str, bool):
+        """
+        Parse a sort order like `name desc` into the property name and whether it
+        is descending. The property must be a public attribute of the class,
+        since it is written into the query. The default order is by `uuid`.
+
+        Only properties annotated with a scalar type can be sorted on, since the
+        value of the last entity of a page is compared in the query for the next
+        one, and points or collections would not compare.
+        """
+        key, *direction = (orderBy or "uuid").split()
+        direction = [each.lower() for each in direction]
+        fields = set(
+            a.name for a in attr.fields(cls) if a.name[0] != "_" and a.type in SORTABLE
+        )
+        if key not in fields or direction not in ([], ["asc"], ["desc"]):
+            raise ValueError(f"Cannot order {cls.__name__} by {orderBy}")
+        return key, direction == ["desc"]
+
+    @classmethod
+    def _manifest(cls, private: str = "_") -> dict:
+        """
+        Describe the public methods of the class as `TaskingCapabilities`, by name.
+
+        This only depends on the class, so it is computed once and reused.
+        """
+        key = (cls, private)
+        if key not in _manifests:
+            fields = set(a.name for a in attr.fields(cls))
+
+            def _is_not_private_or_property(x: str):
+                return (
+                    x[: len(private)] != private and 
+                    x not in fields and
+                    not isinstance(getattr(cls, x, None), property)
+                )
+
+            _manifests[key] = {
+                name: describeCapability(name, getattr(cls, name))
+                for name in filter(_is_not_private_or_property, dir(cls))
+            }
+        return _manifests[key]
+
+    def _capabilities(self, private: str = "_") -> [dict]:
+        """
+        Properties of the `TaskingCapabilities` of this entity, which are the
+        methods of the class and any methods bound to the instance.
+
+        Each has a new `uuid` and `creationTime`, which are only used if the
+        capability is not in the graph yet, since capabilities are merged by name.
+        """
+        capabilities = dict(type(self)._manifest(private))
+        for name, fcn in (self._methods or {}).items():
+            if name[: len(private)] != private:
+                capabilities[name] = describeCapability(name, fcn)
+
+        return [
+            {**each, "uuid": uuid4().hex, "creationTime": time()}
+            for each in capabilities.values()
+        ]
 
     @classmethod
     def addConstraint(cls, db: Driver, by: str) -> Callable:
@@ -224,8 +648,14 @@ class Entity:
         """
         Indexes add a unique constraint as well as speeding up queries
         on the graph database.
+
+        Indexes on point properties, like `Locations.location`, are also used for
+        bounding box and distance predicates. The syntax is that of Neo4j 3.5, which
+        the service runs, where nothing is done if the index exists.
         """
-        query = lambda tx: tx.run(f"CREATE INDEX ON : {cls.__name__}({by})")
+        if by not in attr.fields_dict(cls):
+            raise ValueError(f"{cls.__name__} has no property {by}.")
+        query = lambda tx: tx.run(f"CREATE INDEX ON :{cls.__name__}({by})")
         return executeQuery(db, query, read_only=False)
 
     @classmethod
@@ -234,9 +664,9 @@ class Entity:
         Apply new label to nodes of this class, or a specific node.
         """
         entity = cls(**kwargs)
-        query = lambda tx: tx.run(
-            f"MATCH {repr(entity)} SET {entity._symbol}:{label}"
-        ).values()
+        parameters = dict()
+        cmd = f"MATCH {entity._pattern(parameters)} SET {entity._symbol}:{label}"
+        query = lambda tx: tx.run(cmd, parameters).values()
         return executeQuery(db, query, read_only=False)
 
     @classmethod
@@ -245,9 +675,9 @@ class Entity:
         Count occurrence of a class label or pattern in Neo4j.
         """
         entity = cls(**kwargs)
-        query = lambda tx: tx.run(
-            f"MATCH {repr(entity)} RETURN count({entity._symbol})"
-        ).single()[0]
+        parameters = dict()
+        cmd = f"MATCH {entity._pattern(parameters)} RETURN count({entity._symbol})"
+        query = lambda tx: tx.run(cmd, parameters).single()[0]
         return executeQuery(db, query, read_only=True)
 
     @polymorphic
@@ -274,10 +704,11 @@ class Entity:
         - None (python value)
         - "None" (string)
 
-        Writing transactions are recursive, and can take a long time if the tasking graph
-        has not yet been built. For this reason it is desirable to populate the graph
-        with at least one instance of each data type. 
-
+        The node, its `TaskingCapabilities` and the `Has` links to them are merged
+        in a single query. Capabilities are merged by name, so they are only created
+        the first time any entity with that method is created. This needs the unique
+        constraint on `TaskingCapabilities.name` from `bathysphere index`, to find them
+        with an index, and so that concurrent creates do not make duplicates.
         """
 
         if isclass(self):
@@ -285,62 +716,104 @@ class Entity:
         else:
             entity = self
 
-        executeQuery(db, lambda tx: tx.run(f"MERGE {repr(entity)}"))
-        if isinstance(entity, TaskingCapabilities):  # prevent recursion
-            return entity
-
-        for fcn in bind:  # bind user defined methods
-            setattr(entity, fcn.__name__, MethodType(fcn, entity))
-
-        existingCapabilities: dict = {
-            x.name: x.uuid for x in TaskingCapabilities().load(db=db)
-        }
+        entity._bind(*bind)
+
+        parameters = dict()
+        cmd = f"MERGE {entity._pattern(parameters)}"
+        if not isinstance(entity, TaskingCapabilities):
+            parameters["capabilities"] = entity._capabilities(private=private)
+            cmd += (
+                f" WITH {entity._symbol} "
+                "UNWIND $capabilities AS capability "
+                "MERGE (c:TaskingCapabilities { name: capability.name }) "
+                "ON CREATE SET c += capability "
+                f"MERGE ({entity._symbol})-[:Has]->(c)"
+            )
+        executeQuery(db, lambda tx: tx.run(cmd, parameters), read_only=False)
+        return entity
 
-        _generator = filter(
-            lambda x: isinstance(x[1], Callable), entity.__dict__.items()
-        )
+    @classmethod
+    def createMany(
+        cls,
+        db: Driver,
+        items: (Any,),
+        links: ((Any, Link),) = (),
+        chunkSize: int = 500,
+        private: str = "_",
+    ) -> [dict]:
+        """
+        Create many nodes of one class, with one `UNWIND` query and transaction
+        per chunk of `chunkSize` items.
 
-        def _is_not_private_or_property(x: str):
-            return (
-                x[: len(private)] != private and 
-                not isinstance(getattr(type(entity), x, None), property)
-            )
+        Items may be dictionaries of properties or instances, and may come from a generator.
+        Nodes are merged by `uuid`, which is generated if missing, so a failed chunk can
+        be retried without making duplicates. Each node is linked to all `TaskingCapabilities`,
+        which are merged the same as in `create`, and from each node of the (node, Link)
+        pairs in `links`.
 
-        boundMethods = set(y[0] for y in _generator)
-        classMethods = set(filter(_is_not_private_or_property, dir(entity)))
-        instanceKeys: set = (boundMethods | classMethods) - set(entity._properties())
-        existingKeys = set(existingCapabilities.keys())
-
-        for name in (instanceKeys - existingKeys):
-            fcn = eval(f"{type(entity).__name__}.{name}")
-            tcUuid = uuid4().hex
-            existingCapabilities[name] = tcUuid
-            _ = TaskingCapabilities(
-                name=name,
-                creationTime=time(),
-                uuid=tcUuid,
-                description=fcn.__doc__,
-                taskingParameters=list(
-                    {
-                        "name": b.name,
-                        "description": "",
-                        "type": "",
-                        "allowedTokens": [""],
-                    }
-                    for b in signature(fcn).parameters.values()
-                )
-            ).create(
-                db=db
+        Returns one report per chunk, with either the created `uuid` values or the error.
+        Bound methods are not supported, use `create` for those.
+        """
+        parameters = {"capabilities": cls()._capabilities(private=private)}
+        match = []
+        merge = []
+        for ii, (node, link) in enumerate(links):
+            node._setSymbol(f"p{ii}")
+            match.append(node._pattern(parameters))
+            L = attr.evolve(link, symbol=f"r{ii}")
+            merge.append(f"MERGE ({node._symbol})-{L._pattern(parameters)}->(n) ")
+        carry = "".join(f"p{ii}, " for ii in range(len(links)))
+
+        def toRow(item: Any) -> dict:
+            """Convert each item into a map of properties, and a map of points"""
+            entity = item if isinstance(item, cls) else cls(**item)
+            row = {"uuid": entity.uuid or uuid4().hex, "props": dict(), "points": dict()}
+            for key, value in entity._properties(private=private).items():
+                converted = processValueParameter((key, value))
+                if converted is None or key == "uuid":
+                    continue
+                row["points" if isinstance(converted, dict) else "props"][key] = converted
+            return row
+
+        def writeChunk(rows: [dict]) -> [str]:
+            points = sorted(set(key for row in rows for key in row["points"]))
+            cmd = (
+                (f"MATCH {', '.join(match)} " if match else "")
+                + "UNWIND $capabilities AS capability "
+                + "MERGE (c:TaskingCapabilities { name: capability.name }) "
+                + "ON CREATE SET c += capability "
+                + f"WITH {carry}collect(c) AS capabilities "
+                + "UNWIND $rows AS row "
+                + f"MERGE (n:{cls.__name__} {{ uuid: row.uuid }}) "
+                + "SET n += row.props"
+                + "".join(f", n.{key} = point(row.points.{key})" for key in points)
+                + " "
+                + "".join(merge)
+                + "FOREACH (c IN capabilities | MERGE (n)-[:Has]->(c)) "
+                + "RETURN n.uuid"
             )
-
-        linkPattern = Link(label="Has")
-        for tcUuid in existingCapabilities.values():
-            linkPattern.join(
+            return executeQuery(
                 db=db,
-                nodes=(entity, TaskingCapabilities(uuid=tcUuid))
+                read_only=False,
+                method=lambda tx: [
+                    r[0] for r in tx.run(cmd, {**parameters, "rows": rows})
+                ],
             )
-        
-        return entity
+
+        iterator = iter(items)
+        report = []
+        while True:
+            chunk = list(islice(iterator, chunkSize))
+            if not chunk:
+                break
+            index = len(report)
+            try:
+                created = writeChunk(list(map(toRow, chunk)))
+            except Exception as ex:  # pylint: disable=broad-except
+                report.append({"chunk": index, "count": len(chunk), "error": f"{ex}"})
+            else:
+                report.append({"chunk": index, "count": len(created), "created": created})
+        return report
 
     @polymorphic
     def delete(self, db: Driver, pattern: dict = None) -> None:
@@ -356,12 +829,12 @@ class Entity:
         else:
             entity = self
 
+        parameters = dict()
+        cmd = f"MATCH {entity._pattern(parameters)} DETACH DELETE {entity._symbol}"
         return executeQuery(
             db=db,
             read_only=False,
-            method=lambda tx: tx.run(
-                f"MATCH {repr(entity)} DETACH DELETE {entity._symbol}"
-            ).values(),
+            method=lambda tx: tx.run(cmd, parameters).values(),
         )
 
     @classmethod
@@ -379,11 +852,41 @@ class Entity:
         annotate: str = "Get",
         result: str = None,
         echo: bool = False,
+        navigation: bool = False,
+        orderBy: str = None,
+        skip: int = None,
+        limit: int = None,
+        after: (Any, str) = None,
+        stream: bool = False,
+        bbox: (float, float, float, float) = None,
+        near: (float, float) = None,
+        radius: float = None,
+        uuids: [str] = None,
         **kwargs: dict,
     ) -> [Type]:
         """
         Create entity instance from a dictionary or Neo4j <Node>, which has an items() method
         that works the same as the dictionary method.
+
+        If a `user` is given, the retrieval is counted on an `annotate` relationship
+        from the user to each node. The query itself is read-only, and the counts are
+        written later by the shared `ranks` accumulator.
+
+        With `navigation`, the labels of neighboring nodes are fetched in the same
+        query, so that `serialize` does not need to query for each entity.
+
+        Results are paged in the database when any of `orderBy` (a property name, optionally
+        followed by `asc` or `desc`), `skip`, `limit` or `after` are given. The `after`
+        tuple is the sort value and `uuid` of the last entity of the previous page.
+
+        With `stream`, a generator of entities is returned, which reads from the
+        result cursor as it is consumed.
+
+        Entities with a `location` point can be filtered by `bbox`, or by `near` and
+        `radius`, see `spatialClause`. Create an index with `addIndex(db, "location")`
+        to avoid scanning all of them.
+
+        Known entities can be loaded together by giving their `uuids`.
         """
         if isclass(self):
             entity = self(**(kwargs or {}))  # pylint: disable=not-callable
@@ -392,52 +895,57 @@ class Entity:
             entity = self
             cls = type(self)
 
-        cmd = (
-            (
-                f"MATCH {repr(entity)}, {repr(user)} "
-                f"MERGE ({entity._symbol})<-[r:{annotate}]-({user._symbol}) "
-                f"ON CREATE SET r.rank = 1 "
-                f"ON MATCH SET r.rank = r.rank + 1 "
-                f"RETURN {entity._symbol}{'.{}'.format(result) if result else ''}"
-            )
-            if user
-            else (
-                f"MATCH {repr(entity)} "
-                f"RETURN {entity._symbol}{'.{}'.format(result) if result else ''}"
+        symbol = entity._symbol
+        parameters = dict()
+        where, page = "", ""
+        if orderBy or skip or limit is not None or after is not None:
+            where, page, _ = pageClauses(
+                symbol, symbol, cls._orderBy(orderBy), skip, limit, after, parameters
             )
+        if bbox is not None or near is not None:
+            if "location" not in attr.fields_dict(cls):
+                raise ValueError(f"{cls.__name__} cannot be filtered by location.")
+            spatial = spatialClause(symbol, "location", bbox, near, radius, parameters)
+            where = f"{where}AND {spatial} " if where else f"WHERE {spatial} "
+        if uuids is not None:
+            parameters["uuids"] = list(uuids)
+            clause = f"{symbol}.uuid IN $uuids"
+            where = f"{where}AND {clause} " if where else f"WHERE {clause} "
+
+        cmd = (
+            f"MATCH {entity._pattern(parameters)} "
+            + where
+            + page
+            + (f"WITH {symbol}, {neighborLabels(symbol)} AS navigation " if navigation else "")
+            + f"RETURN {symbol}{'.{}'.format(result) if result else ''}, {symbol}.uuid"
+            + (", navigation" if navigation else "")
         )
 
         if echo:
-            print(cmd)
-
-        def processKeyValueOutbound(keyValue: (str, Any),) -> (str, Any):
-            """
-            Special parsing for serialization on query
-            """
-            key, value = keyValue
-
-            if key[0] == "_":
-                key = key[1:]
-
-            if isinstance(value, WGS84Point):
-
-                value = {
-                    "type": "Point",
-                    "coordinates": f"{[value.longitude, value.latitude]}"
-                }
-                 
-            return key, value
+            print(cmd, parameters)
 
         def transducer(record: Record):
-            return cls(**dict(map(processKeyValueOutbound, dict(record[0]).items())))
+            return cls._fromNode(record[0], record[2] if navigation else None)
+
+        if stream:
+            return streamRecords(
+                db, cmd, parameters,
+                lambda uuids: ranks.annotate(
+                    db, str(entity), annotate, user.uuid, uuids
+                ) if user else None,
+                lambda record: record[1], transducer
+            )
 
         def runQuery(tx):
-            result = tx.run(cmd)
+            result = tx.run(cmd, parameters)
             return [r for r in result]
 
-        return list(map(transducer, executeQuery(
-            db=db, method=runQuery, read_only=True
-        )))
+        records = executeQuery(db=db, method=runQuery, read_only=True)
+        if user:
+            ranks.annotate(
+                db, str(entity), annotate, user.uuid, (r[1] for r in records)
+            )
+        return list(map(transducer, records))
 
     @polymorphic
     def mutate(self: Type, db: Driver, data: dict, pattern: dict = None) -> None:
@@ -451,13 +959,19 @@ class Entity:
         else:
             entity = self
 
-        _updates = ", ".join(map(processKeyValueInbound, data.items()))
+        parameters = dict()
+        _updates = ", ".join(filter(lambda x: x is not None, map(
+            lambda x: processKeyValueParameter(x, f"{entity._symbol}_set", parameters),
+            data.items()
+        )))
+        cmd = (
+            f"MATCH {entity._pattern(parameters)} "
+            f"SET {entity._symbol} += {{ {_updates} }}"
+        )
         executeQuery(
             db=db,
             read_only=False,
-            method=lambda tx: tx.run(
-                f"MATCH {repr(entity)} SET {entity._symbol} += {{ {_updates} }}"
-            ),
+            method=lambda tx: tx.run(cmd, parameters),
         )
 
     def serialize(
@@ -469,6 +983,9 @@ class Entity:
         Filter properties by selected names, if any.
         Remove private members that include a underscore,
         since SensorThings notation is title case
+
+        Navigation links are queried from the graph, unless they were fetched
+        by `load(navigation=True)`.
         """
         props = self._properties(select=select, private="_")
         uuid = self.uuid
@@ -479,7 +996,9 @@ class Entity:
         )
 
         linkedEntities = set()
-        if db is not None:
+        if self._navigation is not None:
+            linkedEntities = self._navigation
+        elif db is not None:
             _filter = lambda x: len(set(x[0]) & RESTRICTED) == 0
             _reduce = lambda y, z: y | {z[0][0]}
             safe = filter(_filter, Link().query(db=db, nodes=(self, Entity())))
@@ -497,7 +1016,7 @@ class Entity:
         }
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Actuators(Entity):
     """
     Actuators are devices that turn messages into physical effects
@@ -510,7 +1029,7 @@ class Actuators(Entity):
     networkAddress: (str, int) = attr.ib(default=(None, None))
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Assets(Entity):
     """
     Assets are references to externaldata objects, which may or may not
@@ -527,7 +1046,7 @@ class Assets(Entity):
     location: str = attr.ib(default=None)
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Collections(Entity):
     """
     Collections are arbitrary groupings of entities.
@@ -541,7 +1060,7 @@ class Collections(Entity):
 
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class DataStreams(Entity):
     """
     DataStreams are collections of Observations.
@@ -558,9 +1077,135 @@ class DataStreams(Entity):
     resultTime: (datetime, datetime) = attr.ib(
         default=None
     )  # result times interval, ISO8601
+    storage: dict = attr.ib(default=None)  # summary of Observations stored outside the graph
+
+    def ingest(
+        self,
+        db: Driver,
+        phenomenonTime: (Any,),
+        result: (Any,),
+        resultQuality: (Any,) = None,
+        resultTime: (Any,) = None,
+        chunkSize: int = 10000,
+        store: Any = None,
+    ) -> [dict]:
+        """
+        Create Observations of this DataStream from columns of equal length, with one
+        `UNWIND` query and transaction per chunk of `chunkSize` rows.
+
+        Chunks are sent as columns rather than a list of maps, which is much less to
+        encode, and Observations are created rather than merged, because they are new.
+        They are not linked to `TaskingCapabilities`, as they would be by `create`.
+
+        With a `store` (see `bathysphere.series.SegmentStore`), times and numeric results
+        are appended to it instead, and only its summary is updated in the graph. The
+        quality and result time columns are not stored.
+
+        Returns one report per chunk, with the number created or the error.
+        """
+        times = toTime(phenomenonTime)
+        if store is not None:
+            if resultQuality is not None or resultTime is not None:
+                raise ValueError("Only phenomenonTime and result columns can be stored.")
+            summary = store.append(self.uuid, phenomenonTime, result)
+            self.mutate(db=db, data={"storage": summary})
+            self.extendEnvelope(db=db, phenomenonTime=envelope(times))
+            return [{"chunk": 0, "count": len(result)}]
+
+        columns = {
+            "phenomenonTime": phenomenonTime,
+            "result": result,
+            "resultQuality": resultQuality,
+            "resultTime": resultTime,
+        }
+        total = len(result)
+        if any(v is not None and len(v) != total for v in columns.values()):
+            raise ValueError("Observation columns must have the same length.")
+
+        self._setSymbol("d")
+        parameters = dict()
+        link = Link(label="Linked", props={"confidence": 1.0, "cost": 1.0})
+        cmd = (
+            f"MATCH {self._pattern(parameters)} "
+            "UNWIND range(0, size($result) - 1) AS i "
+            f"CREATE (d)-{link._pattern(parameters)}->"
+            "(n:Observations { uuid: replace(randomUUID(), '-', ''), "
+            + ", ".join(f"{key}: ${key}[i]" for key in columns)
+            + " }) RETURN count(n)"
+        )
+
+        received = None if resultTime is None else toTime(resultTime)
+        written = {"phenomenonTime": [], "resultTime": []}
+        report = []
+        for start in range(0, total, chunkSize):
+            chunk = {
+                key: None if values is None else list(values[start:start + chunkSize])
+                for key, values in columns.items()
+            }
+            count = len(chunk["result"])
+            parameters.update(chunk)
+            try:
+                created = executeQuery(
+                    db=db,
+                    read_only=False,
+                    method=lambda tx: tx.run(cmd, parameters).single()[0],
+                )
+            except Exception as ex:  # pylint: disable=broad-except
+                report.append({"chunk": len(report), "count": count, "error": f"{ex}"})
+                continue
+            report.append({"chunk": len(report), "count": created})
+            written["phenomenonTime"].extend(envelope(times[start:start + chunkSize]) or ())
+            if received is not None:
+                written["resultTime"].extend(envelope(received[start:start + chunkSize]) or ())
+
+        self.extendEnvelope(
+            db=db, **{key: envelope(toTime(value)) for key, value in written.items()}
+        )
+        return report
+
+    def extendEnvelope(self, db: Driver, **intervals: [str]) -> None:
+        """
+        Widen the `phenomenonTime` and `resultTime` intervals to include new Observations,
+        without reading the existing ones.
+
+        The node is locked before the current intervals are read, so that concurrent
+        updates are not lost.
+        """
+        intervals = {key: value for key, value in intervals.items() if value}
+        if not intervals:
+            return None
+
+        self._setSymbol("d")
+        parameters = dict()
+        pattern = self._pattern(parameters)
+
+        def update(tx):
+            current = tx.run(
+                f"MATCH {pattern} SET d._lock = true RETURN "
+                + ", ".join(f"d.{key}" for key in intervals),
+                parameters,
+            ).single()
+            if current is None:
+                return None
+            data = dict()
+            for (key, interval), previous in zip(intervals.items(), current):
+                if isinstance(previous, str):
+                    previous = loads(previous)
+                try:
+                    data[key] = envelope(toTime([*(previous or ()), *interval]))
+                except ValueError:
+                    data[key] = interval
+            updates = ", ".join(
+                processKeyValueParameter(each, "d_set", parameters) for each in data.items()
+            )
+            return tx.run(
+                f"MATCH {pattern} SET d += {{ {updates} }} REMOVE d._lock", parameters
+            ).consume()
+
+        return executeQuery(db=db, method=update, read_only=False)
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class FeaturesOfInterest(Entity):
     """
     FeaturesOfInterest are usually Locations.
@@ -571,7 +1216,7 @@ class FeaturesOfInterest(Entity):
     feature: Any = attr.ib(default=None)
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Locations(Entity):
     """
     Last known `Locations` of `Things`. May be `FeaturesOfInterest`, unless remote sensing.
@@ -584,7 +1229,7 @@ class Locations(Entity):
     name: str = attr.ib(default=None)
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class HistoricalLocations(Entity):
     """
     Private and automatic, should be added to sensor when new location is determined
@@ -594,7 +1239,7 @@ class HistoricalLocations(Entity):
     )  # time when thing was at location (ISO-8601 string)
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Sensors(Entity):
     """
     Sensors are devices that observe processes
@@ -605,7 +1250,7 @@ class Sensors(Entity):
     metadata: Any = attr.ib(default=None)
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Observations(Entity):
     """Graph extension to base model"""
     """
@@ -628,7 +1273,7 @@ class Observations(Entity):
         return (self.result > maximum) | (self.result < minimum)
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class ObservedProperties(Entity):
     """
     Create a property, but do not associate any data streams with it
@@ -638,7 +1283,7 @@ class ObservedProperties(Entity):
     definition: str = attr.ib(default=None)  #  URL to reference defining the property
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Providers(Entity):
     """
     Providers are generally organization or enterprise sub-units. This is used to
@@ -655,7 +1300,7 @@ class Providers(Entity):
 
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class TaskingCapabilities(Entity):
     """
     Graph extension to base model. TaskingCapabilities may be called
@@ -669,12 +1314,12 @@ class TaskingCapabilities(Entity):
     taskingParameters: dict = attr.ib(default=None)
 
     def serialize(self, *args, **kwargs):
-        _default = super(TaskingCapabilities, self).serialize(*args, **kwargs)
+        _default = Entity.serialize(self, *args, **kwargs)
         _default["creationTime"] = f'{datetime.fromtimestamp(_default["creationTime"])}'
         return _default
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Tasks(Entity):
     """
     Tasks are connected to `Things` and `TaskingCapabilities`.
@@ -685,7 +1330,7 @@ class Tasks(Entity):
     taskingParameters: dict = attr.ib(default=None)
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class Things(Entity):
     """
     A thing is an object of the physical or information world that is capable of of being identified
@@ -719,7 +1364,7 @@ class Things(Entity):
         return response, 200
 
 
-@attr.s(repr=False)
+@attr.s(repr=False, slots=True)
 class User(Entity):
     """
     Create a user entity. Users contain authorization secrets, and do not enter/leave
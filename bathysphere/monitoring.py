@@ -0,0 +1,253 @@
+# pylint: disable=invalid-name
+"""
+Counters and histograms for monitoring, in the Prometheus text exposition format.
+
+Updates only touch a dictionary in the process that makes them. Under gunicorn,
+each worker also writes a snapshot of its values to a shared directory every few
+seconds, and a scrape of any worker sums the snapshots of all of them. Counters
+of workers that have exited are kept, so that totals do not go down, while the
+gauges of exited workers are dropped. Snapshots are named by the boot, which is the
+process id of the gunicorn master, so that those of earlier boots are removed
+instead of summed.
+"""
+from bisect import bisect_left
+from json import dumps, loads
+from math import inf
+from os import getpid, getppid, kill, replace
+from pathlib import Path
+from threading import Lock, Thread
+from time import sleep
+from typing import Any, Callable
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def alive(pid: int) -> bool:
+    """
+    Whether a process exists.
+    """
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def renderLabels(labels: ((str, Any),)) -> str:
+    """
+    Label set of a sample, with values escaped.
+    """
+    if not labels:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+class Registry:
+    """
+    Metric families and their values in this process.
+
+    Families are declared with `counter`, `histogram` or `gauge`, and updated with
+    `inc` and `observe`, using keyword arguments as labels. Values that are already
+    kept elsewhere, like the statistics of a cache, are read when a snapshot is taken
+    by the functions given to `collect`.
+
+    With a `directory`, snapshots are written there every `interval` seconds by a
+    background thread, to be merged by `exposition`. Only the snapshots of the same
+    `boot` are merged, by default those of processes with the same parent.
+    """
+
+    def __init__(self, directory: str = None, interval: float = 5.0, boot: str = None):
+        self.directory = Path(directory) if directory else None
+        self.interval = interval
+        self.boot = boot
+        self._families = dict()
+        self._collectors = []
+        self._reset()
+
+    def _reset(self) -> None:
+        """
+        Forget the values and the writing thread, e.g. after forking.
+        """
+        self._lock = Lock()
+        self._values = {name: dict() for name in self._families}
+        self._thread = None
+
+    def _declare(self, name: str, kind: str, description: str, buckets: (float,) = None) -> None:
+        self._families[name] = (kind, description, buckets)
+        self._values.setdefault(name, dict())
+
+    def counter(self, name: str, description: str) -> None:
+        """
+        Declare a total that only goes up.
+        """
+        self._declare(name, "counter", description)
+
+    def histogram(self, name: str, description: str, buckets: (float,) = BUCKETS) -> None:
+        """
+        Declare a distribution of observed values, counted in buckets with upper bounds.
+        """
+        self._declare(name, "histogram", description, tuple(buckets))
+
+    def gauge(self, name: str, description: str) -> None:
+        """
+        Declare a value that can go up and down, which is summed over live processes.
+        """
+        self._declare(name, "gauge", description)
+
+    def collect(self, fcn: Callable) -> Callable:
+        """
+        Add a function that returns (name, labels, value) for counters or gauges
+        when a snapshot is taken. Returns the function, so this can be a decorator.
+        """
+        self._collectors.append(fcn)
+        return fcn
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """
+        Add to a counter.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0.0) + value
+        self._start()
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """
+        Count a value in the buckets of a histogram.
+        """
+        buckets = self._families[name][2]
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(buckets, value)
+        with self._lock:
+            values = self._values[name]
+            counts = values.get(key)
+            if counts is None:
+                counts = values[key] = [0] * (len(buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+        self._start()
+
+    def snapshot(self) -> dict:
+        """
+        Copy of the values of this process, including those of the collectors, with
+        label sets as lists of pairs.
+        """
+        with self._lock:
+            values = {
+                name: {key: list(value) if isinstance(value, list) else value for key, value in each.items()}
+                for name, each in self._values.items()
+            }
+        for fcn in self._collectors:
+            for name, labels, value in fcn():
+                values.setdefault(name, dict())[tuple(sorted(labels.items()))] = value
+        return {name: [[list(key), value] for key, value in each.items()] for name, each in values.items()}
+
+    def dump(self) -> None:
+        """
+        Write the snapshot of this process to the directory, replacing the last one.
+        """
+        if self.directory is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self._boot()}-{getpid()}.json"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(dumps(self.snapshot()))
+        replace(temporary, path)
+
+    def _boot(self) -> str:
+        """
+        Name of the boot. Workers read the process id of their parent when they write or
+        merge snapshots, after forking, so it is the same with `gunicorn --preload`.
+        """
+        return self.boot or str(getppid())
+
+    def _start(self) -> None:
+        """
+        Start writing snapshots in this process, if there is a directory and the
+        thread is not running.
+        """
+        if self.directory is None or (self._thread is not None and self._thread.is_alive()):
+            return
+
+        def _loop():
+            while True:
+                sleep(self.interval)
+                try:
+                    self.dump()
+                except OSError as ex:
+                    print(f"Could not write metrics: {ex}")
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=_loop, daemon=True)
+                self._thread.start()
+
+    def merged(self) -> dict:
+        """
+        Sum of the values of all processes of this boot that wrote to the directory,
+        with the current values of this one. Snapshots of other boots are removed.
+        """
+        snapshots = {getpid(): self.snapshot()}
+        if self.directory is not None and self.directory.is_dir():
+            boot = self._boot()
+            for path in self.directory.glob("*.json"):
+                prefix, _, pid = path.stem.rpartition("-")
+                if prefix != boot:
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+                    continue
+                pid = int(pid)
+                if pid in snapshots:
+                    continue
+                try:
+                    snapshots[pid] = loads(path.read_text())
+                except (OSError, ValueError):
+                    continue
+
+        merged = {name: dict() for name in self._families}
+        for pid, snapshot in snapshots.items():
+            live = None
+            for name, samples in snapshot.items():
+                if name not in self._families:
+                    continue
+                if self._families[name][0] == "gauge":
+                    live = alive(pid) if live is None else live
+                    if not live:
+                        continue
+                values = merged[name]
+                for labels, value in samples:
+                    key = tuple(tuple(pair) for pair in labels)
+                    if isinstance(value, list):
+                        total = values.get(key)
+                        values[key] = value if total is None else [a + b for a, b in zip(total, value)]
+                    else:
+                        values[key] = values.get(key, 0) + value
+        return merged
+
+    def exposition(self) -> str:
+        """
+        All families in the Prometheus text format, version 0.0.4.
+        """
+        lines = []
+        for name, values in self.merged().items():
+            kind, description, buckets = self._families[name]
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(values.items()):
+                if kind != "histogram":
+                    lines.append(f"{name}{renderLabels(key)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip((*buckets, inf), value):
+                    cumulative += count
+                    le = "+Inf" if bound == inf else repr(bound)
+                    lines.append(f"{name}_bucket{renderLabels((*key, ('le', le)))} {cumulative}")
+                lines.append(f"{name}_sum{renderLabels(key)} {value[-1]}")
+                lines.append(f"{name}_count{renderLabels(key)} {cumulative}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,182 @@
+# pylint: disable=invalid-name
+"""
+Ingestion of Lagrangian particle tracks from simulation output.
+
+Each simulation is a numbered directory under a common source, with a track file
+in which every line is a time followed by the id, x, y and z of each particle.
+Files are read one line at a time, so that memory does not grow with file size,
+and simulations are processed in parallel by a pool of worker processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from csv import writer
+from pathlib import Path
+from shutil import copyfileobj
+from typing import Generator
+
+from numpy import asarray, concatenate, float64, full, int64, ndarray
+
+from bathysphere import getDriver, executeQuery, writeColumns
+
+COLUMNS = ("time", "particle", "x", "y", "z")
+
+
+def simulations(source: str) -> [Path]:
+    """
+    Numbered simulation directories under `source`, in numeric order.
+    """
+    return sorted(
+        (each for each in Path(source).iterdir() if each.is_dir() and each.name.isdigit()),
+        key=lambda each: int(each.name),
+    )
+
+
+def positions(path: Path) -> Generator:
+    """
+    Time and an (N, 4) array of particle id, x, y and z, for each line of a track file.
+    """
+    with open(path) as source:
+        for line in source:
+            fields = line.split(maxsplit=1)
+            if len(fields) < 2:
+                continue
+            values = asarray(fields[1].split(), dtype=float64)
+            if values.size % 4:
+                raise ValueError(f"Incomplete particle at time {fields[0]} in {path}")
+            yield fields[0], values.reshape(-1, 4)
+
+
+def batches(path: Path, chunkSize: int = 10000) -> Generator:
+    """
+    Columns of particle positions, in batches of at least `chunkSize` rows unless they
+    are the last, with the time repeated for each particle.
+    """
+    pending, size = [], 0
+    for time, values in positions(path):
+        pending.append((full(len(values), time, dtype=object), values))
+        size += len(values)
+        if size >= chunkSize:
+            yield _columns(pending)
+            pending, size = [], 0
+    if pending:
+        yield _columns(pending)
+
+
+def _columns(pending: [(ndarray, ndarray)]) -> dict:
+    times, values = zip(*pending)
+    values = concatenate(values)
+    return dict(zip(COLUMNS, (
+        concatenate(times), values[:, 0].astype(int64), values[:, 1], values[:, 2], values[:, 3]
+    )))
+
+
+def writeCsv(simulation: Path, filename: str, particleType: str, out: str) -> int:
+    """
+    Write rows of simulation, particle type, time, particle id and position as WKT to a
+    CSV file. Returns the number of rows.
+    """
+    count = 0
+    with open(out, "w", newline="") as target:
+        csv = writer(target, delimiter=",")
+        for columns in batches(simulation / filename):
+            csv.writerows(
+                (simulation.name, particleType, time, particle, f"POINT({x} {y} {z})")
+                for time, particle, x, y, z in zip(*(columns[key].tolist() for key in COLUMNS))
+            )
+            count += len(columns["particle"])
+    return count
+
+
+def writeGraph(
+    simulation: Path,
+    filename: str,
+    particleType: str,
+    host: str,
+    port: int,
+    accessKey: str,
+    chunkSize: int = 10000,
+) -> int:
+    """
+    Create a `Particles` node for each position, with one transaction per batch. Each
+    worker process connects on its own. Returns the number of nodes.
+    """
+    db = getDriver(host, port, accessKey)
+    cmd = (
+        "UNWIND range(0, size($particle) - 1) AS i "
+        "CREATE (:Particles { simulation: $simulation, type: $type, time: $time[i], "
+        "id: $particle[i], location: point({x: $x[i], y: $y[i], z: $z[i]}) })"
+    )
+    count = 0
+    for columns in batches(simulation / filename, chunkSize):
+        count += writeColumns(
+            db, cmd, columns, chunkSize, simulation=simulation.name, type=particleType
+        )["count"]
+    return count
+
+
+def toCsv(
+    source: str, filename: str, particleType: str, out: str, mode: str = "w",
+    workers: int = None
+) -> Generator:
+    """
+    Convert the track files of all simulations to one CSV file, written (`w`) or
+    appended (`a`) in simulation order. Workers write a part file for each simulation,
+    which is copied into the output and removed.
+
+    If a worker fails, or the caller stops early, simulations that have not started
+    are cancelled, and the part files are removed once the others finish.
+
+    Yields each simulation name and number of rows.
+    """
+    parts = [
+        (simulation, Path(f"{out}.{simulation.name}.part"))
+        for simulation in simulations(source)
+        if (simulation / filename).is_file()
+    ]
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool, open(out, mode) as target:
+            jobs = [
+                (simulation, part, pool.submit(
+                    writeCsv, simulation, filename, particleType, str(part)
+                ))
+                for simulation, part in parts
+            ]
+            try:
+                for simulation, part, job in jobs:
+                    count = job.result()
+                    with open(part) as rows:
+                        copyfileobj(rows, target)
+                    part.unlink()
+                    yield simulation.name, count
+            finally:
+                for _, _, job in jobs:
+                    job.cancel()
+    finally:
+        for _, part in parts:
+            if part.exists():
+                part.unlink()
+
+
+def toGraph(
+    source: str, filename: str, particleType: str, host: str, port: int, accessKey: str,
+    chunkSize: int = 10000, workers: int = None
+) -> Generator:
+    """
+    Load the track files of all simulations into the graph, see `writeGraph`. The
+    composite index on simulation, type and id is created first.
+
+    Yields each simulation name and number of nodes.
+    """
+    executeQuery(getDriver(host, port, accessKey), read_only=False, method=lambda tx: tx.run(
+        "CREATE INDEX ON :Particles(simulation, type, id)"
+    ).consume())
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [
+            (simulation, pool.submit(
+                writeGraph, simulation, filename, particleType, host, port, accessKey,
+                chunkSize
+            ))
+            for simulation in simulations(source)
+            if (simulation / filename).is_file()
+        ]
+        for simulation, job in jobs:
+            yield simulation.name, job.result()
@@ -0,0 +1,306 @@
+# pylint: disable=invalid-name
+"""
+Columnar storage of time series outside of the graph.
+
+Observations of each DataStream are kept as time and result columns, in
+append-only segments of fixed capacity. Segments are NumPy files that are
+memory-mapped for reading, so that range reads are slices of the mapped files
+rather than copies.
+"""
+from fcntl import flock, LOCK_EX, LOCK_UN
+from json import dumps, loads
+from os import getpid
+from pathlib import Path
+from re import fullmatch
+from typing import Any
+
+from numpy import (
+    array, asarray, argsort, searchsorted, datetime64, datetime_as_string, float64, int64,
+    ndarray, flatnonzero, concatenate, diff, append, add, minimum, maximum, arange,
+    linspace, empty, absolute, argmax
+)
+from numpy.lib.format import open_memmap
+
+from bathysphere import TimedCache
+
+TIME = "datetime64[ms]"
+COLUMNS = ("time", "result")
+
+
+def toTime(values: (Any,)) -> ndarray:
+    """
+    Convert ISO 8601 strings (UTC), or milliseconds since the epoch, to timestamps.
+    """
+    return array(
+        [v[:-1] if isinstance(v, str) and v.endswith("Z") else v for v in values],
+        dtype=TIME,
+    )
+
+
+def records(times: ndarray, values: ndarray) -> [dict]:
+    """
+    Observations as dictionaries, with times as ISO 8601 in UTC.
+    """
+    return [
+        {"phenomenonTime": time, "result": value}
+        for time, value in zip(
+            datetime_as_string(times, unit="ms", timezone="UTC").tolist(), values.tolist()
+        )
+    ]
+
+
+def envelope(times: ndarray) -> [str] or None:
+    """
+    First and last of some times, as ISO 8601 strings that sort in time order.
+    """
+    if not times.size:
+        return None
+    bounds = array([times.min(), times.max()])
+    return datetime_as_string(bounds, unit="ms", timezone="UTC").tolist()
+
+
+def window(
+    phenomenonTime: (Any,), result: (Any,), start: Any = None, end: Any = None
+) -> (ndarray, ndarray):
+    """
+    Sort observations by time, and keep those from `start` to `end` inclusive.
+    Results must be numeric.
+    """
+    times = toTime(phenomenonTime)
+    try:
+        values = asarray(result, dtype=float64)
+    except (TypeError, ValueError):
+        raise ValueError("Observations must have numeric results.")
+    order = argsort(times, kind="stable")
+    times, values = times[order], values[order]
+    lower = 0 if start is None else searchsorted(times, toTime((start,))[0], side="left")
+    upper = times.size if end is None else searchsorted(times, toTime((end,))[0], side="right")
+    return times[lower:upper], values[lower:upper]
+
+
+def aggregate(times: ndarray, values: ndarray, interval: float) -> [dict]:
+    """
+    Count, minimum, maximum and mean of sorted observations, in buckets of `interval`
+    seconds aligned to the epoch. Empty buckets are omitted.
+    """
+    width = int(interval * 1000)
+    if width <= 0:
+        raise ValueError("Aggregation interval must be at least 1 millisecond.")
+    if not times.size:
+        return []
+    buckets = times.astype(int64) // width
+    starts = flatnonzero(concatenate(([True], buckets[1:] != buckets[:-1])))
+    count = diff(append(starts, times.size))
+    total = add.reduceat(values, starts)
+    columns = (
+        datetime_as_string((buckets[starts] * width).astype(TIME), unit="ms", timezone="UTC"),
+        count,
+        minimum.reduceat(values, starts),
+        maximum.reduceat(values, starts),
+        total / count,
+    )
+    return [
+        dict(zip(("phenomenonTime", "count", "min", "max", "mean"), row))
+        for row in zip(*(column.tolist() for column in columns))
+    ]
+
+
+def downsample(times: ndarray, values: ndarray, threshold: int) -> ndarray:
+    """
+    Indices of `threshold` sorted observations that keep the visual shape of the series,
+    by Largest-Triangle-Three-Buckets. The first and last are always kept.
+
+    Areas are computed for all points of a bucket at once, so there is one iteration
+    per selected point rather than per observation.
+    """
+    size = values.size
+    if threshold >= size or threshold < 3:
+        return arange(size)
+
+    x = times.astype(int64).astype(float64)
+    y = values
+    edges = linspace(1, size - 1, threshold - 1).astype(int64)
+    selected = empty(threshold, dtype=int64)
+    selected[0], selected[-1] = 0, size - 1
+
+    previous = 0
+    for ii in range(threshold - 2):
+        lower, upper = edges[ii], edges[ii + 1]
+        after = edges[ii + 2] if ii + 2 < edges.size else size
+        cx, cy = x[upper:after].mean(), y[upper:after].mean()
+        ax, ay = x[previous], y[previous]
+        area = absolute(
+            (ax - cx) * (y[lower:upper] - ay) - (ax - x[lower:upper]) * (cy - ay)
+        )
+        previous = lower + int(argmax(area))
+        selected[ii + 1] = previous
+    return selected
+
+
+class SegmentStore:
+    """
+    Append-only, memory-mapped columns of Observations, in one directory per DataStream
+    under `root`.
+
+    The `manifest.json` of each DataStream lists its segments, with the number of
+    observations written and their time range. It is replaced after the columns are
+    written, so readers only see complete observations. Appends are serialized between
+    processes with a lock file, and must be in time order.
+    """
+
+    def __init__(self, root: str, capacity: int = 1 << 20):
+        self.root = Path(root)
+        self.capacity = capacity
+        self._maps = TimedCache(maxsize=256, ttl=3600)
+
+    def _directory(self, datastream: str) -> Path:
+        """
+        Directory of a DataStream, which must be a plain identifier.
+        """
+        if not fullmatch(r"[\w\-]+", datastream or ""):
+            raise ValueError(f"Invalid DataStream identifier: {datastream}")
+        return self.root / datastream
+
+    def manifest(self, datastream: str) -> [dict]:
+        """
+        Segments of a DataStream, or an empty list if nothing is stored.
+        """
+        try:
+            return loads((self._directory(datastream) / "manifest.json").read_text())
+        except FileNotFoundError:
+            return []
+
+    def _column(self, datastream: str, index: int, column: str) -> ndarray:
+        """
+        Read-only memory map of one column of a segment. Maps are shared between reads,
+        and see later appends to the same segment.
+        """
+        path = self._directory(datastream) / f"{index:06}.{column}.npy"
+        key = str(path)
+        mapped = self._maps.get(key)
+        if mapped is None:
+            mapped = open_memmap(key, mode="r")
+            self._maps.put(key, mapped)
+        return mapped
+
+    def append(self, datastream: str, phenomenonTime: (Any,), result: (Any,)) -> dict:
+        """
+        Add observations to the end of a DataStream, filling the last segment before
+        creating another. Observations in one call are sorted by time, but may not be
+        earlier than those already stored.
+
+        Returns the summary of the stored series.
+        """
+        if len(phenomenonTime) != len(result):
+            raise ValueError("Observation columns must have the same length.")
+        times, values = window(phenomenonTime, result)
+
+        directory = self._directory(datastream)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "lock", "w") as lock:
+            flock(lock, LOCK_EX)
+            try:
+                segments = self.manifest(datastream)
+                if times.size and segments and times[0] < datetime64(segments[-1]["end"]):
+                    raise ValueError("Observations must be appended in time order.")
+
+                offset = 0
+                while offset < times.size:
+                    if not segments or segments[-1]["count"] == self.capacity:
+                        segments.append({"index": len(segments), "count": 0})
+                        for column, dtype in zip(COLUMNS, (TIME, float64)):
+                            open_memmap(
+                                str(directory / f"{len(segments) - 1:06}.{column}.npy"),
+                                mode="w+", dtype=dtype, shape=(self.capacity,),
+                            ).flush()
+                    segment = segments[-1]
+                    count = min(self.capacity - segment["count"], times.size - offset)
+                    for column, data in zip(COLUMNS, (times, values)):
+                        mapped = open_memmap(
+                            str(directory / f"{segment['index']:06}.{column}.npy"), mode="r+"
+                        )
+                        position = segment["count"]
+                        mapped[position:position + count] = data[offset:offset + count]
+                        mapped.flush()
+                        del mapped
+                    segment.setdefault("start", str(times[offset]))
+                    segment["end"] = str(times[offset + count - 1])
+                    segment["count"] += count
+                    offset += count
+
+                temporary = directory / f"manifest.{getpid()}"
+                temporary.write_text(dumps(segments))
+                temporary.replace(directory / "manifest.json")
+            finally:
+                flock(lock, LOCK_UN)
+
+        return self.summary(segments)
+
+    def read(
+        self, datastream: str, start: Any = None, end: Any = None
+    ) -> [(ndarray, ndarray)]:
+        """
+        Time and result slices of each segment, with times from `start` to `end` inclusive.
+        The slices are views of the memory-mapped files.
+        """
+        start = None if start is None else toTime((start,))[0]
+        end = None if end is None else toTime((end,))[0]
+        slices = []
+        for segment in self.manifest(datastream):
+            if start is not None and datetime64(segment["end"]) < start:
+                continue
+            if end is not None and datetime64(segment["start"]) > end:
+                break
+            count = segment["count"]
+            times = self._column(datastream, segment["index"], "time")[:count]
+            lower = 0 if start is None else searchsorted(times, start, side="left")
+            upper = count if end is None else searchsorted(times, end, side="right")
+            if upper > lower:
+                values = self._column(datastream, segment["index"], "result")
+                slices.append((times[lower:upper], values[lower:upper]))
+        return slices
+
+    def page(
+        self, datastream: str, start: Any = None, end: Any = None, skip: int = 0,
+        limit: int = None
+    ) -> [dict]:
+        """
+        Observations in a time range, after skipping some, as dictionaries. Only the
+        slices that are returned are copied out of the memory-mapped files.
+        """
+        items = []
+        for times, values in self.read(datastream, start, end):
+            if skip >= times.size:
+                skip -= times.size
+                continue
+            count = None if limit is None else limit - len(items)
+            times = times[skip:None if count is None else skip + count]
+            values = values[skip:None if count is None else skip + count]
+            skip = 0
+            items.extend(records(times, values))
+            if limit is not None and len(items) >= limit:
+                break
+        return items
+
+    def arrays(self, datastream: str, start: Any = None, end: Any = None) -> (ndarray, ndarray):
+        """
+        Times and results in a range, copied into contiguous arrays.
+        """
+        slices = self.read(datastream, start, end)
+        if not slices:
+            return array([], dtype=TIME), array([], dtype=float64)
+        times, values = zip(*slices)
+        return concatenate(times), concatenate(values)
+
+    @staticmethod
+    def summary(segments: [dict]) -> dict:
+        """
+        Segment metadata to keep on the DataStream node in the graph.
+        """
+        return {
+            "backend": "segments",
+            "segments": len(segments),
+            "count": sum(each["count"] for each in segments),
+            "start": segments[0]["start"] if segments else None,
+            "end": segments[-1]["end"] if segments else None,
+        }
@@ -0,0 +1,310 @@
+# pylint: disable=invalid-name
+"""
+In-process spatial index of polygon-valued properties.
+
+Polygons are stored in the graph as GeoJSON strings, which Neo4j cannot
+search. The index keeps the bounding boxes of all polygons of one entity
+class in a packed R-tree, to find candidates for a point or geometry without
+parsing every polygon, and then tests the candidates exactly.
+"""
+from json import loads
+from threading import Lock
+from time import monotonic
+from typing import Any
+
+from numpy import (
+    arange, asarray, concatenate, errstate, float64, int64, lexsort, maximum, minimum,
+    ndarray, roll, stack, zeros
+)
+
+GEOMETRY = {"DataStreams": "observedArea", "FeaturesOfInterest": "feature"}
+
+
+def polygons(geometry: Any) -> [[ndarray]]:
+    """
+    Rings of each polygon of a GeoJSON Polygon, MultiPolygon, or a Feature with one of
+    those geometries, as arrays of (x, y). JSON strings are parsed. Other geometries
+    have no polygons.
+    """
+    if isinstance(geometry, (str, bytes)):
+        try:
+            geometry = loads(geometry)
+        except ValueError:
+            return []
+    if not isinstance(geometry, dict):
+        return []
+    if geometry.get("type") == "Feature":
+        geometry = geometry.get("geometry") or {}
+    kind = geometry.get("type")
+    coordinates = geometry.get("coordinates") or []
+    if kind == "Polygon":
+        coordinates = [coordinates]
+    elif kind != "MultiPolygon":
+        return []
+    return [
+        [asarray(ring, dtype=float64)[:, :2] for ring in polygon if len(ring) > 2]
+        for polygon in coordinates
+        if polygon
+    ]
+
+
+def boundingBox(shapes: [[ndarray]]) -> ndarray:
+    """
+    West, south, east and north bounds of some polygons.
+    """
+    points = concatenate([ring for polygon in shapes for ring in polygon])
+    return concatenate((points.min(axis=0), points.max(axis=0)))
+
+
+def edges(polygon: [ndarray]) -> ndarray:
+    """
+    Segments of all rings of a polygon, as an (N, 2, 2) array. Rings are closed
+    whether or not the last point repeats the first.
+    """
+    return concatenate([stack((ring, roll(ring, -1, axis=0)), axis=1) for ring in polygon])
+
+
+def containsPoints(shapes: [[ndarray]], points: ndarray) -> ndarray:
+    """
+    Whether each (x, y) point is inside any of the polygons, by counting crossings of
+    a ray from each point with all edges at once. Holes are excluded by the even-odd
+    rule. Points on an edge may be inside or out.
+    """
+    inside = zeros(len(points), dtype=bool)
+    px, py = points[:, :1], points[:, 1:2]
+    for polygon in shapes:
+        segments = edges(polygon)
+        x1, y1 = segments[:, 0, 0], segments[:, 0, 1]
+        x2, y2 = segments[:, 1, 0], segments[:, 1, 1]
+        straddles = (y1 > py) != (y2 > py)
+        with errstate(divide="ignore", invalid="ignore"):
+            crossing = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        inside |= (straddles & (px < crossing)).sum(axis=1) % 2 == 1
+    return inside
+
+
+def segmentsIntersect(a: ndarray, b: ndarray) -> bool:
+    """
+    Whether any segment of `a` touches any segment of `b`, testing all pairs at once
+    by the orientation of their end points.
+    """
+    p, r = a[:, None, 0], a[:, None, 1] - a[:, None, 0]
+    q, s = b[None, :, 0], b[None, :, 1] - b[None, :, 0]
+
+    def cross(u, v):
+        return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+    denominator = cross(r, s)
+    offset = q - p
+    with errstate(divide="ignore", invalid="ignore"):
+        t = cross(offset, s) / denominator
+        u = cross(offset, r) / denominator
+    proper = (denominator != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    if proper.any():
+        return True
+
+    # parallel segments touch if they are on one line and their extents overlap
+    collinear = (denominator == 0) & (cross(offset, r) == 0)
+    if not collinear.any():
+        return False
+    lower = minimum(a[:, None, 0], a[:, None, 1])
+    upper = maximum(a[:, None, 0], a[:, None, 1])
+    otherLower = minimum(b[None, :, 0], b[None, :, 1])
+    otherUpper = maximum(b[None, :, 0], b[None, :, 1])
+    overlap = ((lower <= otherUpper) & (otherLower <= upper)).all(axis=-1)
+    return bool((collinear & overlap).any())
+
+
+def intersects(shapes: [[ndarray]], other: [[ndarray]]) -> bool:
+    """
+    Whether two sets of polygons share any point: their edges cross, or one is
+    inside the other.
+    """
+    for polygon in shapes:
+        for otherPolygon in other:
+            if segmentsIntersect(edges(polygon), edges(otherPolygon)):
+                return True
+            if containsPoints([otherPolygon], polygon[0][:1]).any():
+                return True
+            if containsPoints([polygon], otherPolygon[0][:1]).any():
+                return True
+    return False
+
+
+def overlaps(boxes: ndarray, box: ndarray) -> ndarray:
+    """
+    Whether each of the bounding boxes overlaps one box.
+    """
+    return (
+        (boxes[:, 0] <= box[2]) & (box[0] <= boxes[:, 2])
+        & (boxes[:, 1] <= box[3]) & (box[1] <= boxes[:, 3])
+    )
+
+
+class PolygonIndex:
+    """
+    Sort-Tile-Recursive packed R-tree over the bounding boxes of polygons, with
+    incremental updates.
+
+    Polygons added or changed after the tree was built are kept in a pending list,
+    which is searched linearly, and their old entries in the tree are ignored. The tree
+    is rebuilt once there are more than `rebuild` of these. Each level of the tree is
+    one array of boxes, so searches test all the nodes of a level at once.
+
+    Other processes may change the graph, so the index should be reloaded once it
+    is older than `ttl` seconds.
+    """
+
+    def __init__(self, capacity: int = 16, rebuild: int = 256, ttl: float = 60.0):
+        self.capacity = capacity
+        self.rebuild = rebuild
+        self.ttl = ttl
+        self.loaded = None
+        self._lock = Lock()
+        self._shapes = dict()
+        self._boxes = dict()
+        self._levels = []
+        self._keys = []
+        self._pending = dict()
+        self._stale = set()
+
+    def __len__(self) -> int:
+        return len(self._shapes)
+
+    def expired(self) -> bool:
+        """
+        Whether the index needs to be loaded again.
+        """
+        return self.loaded is None or monotonic() - self.loaded > self.ttl
+
+    def expire(self) -> None:
+        """
+        Load the index again before the next search, after changes that were not
+        applied to it.
+        """
+        self.loaded = None
+
+    def reset(self, items: ((str, Any),)) -> None:
+        """
+        Replace the contents of the index with (key, geometry) pairs, and build the tree.
+        """
+        shapes, boxes = dict(), dict()
+        for key, geometry in items:
+            parsed = polygons(geometry)
+            if parsed:
+                shapes[key] = parsed
+                boxes[key] = boundingBox(parsed)
+        with self._lock:
+            self._shapes, self._boxes = shapes, boxes
+            self._build()
+            self.loaded = monotonic()
+
+    def insert(self, key: str, geometry: Any) -> None:
+        """
+        Add or replace the geometry of a key. Keys without polygons are removed.
+        """
+        parsed = polygons(geometry)
+        if not parsed:
+            return self.remove(key)
+        with self._lock:
+            self._shapes[key] = parsed
+            self._boxes[key] = boundingBox(parsed)
+            self._pending[key] = self._boxes[key]
+            self._stale.add(key)
+            self._maybeBuild()
+        return None
+
+    def remove(self, key: str) -> None:
+        """
+        Forget the geometry of a key, if any.
+        """
+        with self._lock:
+            if self._shapes.pop(key, None) is not None:
+                self._boxes.pop(key)
+                self._pending.pop(key, None)
+                self._stale.add(key)
+                self._maybeBuild()
+
+    def _maybeBuild(self) -> None:
+        if len(self._pending) + len(self._stale) > self.rebuild:
+            self._build()
+
+    def _build(self) -> None:
+        """
+        Pack the boxes into leaves of `capacity`, sorted into vertical slices by center x,
+        and by center y within each slice. Parent levels group consecutive children.
+        """
+        self._pending, self._stale = dict(), set()
+        keys = list(self._boxes)
+        if not keys:
+            self._levels, self._keys = [], []
+            return
+        boxes = stack([self._boxes[key] for key in keys])
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        leaves = -(-len(keys) // self.capacity)
+        slabs = max(int(leaves ** 0.5), 1)
+        perSlab = -(-leaves // slabs) * self.capacity
+        slab = lexsort((centers[:, 0],)).argsort() // perSlab
+        order = lexsort((centers[:, 1], slab))
+
+        self._keys = [keys[ii] for ii in order]
+        levels = [boxes[order]]
+        while len(levels[-1]) > 1:
+            children = levels[-1]
+            groups = arange(0, len(children), self.capacity)
+            lower = minimum.reduceat(children[:, :2], groups)
+            upper = maximum.reduceat(children[:, 2:], groups)
+            levels.append(concatenate((lower, upper), axis=1))
+        self._levels = levels
+
+    def search(self, box: (float, float, float, float)) -> [str]:
+        """
+        Keys of polygons whose bounding boxes overlap a (west, south, east, north) box.
+        """
+        box = asarray(box, dtype=float64)
+        with self._lock:
+            levels, keys = self._levels, self._keys
+            pending, stale = dict(self._pending), set(self._stale)
+
+        found = []
+        if levels:
+            candidates = arange(len(levels[-1]), dtype=int64)
+            for depth in range(len(levels) - 1, -1, -1):
+                candidates = candidates[overlaps(levels[depth][candidates], box)]
+                if depth == 0:
+                    break
+                children = (candidates[:, None] * self.capacity + arange(self.capacity)).ravel()
+                candidates = children[children < len(levels[depth - 1])]
+            found = [keys[ii] for ii in candidates if keys[ii] not in stale]
+
+        if pending:
+            extra = list(pending)
+            hits = overlaps(stack([pending[key] for key in extra]), box)
+            found.extend(key for key, hit in zip(extra, hits) if hit)
+        return found
+
+    def containing(self, longitude: float, latitude: float) -> [str]:
+        """
+        Keys of polygons that contain a point.
+        """
+        point = asarray([[longitude, latitude]], dtype=float64)
+        result = []
+        for key in self.search((longitude, latitude, longitude, latitude)):
+            shapes = self._shapes.get(key)
+            if shapes is not None and containsPoints(shapes, point)[0]:
+                result.append(key)
+        return result
+
+    def intersecting(self, geometry: Any) -> [str]:
+        """
+        Keys of polygons that intersect a GeoJSON Polygon or MultiPolygon.
+        """
+        other = polygons(geometry)
+        if not other:
+            raise ValueError("Expected a GeoJSON Polygon or MultiPolygon.")
+        result = []
+        for key in self.search(boundingBox(other)):
+            shapes = self._shapes.get(key)
+            if shapes is not None and intersects(shapes, other):
+                result.append(key)
+        return result
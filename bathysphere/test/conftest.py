@@ -12,12 +12,94 @@ from pathlib import Path
 from os import getenv
 from subprocess import check_output
 
-from bathysphere import app, connect
+from passlib.apps import custom_app_context
+
+import bathysphere.functions as functions
+from bathysphere import app, connect, getDriver
 from bathysphere.models import Collections
 
 CREDENTIALS = ("testing@oceanics.io", "n0t_passw0rd")
 IndexedDB = dict()
 
+USERNAME, PASSWORD = CREDENTIALS
+AUTH = {"Authorization": f"{USERNAME}:{PASSWORD}"}
+SQUARE = {
+    "type": "Polygon",
+    "coordinates": [[[-70.0, 43.0], [-69.0, 43.0], [-69.0, 44.0], [-70.0, 44.0], [-70.0, 43.0]]],
+}
+
+
+def node(ii: int) -> dict:
+    """
+    Properties of an entity stored in the in-memory driver.
+    """
+    return {
+        "uuid": f"{ii:032x}",
+        "name": f"entity-{ii}",
+        "description": "benchmark",
+    }
+
+
+def entities(_: str, parameters: dict) -> [dict]:
+    """
+    Rows of `Entity.load`, one for each requested uuid, or a full page.
+    """
+    if "n_uuid" in parameters:
+        keys = [parameters["n_uuid"]]
+    elif "uuids" in parameters:
+        keys = parameters["uuids"]
+    else:
+        keys = [f"{ii:032x}" for ii in range(parameters.get("limit", 100))]
+    return [
+        {"n": {**node(0), "uuid": key}, "n.uuid": key, "navigation": [["Things"], ["Sensors"]]}
+        for key in keys
+    ]
+
+
+def related(_: str, parameters: dict) -> [tuple]:
+    """
+    Rows of `Link.query` with navigation.
+    """
+    return [
+        ({"uuid": f"{ii:032x}"}, [["Things"]], ["Things", "a" * 32, "Has", "Locations", f"{ii:032x}"])
+        for ii in range(parameters.get("limit", 100))
+    ]
+
+
+@pytest.fixture(scope="module")
+def memory():
+    """
+    Handlers use a scripted in-memory driver, and an account that can log in.
+    """
+    credential = custom_app_context.hash(PASSWORD)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(functions, "host", "memory")
+        patch.setattr(functions, "observationStore", None)
+        db = getDriver("memory", functions.port, functions.accessKey)
+        db.rules = (
+            (r"\( u:User", lambda _, p: [
+                {"u": {"uuid": "u" * 32, "name": USERNAME, "credential": credential},
+                 "u.uuid": "u" * 32}
+            ] if p.get("u_name", USERNAME) == USERNAME else []),
+            (r"\( n:Providers", [
+                {"n": {"uuid": "p" * 32, "name": "Oceanicsdotio", "domain": "oceanics.io",
+                       "apiKey": "key", "tokenDuration": 600}, "n.uuid": "p" * 32}
+            ]),
+            (r"CALL db\.labels", [{"label": each} for each in ("Things", "Sensors", "DataStreams")]),
+            (r"RETURN count\(n\)$", lambda _, p: [(len(p["result"]),)]),
+            (r"SET d\._lock = true", [(None, None)]),
+            (r"RETURN n\.uuid$", lambda _, p: [(row["uuid"],) for row in p["rows"]]),
+            (r"IS NOT NULL RETURN n\.uuid", [(f"{ii:032x}", SQUARE) for ii in range(100)]),
+            (r"RETURN b, navigation", related),
+            (r"RETURN n, n\.uuid", entities),
+        )
+        functions.principals.invalidate()
+        for index in functions.polygonIndexes.values():
+            index.expire()
+        yield db
+        db.clear()
+        functions.principals.invalidate()
+
 
 def getCredentials(select: (str) = ()) -> dict:
     """
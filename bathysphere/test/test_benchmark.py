@@ -0,0 +1,282 @@
+"""
+Benchmarks of the application without a database, using the in-memory driver.
+
+Run with `pytest bathysphere/test/test_benchmark.py --benchmark-json=benchmark.json`,
+or `--benchmark-autosave` to keep a history that `pytest-benchmark compare` can read.
+The driver answers every query from scripted rows, so the timings are the cost of
+building queries, transforming records, and handling requests, not of the database.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count as counter
+from sys import getsizeof
+from time import perf_counter
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from bathysphere import app, executeQuery, processKeyValueInbound  # pylint: disable=wrong-import-position
+from bathysphere.memory import MemoryDriver  # pylint: disable=wrong-import-position
+from bathysphere.mesh import topology  # pylint: disable=wrong-import-position
+from bathysphere.models import DataStreams, Link, Locations, Observations, Things  # pylint: disable=wrong-import-position
+from bathysphere.test.conftest import AUTH, PASSWORD, SQUARE, node  # pylint: disable=wrong-import-position
+from bathysphere.test.test_mesh import grid  # pylint: disable=wrong-import-position
+
+@pytest.fixture(scope="module")
+def client(memory):
+    """
+    Test client of the application, which uses the in-memory driver.
+    """
+    with app.app.test_client() as c:
+        yield c
+
+
+def test_benchmark_key_value_inbound(benchmark):
+    """
+    Render properties as Cypher.
+    """
+    items = list(node(0).items()) + [("location", {"type": "Point", "coordinates": [-69.5, 43.5]})]
+    result = benchmark(lambda: [processKeyValueInbound(each) for each in items])
+    assert result[-1].startswith("location: point(")
+
+
+def test_benchmark_entity_repr(benchmark):
+    """
+    Render an entity as a Cypher node pattern, which is memoized after the first time.
+    """
+    benchmark.group = "patterns"
+    entity = Things(**node(0))
+    assert "Things" in benchmark(repr, entity)
+
+
+def test_benchmark_entity_repr_new(benchmark):
+    """
+    Render the pattern of a new entity each time, without the memoized pattern.
+    """
+    benchmark.group = "patterns"
+    assert "Things" in benchmark(lambda: repr(Things(**node(0))))
+
+
+def test_benchmark_entity_pattern_parameters(benchmark):
+    """
+    Render a parameterized node pattern, including a point.
+    """
+    benchmark.group = "patterns"
+    entity = Locations(**node(0), location={"type": "Point", "coordinates": [-69.5, 43.5]})
+    assert "point($n_location)" in benchmark(lambda: entity._pattern(dict()))
+
+
+def test_benchmark_link_repr(benchmark):
+    """
+    Render a relationship pattern, which is memoized after the first time.
+    """
+    benchmark.group = "patterns"
+    link = Link(label="Post", props={"confidence": 1.0, "cost": 1.0})
+    assert benchmark(repr, link).startswith("[ r:Post")
+
+
+@pytest.mark.parametrize("parameterized", (False, True), ids=("literal", "parameters"))
+def test_benchmark_plan_cache(benchmark, parameterized):
+    """
+    Look up 100 Things by uuid, never the same one twice, with the values written
+    into the query text, or bound as parameters. The driver takes a millisecond to
+    plan each new query text, and the plan cache hit ratio is saved with the results.
+    """
+    benchmark.group = "plans"
+    db = MemoryDriver(planning=0.001)
+    keys = counter()
+
+    def lookup(key: str) -> None:
+        entity = Things(uuid=key)
+        parameters = dict() if parameterized else None
+        cmd = f"MATCH {entity._pattern(parameters)} RETURN n"
+        executeQuery(db, lambda tx: tx.run(cmd, parameters))
+
+    benchmark(lambda: [lookup(f"{next(keys):032x}") for _ in range(100)])
+    ratio = db.hits / (db.hits + db.misses)
+    benchmark.extra_info["hitRatio"] = ratio
+    assert ratio >= 0.99 if parameterized else ratio == 0.0
+
+
+def test_benchmark_entity_load(benchmark, memory):
+    """
+    Transform 1000 records into entities.
+    """
+    result = benchmark(Things.load, db=memory, navigation=True, limit=1000)
+    assert len(result) == 1000 and result[0]._navigation == {"Things", "Sensors"}
+    memory.clear()
+
+
+def test_benchmark_entity_load_bbox(benchmark, memory):
+    """
+    Build and transform a bounding box query.
+    """
+    result = benchmark(
+        Locations.load, db=memory, navigation=True, limit=100, bbox=(-70, 43, -69, 44)
+    )
+    assert len(result) == 100
+    memory.clear()
+
+
+def test_benchmark_serialize(benchmark, memory):
+    """
+    Serialize 1000 loaded entities.
+    """
+    items = Things.load(db=memory, navigation=True, limit=1000)
+    result = benchmark(lambda: [each.serialize(db=memory, service="localhost") for each in items])
+    assert result[0]["Sensors@iot.navigation"].endswith("/Sensors")
+    memory.clear()
+
+
+def test_benchmark_ingest(benchmark, memory):
+    """
+    Encode 50,000 Observations in chunks.
+    """
+    count = 50000
+    columns = {
+        "phenomenonTime": [f"2020-01-01T00:00:{ii % 60:02d}" for ii in range(count)],
+        "result": [float(ii) for ii in range(count)],
+    }
+    report = benchmark(DataStreams(uuid="d" * 32).ingest, db=memory, **columns)
+    assert sum(each["count"] for each in report) == count
+    memory.clear()
+
+
+def test_benchmark_mesh_topology(benchmark):
+    """
+    Edges and derived properties of a mesh with 500,000 elements.
+    """
+    vertices, elements = grid(500, 500)
+    result = benchmark(topology, vertices, elements)
+    assert len(result["edges"]) == 3 * 500 * 500 + 2 * 500
+    assert result["boundary"].sum() == 4 * 500
+
+
+def test_benchmark_load_memory(benchmark):
+    """
+    Transform a million Observations records, and save the bytes per entity with
+    the results. Entities are slotted, so they have no dictionary of attributes.
+    """
+    count = 1000000
+    nodes = [
+        {"uuid": f"{ii:032x}", "phenomenonTime": "2020-01-01T00:00:00", "result": float(ii)}
+        for ii in range(1000)
+    ]
+    items = benchmark.pedantic(
+        lambda: [Observations._fromNode(nodes[ii % 1000]) for ii in range(count)], rounds=1
+    )
+    size = sum(map(getsizeof, items)) / count
+    benchmark.extra_info["bytes"] = size
+    print(f"{count} Observations: {size:.0f} bytes each")
+    assert not hasattr(items[0], "__dict__") and size < 200
+
+
+HANDLERS = (
+    ("catalog", "get", "/api/", None, 200),
+    ("collection", "get", "/api/Things?$top=100", None, 200),
+    ("metadata", "get", f"/api/Things({'a' * 32})", None, 200),
+    ("query", "get", f"/api/Things({'a' * 32})/Locations?$top=100", None, 200),
+    ("observations", "get", f"/api/DataStreams({'d' * 32})/Observations", None, 200),
+    ("contains", "get", "/api/FeaturesOfInterest/$contains?point=-69.5,43.5", None, 200),
+    ("intersects", "post", "/api/FeaturesOfInterest/$intersects", SQUARE, 200),
+    ("create", "post", "/api/Things", {"entityClass": "Things", "name": "new"}, 200),
+    ("mutate", "put", f"/api/Things({'a' * 32})", {"entityClass": "Things", "name": "old"}, 204),
+    ("delete", "delete", f"/api/Things({'a' * 32})", None, 204),
+    ("join", "post", f"/api/Things({'a' * 32})/Sensors({'b' * 32})", {}, 204),
+    ("drop", "delete", f"/api/Things({'a' * 32})/Sensors({'b' * 32})", None, 204),
+    ("batch", "post", "/api/Things/$batch", [
+        {"entityClass": "Things", "name": f"new-{ii}"} for ii in range(1000)
+    ], 200),
+    ("ingest", "post", f"/api/DataStreams({'d' * 32})/Observations", {
+        "phenomenonTime": ["2020-01-01T00:00:00"] * 1000, "result": list(range(1000))
+    }, 200),
+    ("token", "get", "/api/auth", None, 200),
+)
+
+
+@pytest.mark.parametrize("name,method,url,body,status", HANDLERS, ids=[each[0] for each in HANDLERS])
+def test_benchmark_handler(benchmark, client, memory, name, method, url, body, status):
+    """
+    Handle a request of an authenticated user, with cached credentials.
+    """
+    benchmark.group = "handlers"
+    send = getattr(client, method)
+    kwargs = {"headers": AUTH} if body is None else {"headers": AUTH, "json": body}
+    response = benchmark(lambda: send(url, **kwargs))
+    assert response.status_code == status, (name, response.get_json())
+    assert "queries" in response.headers["Server-Timing"]
+    memory.clear()
+
+
+@pytest.mark.parametrize("size", (10, 100, 1000, 10000))
+def test_benchmark_collection_size(benchmark, client, memory, size):
+    """
+    Get collections of increasing size, with the navigation labels of each entity,
+    to see how latency grows with the number of entities in a page.
+    """
+    benchmark.group = "collection size"
+    response = benchmark(lambda: client.get(f"/api/Things?$top={size}", headers=AUTH))
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert data["@iot.count"] == size and "Sensors@iot.navigation" in data["value"][-1]
+    memory.clear()
+
+
+def test_benchmark_handler_register(benchmark, client, memory):
+    """
+    Register accounts, which hashes each password.
+    """
+    body = {"username": "new@oceanics.io", "password": PASSWORD}
+    response = benchmark.pedantic(
+        client.post, args=("/api/auth",), kwargs={"json": body, "headers": {"x-api-key": "key"}},
+        rounds=3,
+    )
+    assert response.status_code == 200, response.get_json()
+    memory.clear()
+
+
+def test_benchmark_handler_manage(benchmark, client, memory):
+    """
+    Change account settings, which means logging in again afterwards.
+    """
+    response = benchmark.pedantic(
+        client.put, args=("/api/auth",), kwargs={"json": {"alias": "tester"}, "headers": AUTH},
+        rounds=3,
+    )
+    assert response.status_code == 204, response.get_json()
+    memory.clear()
+
+
+def test_benchmark_handler_threads(benchmark, memory):
+    """
+    Serve 32 requests for a page of Things, with 10 milliseconds of latency for each
+    query, one at a time like a sync worker, and then on 8 threads like a gthread
+    worker. Requests per second of both are saved with the results.
+    """
+    benchmark.group = "workers"
+    requests, threads = 32, 8
+    url = "/api/Things?$top=10"
+
+    def serve(count: int) -> [int]:
+        with app.app.test_client() as c:
+            return [c.get(url, headers=AUTH).status_code for _ in range(count)]
+
+    def timed(workers: int) -> ([int], float):
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            jobs = [pool.submit(serve, requests // workers) for _ in range(workers)]
+            statuses = [status for job in jobs for status in job.result()]
+        return statuses, requests / (perf_counter() - start)
+
+    latency, memory.latency = memory.latency, 0.01
+    try:
+        serve(1)
+        statuses, sync = timed(1)
+        assert statuses == [200] * requests
+        statuses, threaded = benchmark.pedantic(timed, args=(threads,), rounds=1)
+    finally:
+        memory.latency = latency
+        memory.clear()
+    benchmark.extra_info.update({"sync": sync, "gthread": threaded})
+    assert statuses == [200] * requests
+    assert threaded > 2 * sync, (sync, threaded)
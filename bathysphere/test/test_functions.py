@@ -0,0 +1,97 @@
+from urllib.parse import parse_qs, urlsplit
+
+from neo4j import READ_ACCESS
+
+from bathysphere import ranks
+from bathysphere.test.conftest import AUTH
+
+
+def follow(link: str) -> (str, dict):
+    """
+    Path and query parameters of a next link, for the test client.
+    """
+    parts = urlsplit(link)
+    return parts.path, {key: value[0] for key, value in parse_qs(parts.query).items()}
+
+
+def test_functions_observations_next_link(client, memory):
+    """
+    Observations in the graph are paged in time order, with links that skip.
+    """
+    memory.clear()
+    url = f"api/DataStreams({'d' * 32})/Observations"
+    response = client.get(url, query_string={"$top": 10}, headers=AUTH)
+    data = response.get_json()
+    assert response.status_code == 200, data
+    path, query = follow(data["@iot.nextLink"])
+    assert query == {"$top": "10", "$skip": "10"}
+
+    response = client.get(path, query_string=query, headers=AUTH)
+    assert response.status_code == 200, response.get_json()
+    pages = [each for each in memory.clear() if "RETURN b, navigation" in each.query]
+    assert all("ORDER BY b.phenomenonTime ASC" in each.query for each in pages)
+    assert all("[(b)--(c) | labels(c)]" in each.query for each in pages)
+    assert not any("collect(" in each.query for each in pages)  # rows stream in order
+    assert [each.parameters.get("skip") for each in pages] == [None, 10]
+
+
+def test_functions_collection_next_link_bbox(client, memory):
+    """
+    Links to the next page of a collection keep the filters of the request.
+    """
+    memory.clear()
+    response = client.get(
+        "api/Locations",
+        query_string={"bbox": "-70,43,-69,44", "$top": 10, "$skip": 20},
+        headers=AUTH,
+    )
+    data = response.get_json()
+    assert response.status_code == 200, data
+    path, query = follow(data["@iot.nextLink"])
+    assert query.keys() == {"bbox", "$top", "$cursor"} and query["bbox"] == "-70,43,-69,44"
+
+    response = client.get(path, query_string=query, headers=AUTH)
+    assert response.status_code == 200, response.get_json()
+    pages = [each for each in memory.clear() if "RETURN n, n.uuid" in each.query]
+    upper = {"x": -69.0, "y": 44.0, "crs": "wgs-84"}
+    assert len(pages) == 2 and all(each.parameters["bbox_upper"] == upper for each in pages)
+    assert "after_uuid" in pages[-1].parameters and "skip" not in pages[-1].parameters
+
+
+def test_functions_query_counts_traversals(client, memory):
+    """
+    Related entities requested by users count traversals by node uuids, while
+    bulk reads like the Observations of a DataStream do not.
+    """
+    ranks._traversals.pop(memory, None)
+    response = client.get(f"api/DataStreams({'d' * 32})/Observations", headers=AUTH)
+    assert response.status_code == 200, response.get_json()
+    assert memory not in ranks._traversals
+
+    response = client.get(f"api/Things({'a' * 32})/Locations?$top=10", headers=AUTH)
+    assert response.status_code == 200, response.get_json()
+    counts = ranks._traversals.pop(memory)
+    assert counts[("Things", "a" * 32, "Has", "Locations", f"{0:032x}")] == 1
+    assert len(counts) == 11  # including the first of the next page
+
+
+def test_functions_observations_summary_reads_time_range(client, memory):
+    """
+    Summaries of Observations in the graph read the time range, sorted, in one read
+    transaction, without counting traversals.
+    """
+    memory.clear()
+    ranks._traversals.pop(memory, None)
+    response = client.get(
+        f"api/DataStreams({'d' * 32})/Observations",
+        query_string={"interval": 60, "start": "2020-01-01T00:00:00"},
+        headers=AUTH,
+    )
+    assert response.status_code == 200, response.get_json()
+    reads = [each for each in memory.clear() if ":Observations" in each.query]
+    assert len(reads) == 1 and reads[0].mode == READ_ACCESS, reads
+    assert reads[0].query.endswith("ORDER BY b.phenomenonTime")
+    assert reads[0].parameters == {
+        "uuid": "d" * 32, "start": "2020-01-01T00:00:00", "end": None
+    }
+    assert memory not in ranks._traversals
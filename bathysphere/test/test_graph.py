@@ -1,7 +1,9 @@
 import pytest
 from datetime import datetime
-from json import dumps
+from json import dumps, loads
 from os import getenv
+from time import time
+from uuid import uuid4
 # from minio import Object
 
 from bathysphere import appConfig
@@ -153,6 +155,205 @@ def test_graph_sensorthings_create(create_entity, cls):
     IndexedDB["createdEntities"][cls] = results
 
 
+def test_graph_sensorthings_batch(client, token):
+    """
+    Create many entities in chunks, from an array and from NDJSON.
+    """
+    jwtToken = token(CREDENTIALS).get("token")
+    items = [{"entityClass": "Things", "name": f"batch-{ii}"} for ii in range(5)]
+
+    response = client.post(
+        "api/Things/$batch?chunkSize=2",
+        json=items,
+        headers={"Authorization": ":" + jwtToken},
+    )
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert data["@iot.count"] == 5 and len(data["value"]) == 3, data
+
+    response = client.post(
+        "api/Things/$batch",
+        data="\n".join(map(dumps, items)),
+        content_type="application/x-ndjson",
+        headers={"Authorization": ":" + jwtToken},
+    )
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert data["@iot.count"] == 5, data
+
+
+def test_graph_sensorthings_ingest(client, token, graph):
+    """
+    Ingest Observations of a new DataStream from columns, and from CSV.
+
+    The DataStream is created in the graph, because `DataStreams` is not one
+    of the entity classes of the API.
+    """
+    jwtToken = token(CREDENTIALS).get("token")
+    headers = {"Authorization": ":" + jwtToken}
+    uuid = uuid4().hex
+    db = graph(getenv("NEO4J_HOSTNAME", "localhost"), 7687, getenv("NEO4J_ACCESS_KEY"))
+    DataStreams.create(db=db, uuid=uuid, name="ingest")
+    count = 25
+
+    response = client.post(
+        f"api/DataStreams({uuid})/Observations?chunkSize=10",
+        json={
+            "phenomenonTime": [f"2020-01-01T00:{ii:02}:00" for ii in range(count)],
+            "result": [float(ii) for ii in range(count)],
+        },
+        headers=headers,
+    )
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert data["@iot.count"] == count and len(data["value"]) == 3, data
+
+    response = client.post(
+        f"api/DataStreams({uuid})/Observations",
+        data="phenomenonTime,result,resultQuality\n2020-01-02T00:00:00,1.5,good\n",
+        content_type="text/csv",
+        headers=headers,
+    )
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert data["@iot.count"] == 1, data
+
+
+def test_graph_sensorthings_ingest_throughput(graph):
+    """
+    Sustain 50k Observations per second, ingesting columns into the graph in chunks.
+    """
+    db = graph(getenv("NEO4J_HOSTNAME", "localhost"), 7687, getenv("NEO4J_ACCESS_KEY"))
+    uuid = uuid4().hex
+    DataStreams.create(db=db, uuid=uuid, name="throughput")
+    count = 200000
+    start = datetime(2020, 1, 1).timestamp()
+    phenomenonTime = [
+        datetime.utcfromtimestamp(start + ii).isoformat() for ii in range(count)
+    ]
+
+    began = time()
+    report = DataStreams(uuid=uuid).ingest(
+        db=db, phenomenonTime=phenomenonTime, result=[float(ii) for ii in range(count)]
+    )
+    rate = count / (time() - began)
+    assert not any("error" in each for each in report), report
+    print(f"Ingested {rate:.0f} Observations per second")
+    assert rate >= 50000, rate
+
+
+def test_graph_sensorthings_locations_near(client, token):
+    """
+    Find Locations in a bounding box, and within a radius of a point.
+    """
+    jwtToken = token(CREDENTIALS).get("token")
+    headers = {"Authorization": ":" + jwtToken}
+    for query in ("bbox=-180,-90,180,90", "near=-69.5,43.9&radius=20000000"):
+        response = client.get(f"api/Locations?{query}", headers=headers)
+        data = response.get_json()
+        assert response.status_code == 200, data
+        assert data["@iot.count"] > 0, data
+
+    response = client.get("api/Things?near=-69.5,43.9&radius=1000", headers=headers)
+    assert response.status_code == 400
+
+
+def test_graph_locations_bbox_benchmark(graph, benchmark):
+    """
+    Query 1M Locations on a 1000 by 1000 grid by bounding box, using the point index.
+    The Locations are removed afterward, in chunks.
+    """
+    db = graph(getenv("NEO4J_HOSTNAME", "localhost"), 7687, getenv("NEO4J_ACCESS_KEY"))
+    Locations.addIndex(db, "location")
+    prefix = f"bbox-{uuid4().hex}-"
+    count, chunkSize = 1000000, 50000
+    with db.session() as session:
+        for start in range(0, count, chunkSize):
+            session.run(
+                "UNWIND range($start, $end) AS i "
+                "CREATE (:Locations { uuid: replace(randomUUID(), '-', ''), "
+                "name: $prefix + toString(i), location: point({ "
+                "x: -180.0 + 0.36 * (i / 1000), y: -90.0 + 0.18 * (i % 1000), "
+                "crs: 'wgs-84' }) })",
+                start=start, end=start + chunkSize - 1, prefix=prefix,
+            ).consume()
+    try:
+        benchmark.group = "spatial"
+        result = benchmark(
+            lambda: Locations().load(db=db, bbox=(-70.0, 43.0, -69.0, 44.0))
+        )
+        assert 0 < len(result) < 100, len(result)
+    finally:
+        with db.session() as session:
+            while session.run(
+                "MATCH (n:Locations) WHERE n.name STARTS WITH $prefix "
+                "WITH n LIMIT $limit DETACH DELETE n RETURN count(n)",
+                prefix=prefix, limit=chunkSize,
+            ).single()[0]:
+                pass
+
+
+def test_graph_mesh_load(graph):
+    """
+    Load a small mesh, and check the relationships of an interior node.
+    """
+    from bathysphere.mesh import loadMesh
+    from bathysphere.test.test_mesh import grid
+
+    db = graph(getenv("NEO4J_HOSTNAME", "localhost"), 7687, getenv("NEO4J_ACCESS_KEY"))
+    vertices, elements = grid(4, 4)
+    name = f"test-{datetime.utcnow().timestamp()}"
+    report = loadMesh(db, name, vertices, elements, chunkSize=7)
+    assert report["SIDE_OF"]["count"] == 3 * len(elements)
+
+    with db.session() as session:
+        neighbors = session.run(
+            "MATCH (n:Nodes {mesh: $mesh, id: 6})-[:NEIGHBORS]-(m) RETURN count(m)", mesh=name
+        ).single()[0]
+    assert neighbors == 6
+
+
+def test_graph_mesh_load_benchmark(graph, benchmark):
+    """
+    Time loading a mesh with 20,000 elements, and then remove it.
+    """
+    from bathysphere.mesh import deleteMesh, loadMesh
+    from bathysphere.test.test_mesh import grid
+
+    db = graph(getenv("NEO4J_HOSTNAME", "localhost"), 7687, getenv("NEO4J_ACCESS_KEY"))
+    vertices, elements = grid(100, 100)
+    name = f"benchmark-{datetime.utcnow().timestamp()}"
+    benchmark.group = "mesh"
+    try:
+        report = benchmark.pedantic(loadMesh, args=(db, name, vertices, elements), rounds=1)
+        assert report["Elements"]["count"] == len(elements)
+    finally:
+        deleteMesh(db, name)
+
+
+def test_graph_sensorthings_stream(client, token):
+    """
+    Stream a collection as NDJSON, and as a chunked JSON document.
+    """
+    jwtToken = token(CREDENTIALS).get("token")
+    response = client.get(
+        "api/Things",
+        headers={"Authorization": ":" + jwtToken, "Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [loads(line) for line in response.data.decode().splitlines()]
+    assert len(lines) >= 10 and all("@iot.id" in each for each in lines)
+
+    response = client.get(
+        "api/Things?$stream=true&$top=3",
+        headers={"Authorization": ":" + jwtToken},
+    )
+    data = loads(response.data)
+    assert response.status_code == 200, data
+    assert data["@iot.count"] == len(data["value"]) == 3, data
+
+
 @pytest.mark.parametrize("cls", set(classes) - {TaskingCapabilities, Tasks})
 def test_graph_sensorthings_get(get_entity, cls):
     """
@@ -0,0 +1,82 @@
+import pytest
+from neo4j.exceptions import TransientError
+from numpy import arange, column_stack, concatenate, meshgrid, pi, zeros
+
+from bathysphere.memory import MemoryDriver
+from bathysphere.mesh import loadMesh, read2dm, topology
+
+
+def grid(nx: int, ny: int) -> (list, list):
+    """
+    Square cells of unit size, each split into two triangles.
+    """
+    x, y = meshgrid(arange(nx + 1, dtype=float), arange(ny + 1, dtype=float))
+    vertices = column_stack((x.ravel(), y.ravel(), zeros(x.size)))
+    corner = (arange(ny)[:, None] * (nx + 1) + arange(nx)).ravel()
+    lower = column_stack((corner, corner + 1, corner + nx + 2))
+    upper = column_stack((corner, corner + nx + 2, corner + nx + 1))
+    return vertices, concatenate((lower, upper))
+
+
+def test_mesh_topology():
+    """
+    Edges, shared elements and boundaries match a loop over the sides of each element.
+    """
+    vertices, elements = grid(3, 2)
+    result = topology(vertices, elements)
+
+    sides = dict()
+    for cell, triangle in enumerate(elements.tolist()):
+        for a, b in zip(triangle, triangle[1:] + triangle[:1]):
+            sides.setdefault(tuple(sorted((a, b))), []).append(cell)
+    assert sorted(map(tuple, result["edges"].tolist())) == sorted(sides)
+    for (a, b), cells, boundary in zip(result["edges"].tolist(), result["cells"].tolist(), result["boundary"]):
+        assert sorted(each for each in cells if each >= 0) == sorted(sides[(a, b)])
+        assert boundary == (len(sides[(a, b)]) == 1)
+
+    assert sorted(set(result["length"].round(6).tolist())) == [1.0, round(2 ** 0.5, 6)]
+    assert set(result["angle"].round(6).tolist()) == {0.0, round(pi / 4, 6), round(pi / 2, 6)}
+    assert result["area"].tolist() == [0.5] * len(elements)
+    assert result["vertexBoundary"].sum() == 10
+
+    with pytest.raises(ValueError):
+        topology(vertices, [[0, 1, 100]])
+
+
+def test_mesh_read_2dm(tmp_path):
+    """
+    Node identifiers in the file are replaced by positions in the vertex array.
+    """
+    path = tmp_path / "mesh.2dm"
+    path.write_text(
+        "MESH2D\n"
+        "E3T 1 10 20 30 1\n"
+        "ND 10 0.0 0.0 -5.0\n"
+        "ND 30 0.0 1.0 -6.0\n"
+        "ND 20 1.0 0.0 -7.0\n"
+    )
+    vertices, elements = read2dm(str(path))
+    assert vertices[:, 2].tolist() == [-5.0, -6.0, -7.0]
+    assert elements.tolist() == [[0, 2, 1]]
+
+
+def test_mesh_load_failure_removes_partial_mesh():
+    """
+    When a chunk fails, the nodes and elements already written are deleted.
+    """
+    def fail(query, parameters):
+        raise TransientError("write failed")
+
+    db = MemoryDriver(rules=(
+        (r"RETURN count\(n\) > 0", [[False]]),
+        (":SIDE_OF", fail),
+        ("DETACH DELETE", [[0]]),
+    ))
+    vertices, elements = grid(2, 2)
+    with pytest.raises(TransientError):
+        loadMesh(db, "partial", vertices, elements, chunkSize=5)
+    deletes = [each for each in db.clear() if "DETACH DELETE" in each.query]
+    assert [each.query.split()[0:2] for each in deletes] == [
+        ["MATCH", "(n:Nodes"], ["MATCH", "(n:Elements"]
+    ]
+    assert all(each.parameters["mesh"] == "partial" for each in deletes)
@@ -0,0 +1,154 @@
+import pytest
+
+from bathysphere import encodeCursor, decodeCursor
+from bathysphere.models import (
+    Link, Locations, Observations, Things, pageClauses, spatialClause
+)
+
+
+def test_models_pattern_parameters():
+    """
+    Parameterized patterns only depend on keys, so that query plans are reused.
+    """
+    first, second = dict(), dict()
+    a = Things(uuid="a", name="first")._pattern(first)
+    b = Things(uuid="b", name="second")._pattern(second)
+    assert a == b
+    assert "first" not in a
+    assert first == {"n_uuid": "a", "n_name": "first"}
+
+
+def test_models_pattern_parameters_not_cypher():
+    """
+    Values that look like Cypher are still bound as parameters.
+    """
+    parameters = dict()
+    pattern = Things(name="$foo}) DETACH DELETE n //")._pattern(parameters)
+    assert pattern == "( n:Things { name: $n_name } )"
+    assert parameters == {"n_name": "$foo}) DETACH DELETE n //"}
+
+
+def test_models_pattern_parameters_point():
+    """
+    GeoJSON points become `point($...)` expressions with a map parameter, with
+    longitude as `x`.
+    """
+    parameters = dict()
+    location = {"type": "Point", "coordinates": [-69.5, 43.9]}
+    pattern = Locations(location=location)._pattern(parameters)
+    assert "location: point($n_location)" in pattern
+    assert parameters["n_location"] == {"x": -69.5, "y": 43.9, "crs": "wgs-84"}
+
+
+def test_models_link_pattern_parameters():
+    """
+    Link properties are namespaced by the link symbol.
+    """
+    parameters = dict()
+    pattern = Link(label="Post", props={"confidence": 1.0})._pattern(parameters)
+    assert pattern == "[ r:Post { confidence: $r_confidence } ]"
+    assert parameters == {"r_confidence": 1.0}
+    assert repr(Link(label="Post", props={"confidence": 1.0})) == (
+        "[ r:Post { confidence: 1.0 } ]"
+    )
+
+
+def test_models_serialize_navigation():
+    """
+    Navigation links come from neighbor labels loaded with the entity.
+    """
+    entity = Things._fromNode(
+        {"uuid": "a", "name": "buoy"},
+        navigation=[["Sensors"], ["Locations"], ["User"], ["Sensors"]],
+    )
+    data = entity.serialize(db=None, service="localhost")
+    assert data["name"] == "buoy"
+    assert "Sensors@iot.navigation" in data and "Locations@iot.navigation" in data
+    assert "User@iot.navigation" not in data
+    assert "navigation" not in data
+
+
+def test_models_page_clauses():
+    """
+    Keyset pages continue after the last sort value, with nulls sorted last.
+    """
+    parameters = dict()
+    where, page, orderBy = pageClauses(
+        "n", "n", Things._orderBy("name"), limit=10, after=("buoy", "a"),
+        parameters=parameters
+    )
+    assert where == (
+        "WHERE (n.name > $after_value OR (n.name = $after_value AND "
+        "n.uuid > $after_uuid) OR n.name IS NULL) "
+    )
+    assert page == f"WITH n {orderBy} LIMIT $limit "
+    assert parameters == {"after_value": "buoy", "after_uuid": "a", "limit": 10}
+    assert decodeCursor(encodeCursor("name desc", ("buoy", "a"))) == (
+        "name desc", ("buoy", "a")
+    )
+
+    with pytest.raises(ValueError):
+        Things._orderBy("name; MATCH (x) DETACH DELETE x")
+    with pytest.raises(ValueError):
+        Locations._orderBy("location")
+    assert Observations._orderBy("phenomenonTime desc") == ("phenomenonTime", True)
+
+
+def test_models_spatial_clause():
+    """
+    Bounding box and radius filters compare the point property with parameters.
+    """
+    parameters = dict()
+    clause = spatialClause(
+        "n", "location", bbox=(-70, 43, -69, 44), near=(-69.5, 43.9), radius=500.0,
+        parameters=parameters
+    )
+    assert clause == (
+        "point($bbox_lower) <= n.location <= point($bbox_upper) AND "
+        "distance(n.location, point($near)) <= $radius"
+    )
+    assert parameters["near"] == {"x": -69.5, "y": 43.9, "crs": "wgs-84"}
+
+    with pytest.raises(ValueError):
+        spatialClause("n", "location", near=(-69.5, 43.9), parameters=dict())
+    with pytest.raises(ValueError):
+        spatialClause("n", "location", bbox=(170, 0, -170, 1), parameters=dict())
+
+
+def test_models_capability_manifest():
+    """
+    Capabilities are described once per class, plus methods bound to instances.
+    """
+    assert Things._manifest() is Things._manifest()
+    assert "catalog" in Things._manifest() and "catalog" not in Locations._manifest()
+
+    def calibrate(self, offset):
+        """Bound method"""
+        return self.name, offset
+
+    entity = Things(name="a")._bind(calibrate)
+    assert entity.calibrate(1) == ("a", 1)
+    names = set(each["name"] for each in entity._capabilities())
+    assert {"calibrate", "catalog", "load"} <= names
+    assert "name" not in names and "_pattern" not in names
+
+
+def test_models_pattern_memoized():
+    """
+    Rendered patterns are reused until a value or the symbol changes, and still
+    fill the parameters of each query.
+    """
+    thing = Things(uuid="a", name="first")
+    assert repr(thing) is repr(thing)
+    first, second = dict(), dict()
+    assert thing._pattern(first) == thing._pattern(second)
+    assert first == second == {"n_uuid": "a", "n_name": "first"}
+
+    thing.name = "second"
+    assert 'name: "second"' in repr(thing)
+    assert thing._setSymbol("b")._pattern(dict()).startswith("( b:Things")
+
+    link = Link(label="Post", props={"confidence": 1.0})
+    assert repr(link) == "[ r:Post { confidence: 1.0 } ]"
+    link.props = {"confidence": 0.5}
+    assert repr(link) == "[ r:Post { confidence: 0.5 } ]"
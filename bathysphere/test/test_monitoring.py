@@ -0,0 +1,72 @@
+from multiprocessing import get_context
+from os import getpid
+
+from bathysphere.monitoring import Registry
+
+
+def registry(directory: str = None) -> Registry:
+    """
+    Registry with one family of each kind. Processes of a test have different parents,
+    so they are given the same boot.
+    """
+    metrics = Registry(directory=directory, interval=60, boot="test")
+    metrics.counter("requests_total", "Requests.")
+    metrics.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    metrics.gauge("connections", "Connections.")
+    metrics.collect(lambda: [("connections", {"state": "idle"}, 3)])
+    return metrics
+
+
+def test_monitoring_exposition():
+    """
+    Counters and cumulative histogram buckets are rendered in the text format.
+    """
+    metrics = registry()
+    metrics.inc("requests_total", operation="a")
+    metrics.inc("requests_total", 2, operation="a")
+    for value in (0.05, 0.5, 5.0):
+        metrics.observe("latency_seconds", value, operation='say "hi"')
+    lines = metrics.exposition().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'requests_total{operation="a"} 3.0' in lines
+    assert 'latency_seconds_bucket{operation="say \\"hi\\"",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{operation="say \\"hi\\"",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{operation="say \\"hi\\""} 3' in lines
+    assert 'connections{state="idle"} 3' in lines
+
+
+def _worker(directory: str) -> None:
+    metrics = registry(directory)
+    metrics.inc("requests_total", operation="a")
+    metrics.observe("latency_seconds", 0.5)
+    metrics.dump()
+
+
+def test_monitoring_multiprocess(tmp_path):
+    """
+    Snapshots of other processes are summed, and the gauges of exited ones are dropped.
+    """
+    process = get_context("fork").Process(target=_worker, args=(str(tmp_path),))
+    process.start()
+    process.join()
+    metrics = registry(str(tmp_path))
+    metrics.inc("requests_total", operation="a")
+    lines = metrics.exposition().splitlines()
+    assert 'requests_total{operation="a"} 2.0' in lines
+    assert "latency_seconds_count 1" in lines
+    assert 'connections{state="idle"} 3' in lines
+
+
+
+def test_monitoring_earlier_boots(tmp_path):
+    """
+    Snapshots of an earlier boot, including those named by process id only, are
+    removed instead of summed.
+    """
+    for name in ("previous-123.json", "456.json"):
+        (tmp_path / name).write_text('{"requests_total": [[[["operation", "a"]], 5.0]]}')
+    metrics = registry(str(tmp_path))
+    metrics.inc("requests_total", operation="a")
+    metrics.dump()
+    assert 'requests_total{operation="a"} 1.0' in metrics.exposition().splitlines()
+    assert [each.name for each in tmp_path.glob("*.json")] == [f"test-{getpid()}.json"]
@@ -0,0 +1,66 @@
+from tracemalloc import start, stop, get_traced_memory
+
+import pytest
+
+from bathysphere.particles import batches, simulations, toCsv
+
+
+def tracks(path, lines: int, particles: int) -> None:
+    """
+    Track file with a line per time step.
+    """
+    with open(path, "w") as target:
+        for time in range(lines):
+            target.write(f"{time} " + " ".join(
+                f"{ii} {ii}.5 {time}.25 -1.0" for ii in range(particles)
+            ) + "\n")
+
+
+def test_particles_csv(tmp_path):
+    """
+    Simulations are converted in parallel, and written in numeric order.
+    """
+    source = tmp_path / "source"
+    for simulation in ("10", "2", "notes"):
+        (source / simulation).mkdir(parents=True)
+    tracks(source / "2" / "tracks.txt", 3, 2)
+    tracks(source / "10" / "tracks.txt", 1, 1)
+    assert [each.name for each in simulations(str(source))] == ["2", "10"]
+
+    out = tmp_path / "particles.csv"
+    results = list(toCsv(str(source), "tracks.txt", "larvae", str(out), workers=2))
+    assert results == [("2", 6), ("10", 1)]
+    rows = out.read_text().splitlines()
+    assert rows[0] == "2,larvae,0,0,POINT(0.5 0.25 -1.0)"
+    assert rows[-1] == "10,larvae,0,0,POINT(0.5 0.25 -1.0)"
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_particles_constant_memory(tmp_path):
+    """
+    Reading a track file holds one batch at a time, however large the file is.
+    """
+    path = tmp_path / "tracks.txt"
+    tracks(path, 2000, 100)
+    start()
+    count = sum(len(columns["particle"]) for columns in batches(path, chunkSize=1000))
+    _, peak = get_traced_memory()
+    stop()
+    assert count == 200000
+    assert peak < path.stat().st_size / 10
+
+
+def test_particles_csv_failure_removes_parts(tmp_path):
+    """
+    When a simulation cannot be converted, no part files are left behind.
+    """
+    source = tmp_path / "source"
+    for simulation in ("1", "2", "3"):
+        (source / simulation).mkdir(parents=True)
+        tracks(source / simulation / "tracks.txt", 3, 2)
+    (source / "2" / "tracks.txt").write_text("0 1 0.5 0.25\n")
+
+    out = tmp_path / "particles.csv"
+    with pytest.raises(ValueError):
+        list(toCsv(str(source), "tracks.txt", "larvae", str(out), workers=2))
+    assert not list(tmp_path.glob("*.part"))
@@ -0,0 +1,87 @@
+import pytest
+from numpy import memmap, sin, arange
+
+from bathysphere.series import (
+    SegmentStore, aggregate, downsample, envelope, toTime, window
+)
+
+
+def test_series_append_segments(tmp_path):
+    """
+    Appends fill the last segment before creating another, in time order.
+    """
+    store = SegmentStore(str(tmp_path), capacity=4)
+    times = [f"2020-01-01T00:00:{ii:02}Z" for ii in (2, 0, 1)]
+    store.append("a", times, [2.0, 0.0, 1.0])
+    summary = store.append("a", [f"2020-01-01T00:00:{ii:02}" for ii in range(3, 6)], [3, 4, 5])
+    assert summary["segments"] == 2 and summary["count"] == 6
+    assert [each["count"] for each in store.manifest("a")] == [4, 2]
+
+    with pytest.raises(ValueError):
+        store.append("a", ["2020-01-01T00:00:00"], [0.0])
+    with pytest.raises(ValueError):
+        store.append("a", ["2020-01-01T00:01:00"], ["high"])
+    with pytest.raises(ValueError):
+        store.manifest("../a")
+
+
+def test_series_read_range(tmp_path):
+    """
+    Range reads are views of the memory-mapped segments, and pages skip across them.
+    """
+    store = SegmentStore(str(tmp_path), capacity=4)
+    store.append("a", [1000 * ii for ii in range(10)], list(range(10)))
+
+    slices = store.read("a", start="1970-01-01T00:00:03", end="1970-01-01T00:00:06Z")
+    assert [values.tolist() for _, values in slices] == [[3.0], [4.0, 5.0, 6.0]]
+    assert all(isinstance(values.base, memmap) for _, values in slices)
+
+    page = store.page("a", skip=3, limit=2)
+    assert page == [
+        {"phenomenonTime": "1970-01-01T00:00:03.000Z", "result": 3.0},
+        {"phenomenonTime": "1970-01-01T00:00:04.000Z", "result": 4.0},
+    ]
+    assert store.read("b") == []
+
+
+def test_series_aggregate():
+    """
+    Buckets are aligned to the epoch, and empty buckets are left out.
+    """
+    times, values = window([0, 1000, 2500, 9000], [1.0, 3.0, 2.0, 4.0])
+    assert aggregate(times, values, 2) == [
+        {"phenomenonTime": "1970-01-01T00:00:00.000Z", "count": 2, "min": 1.0, "max": 3.0, "mean": 2.0},
+        {"phenomenonTime": "1970-01-01T00:00:02.000Z", "count": 1, "min": 2.0, "max": 2.0, "mean": 2.0},
+        {"phenomenonTime": "1970-01-01T00:00:08.000Z", "count": 1, "min": 4.0, "max": 4.0, "mean": 4.0},
+    ]
+    assert envelope(times) == ["1970-01-01T00:00:00.000Z", "1970-01-01T00:00:09.000Z"]
+    assert envelope(toTime([])) is None
+
+
+def test_series_downsample():
+    """
+    Largest-Triangle-Three-Buckets selects the same points as the reference loop.
+    """
+    size, threshold = 1000, 50
+    times = toTime(arange(size) * 1000)
+    values = sin(arange(size) / 20.0) + (arange(size) % 13 == 0)
+
+    x = [float(ii * 1000) for ii in range(size)]
+    y = values.tolist()
+    every = (size - 2) / (threshold - 2)
+    expected, a = [0], 0
+    for ii in range(threshold - 2):
+        lower, upper = int(ii * every) + 1, int((ii + 1) * every) + 1
+        after = min(int((ii + 2) * every) + 1, size)
+        cx = sum(x[upper:after]) / (after - upper)
+        cy = sum(y[upper:after]) / (after - upper)
+        areas = [
+            abs((x[a] - cx) * (y[jj] - y[a]) - (x[a] - x[jj]) * (cy - y[a]))
+            for jj in range(lower, upper)
+        ]
+        a = lower + areas.index(max(areas))
+        expected.append(a)
+    expected.append(size - 1)
+
+    assert downsample(times, values, threshold).tolist() == expected
+    assert downsample(times, values, size).tolist() == list(range(size))
@@ -0,0 +1,66 @@
+import pytest
+from numpy import array, random
+
+from bathysphere.spatial import PolygonIndex, containsPoints, intersects, polygons
+
+
+def square(x, y, size=1.0):
+    return {
+        "type": "Polygon",
+        "coordinates": [[[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]],
+    }
+
+
+def test_spatial_polygon_tests():
+    """
+    Holes are outside, and polygons intersect by crossing edges or containment.
+    """
+    shapes = polygons({
+        "type": "Feature",
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [square(0, 0, 4)["coordinates"][0], square(1, 1, 2)["coordinates"][0]],
+        },
+    })
+    points = array([[0.5, 0.5], [2.0, 2.0], [5.0, 5.0]])
+    assert containsPoints(shapes, points).tolist() == [True, False, False]
+    assert intersects(shapes, polygons(square(3.5, 3.5)))
+    assert intersects(polygons(square(0, 0, 10)), polygons(square(1, 1)))
+    assert not intersects(shapes, polygons(square(5, 5)))
+    assert polygons('{"type": "Point", "coordinates": [0, 0]}') == []
+
+
+def test_spatial_polygon_index():
+    """
+    Searches of the packed tree and of pending changes find the same polygons as
+    testing every one of them.
+    """
+    generator = random.default_rng(0)
+    items = [
+        (str(ii), square(*generator.uniform(0, 100, 2), generator.uniform(0.1, 5)))
+        for ii in range(2000)
+    ]
+    index = PolygonIndex(capacity=8, rebuild=16)
+    index.reset(items)
+    assert not index.expired()
+
+    shapes = {key: polygons(geometry) for key, geometry in items}
+    for x, y in generator.uniform(0, 100, (20, 2)):
+        expected = [key for key, each in shapes.items() if containsPoints(each, array([[x, y]]))[0]]
+        assert sorted(index.containing(x, y)) == sorted(expected)
+
+    index.insert("0", square(200, 200))
+    index.insert("new", square(200.5, 200.5))
+    assert sorted(index.containing(200.75, 200.75)) == ["0", "new"]
+    index.remove("new")
+    assert index.intersecting(square(199, 199, 1.5)) == ["0"]
+    corner = items[0][1]["coordinates"][0][0]
+    assert "0" not in index.search((*corner, *corner))  # moved since the tree was built
+
+    for ii in range(20):
+        index.insert(f"more-{ii}", square(300 + ii, 300))
+    assert len(index._pending) < 20 and len(index) == 2020  # rebuilt along the way
+    assert index.containing(305.5, 300.5) == ["more-5"]
+
+    with pytest.raises(ValueError):
+        index.intersecting({"type": "Point", "coordinates": [0, 0]})
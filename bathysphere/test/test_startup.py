@@ -0,0 +1,51 @@
+from subprocess import check_output
+from sys import executable
+from time import perf_counter
+
+from bathysphere import createApp, loadSpecification
+
+
+def test_startup_import():
+    """
+    Importing the package does not build the app, or load the web framework.
+    """
+    script = (
+        "from time import perf_counter; start = perf_counter(); "
+        "import sys, bathysphere; elapsed = perf_counter() - start; "
+        "print('connexion' in sys.modules, 'app' in vars(bathysphere), elapsed)"
+    )
+    loaded, built, elapsed = check_output([executable, "-c", script]).decode().split()
+    print(f"import bathysphere: {float(elapsed):.3f}s")
+    assert loaded == built == "False"
+
+
+def test_startup_specification_cache(tmp_path):
+    """
+    The resolved specification is cached under the hash of the source file.
+    """
+    resolved = loadSpecification("openapi/api.yml", cache=str(tmp_path))
+    cached = list(tmp_path.glob("api-*.json"))
+    assert len(cached) == 1
+    assert loadSpecification("openapi/api.yml", cache=str(tmp_path)) == resolved
+    assert "$ref" not in cached[0].read_text()
+
+
+def test_startup_first_request():
+    """
+    Time building the app and the first request, which does not need the database.
+    """
+    start = perf_counter()
+    app = createApp()
+    built = perf_counter()
+    response = app.app.test_client().get("/api/openapi.json")
+    finished = perf_counter()
+    print(f"create app: {built - start:.3f}s, first request: {finished - built:.3f}s")
+    assert response.status_code == 200
+
+
+def test_startup_models_without_warnings():
+    """
+    Building the slotted model classes does not warn, which it would for methods
+    with a `__class__` cell, like those that use `super`.
+    """
+    check_output([executable, "-W", "error::RuntimeWarning", "-c", "import bathysphere.models"])
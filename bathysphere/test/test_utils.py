@@ -0,0 +1,121 @@
+import pytest
+
+from bathysphere import (
+    RankAccumulator, TimedCache, Meter, UnitOfWork, QueryProfile,
+    normalizeStatement
+)
+from bathysphere.memory import MemoryDriver
+from bathysphere.models import Link, Sensors, Things
+
+
+def test_utils_rank_accumulator():
+    """
+    Rank increments are aggregated in memory, and ignored when disabled.
+    """
+    db = object()
+    counter = RankAccumulator(interval=3600)
+    for _ in range(3):
+        counter.annotate(db, "Things", "Get", "user", ("a", "b", None))
+    first, second = ["Things", "a", "Has", "Sensors", "b"], ["Things", "a", "Has", "Sensors", "c"]
+    counter.traverse(db, (first, first, second, ["Things", "a", "Has", None, None]))
+    assert counter._annotations[(db, "Things", "Get")][("user", "a")] == 3
+    assert counter._traversals[db] == {tuple(first): 2, tuple(second): 1}
+
+    disabled = RankAccumulator(enabled=False)
+    disabled.traverse(db, (first,))
+    assert not disabled._traversals
+
+
+def test_utils_rank_accumulator_flush():
+    """
+    Traversals are written by the uuids of their nodes, one query per kind of relationship.
+    """
+    db = MemoryDriver()
+    counter = RankAccumulator(interval=3600)
+    counter.traverse(db, [["Things", "a", "Has", "Sensors", "b"]] * 2)
+    counter.traverse(db, [["Things", "a", "Linked", "Locations", "c"]])
+    assert counter.flush() == 2
+    statements = db.clear()
+    assert statements[0].query == (
+        "UNWIND $rows AS row MATCH (a:`Things` { uuid: row.a })-[r:`Has`]->"
+        "(b:`Sensors` { uuid: row.b }) SET r.rank = coalesce(r.rank, 0) + row.count"
+    )
+    assert statements[0].parameters == {"rows": [{"a": "a", "b": "b", "count": 2}]}
+    assert len(statements) == 2 and "id(" not in statements[1].query
+
+
+def test_utils_timed_cache():
+    """
+    Cached values expire, are evicted when full, and can be invalidated.
+    """
+    cache = TimedCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.invalidate(lambda value: value == 3) == 1
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+    expired = TimedCache(ttl=-1)
+    expired.put("a", 1)
+    assert expired.get("a") is None
+
+
+def test_utils_meter():
+    """
+    Throughput is the total count over the total time spent.
+    """
+    meter = Meter()
+    meter.record(100, 0.5)
+    meter.record(50, 0.25)
+    meter.reject()
+    assert meter.stats() == {"count": 150, "seconds": 0.75, "rejected": 1, "rate": 200.0}
+
+
+def test_utils_unit_of_work():
+    """
+    Writes are kept for one transaction and discarded on error, and reads are refused.
+    """
+    work = UnitOfWork(db=None)
+    with pytest.raises(RuntimeError):
+        with work:
+            Things(uuid="a").create(db=work)
+            Link(label="Post").join(db=work, nodes=(Things(uuid="a"), Sensors(uuid="b")))
+            assert len(work.methods) == 2
+            raise RuntimeError
+    assert not work.methods
+
+    with pytest.raises(ValueError):
+        Things.load(db=work)
+
+    db = MemoryDriver()
+    with UnitOfWork(db) as work:
+        Things(uuid="a").create(db=work)
+        Things.delete(db=work, pattern={"uuid": "b"})
+    assert [each.mode for each in db.clear()] == ["WRITE", "WRITE"]
+
+
+def test_utils_query_profile():
+    """
+    Statements of a profile are counted with their rows, and repeats are found by
+    their normalized text.
+    """
+    assert normalizeStatement("MATCH (n { name: 'a b', rank: 2 })\n  RETURN n") == (
+        "MATCH (n { name: ?, rank: ? }) RETURN n"
+    )
+    db = MemoryDriver(rules=(("RETURN n, n.uuid", [{"n": {"uuid": "a"}}, {"n": {"uuid": "b"}}]),))
+
+    with QueryProfile() as profile:
+        Things.load(db=db, name="first")
+        for each in "ab":
+            Things.load(db=db, uuid=each)
+        with UnitOfWork(db) as work:
+            Things(uuid="c").create(db=work)
+    stats = profile.stats()
+    assert stats["count"] == 4 and stats["writes"] == 1 and stats["rows"] == 6
+    assert list(stats["repeated"].values()) == [2]
+    assert profile.header().startswith("db;dur=") and "4 queries, 1 repeated" in profile.header()
+
+    Things.load(db=db)
+    assert profile.stats()["count"] == 4
@@ -17,11 +17,22 @@ def cli():
 @click.command()
 @click.option("--port", default=5000, help="Port on which to serve the API")
 @click.option("--dev", default=False, help="")
-def start(port: int, dev: bool):
+@click.option("--workers", default=1, help="Worker processes")
+@click.option("--threads", default=1, help="Concurrent requests per worker")
+def start(port: int, dev: bool, workers: int, threads: int):
     """
     Command to start the graph database access service.
+
+    With more than one thread, workers serve requests concurrently while others wait
+    on the database. Use at most `NEO4J_POOL_SIZE` threads per worker.
+
+    With more than one worker, set `METRICS_DIR` to a directory they share, so that
+    `/api/metrics` includes all of them. Snapshots left by earlier runs are removed.
     """
-    click.secho(f"gunicorn bathysphere:app {'--reload' if dev else ''} --bind 0.0.0.0:{port}", fg="green")
+    concurrency = f"--workers {workers}" + (
+        f" --worker-class gthread --threads {threads}" if threads > 1 else ""
+    )
+    click.secho(f"gunicorn bathysphere:app {'--reload' if dev else ''} {concurrency} --bind 0.0.0.0:{port}", fg="green")
 
 
 @click.command()
@@ -56,13 +67,20 @@ def serve(group: str, port: int):
 @click.option("--kw", default=None, help="Pytest keyword string")
 @click.option("--verbose", default=False, help="Print stuff")
 @click.option("--parallel", default=False, help="Enable parallelism if subset of tests allows it")
-def test(kw: str, verbose: bool, parallel: bool,):
+@click.option("--benchmark", default=None, help="Run benchmarks only, and save results as JSON")
+def test(kw: str, verbose: bool, parallel: bool, benchmark: str):
     """
     Command to run developer tests. This uses `pytest-cov` and `pytest-parallel`.
+
+    Benchmarks use `pytest-benchmark` and the in-memory driver, so they do not need
+    a database. Results are also saved under `.benchmarks` for `pytest-benchmark compare`.
     """
     parallelism = "--workers auto" if parallel else ""
     opt = f"-{'sv' if verbose else ''}k {kw}" if kw else ""
-    cmd = f"pytest {parallelism} --cov-report html:htmlcov --cov=bathysphere {opt} --ignore=data"
+    if benchmark:
+        cmd = f"pytest bathysphere/test/test_benchmark.py --benchmark-json={benchmark} --benchmark-autosave {opt}"
+    else:
+        cmd = f"pytest {parallelism} --cov-report html:htmlcov --cov=bathysphere {opt} --ignore=data"
     click.secho(cmd, fg="green")
 
 
@@ -133,7 +151,7 @@ def providers(host: str, port: int) -> None:
     This is the only way to show and create API keys. 
     """
     from os import getenv
-    from bathysphere import connect, loadAppConfig
+    from bathysphere import getDriver, loadAppConfig
     from bathysphere.models import Providers
 
     appConfig = loadAppConfig()
@@ -144,7 +162,7 @@ def providers(host: str, port: int) -> None:
             f"{secretKeyAlias} should be available in local environment"
         )
 
-    db = connect(host, port, accessKey)
+    db = getDriver(host, port, accessKey)
     if db is None:
         return {"message": "no graph backend"}, 500
 
@@ -187,50 +205,117 @@ def providers(host: str, port: int) -> None:
         click.secho(f"Created {count} access methods, remember to save them!", fg="yellow")
 
 
-# @click.command()
-# @click.argument("source")
-# @click.argument("particle_type")
-# @click.option("--out", default="./particles.csv", help="Output target")
-# @click.option("--mode", default="w+", help="Write(w+) or Append(a)")
-# def parse_ichthyotox(source: str, particle_type: str, out: str, mode: str):
-#     """
-#     Convert lagrangian particle data stored in table format to a format
-#     for ingestion into the databases
-#     """
-#     from csv import writer
-#     from pathlib import Path
-#     from os import listdir
+@click.command()
+@click.option("--host", default="localhost", help="Neo4j instance hostname")
+@click.option("--port", default=7687, help="Neo4j instance `bolt` port")
+def index(host: str, port: int) -> None:
+    """
+    Create the indexes and constraints used by queries, if they do not exist. The
+    point index on `Locations.location` is used for bounding box and radius queries.
+    The unique constraint on `TaskingCapabilities.name` is used to merge them when
+    creating entities.
+    """
+    from os import getenv
+    from neo4j.exceptions import ClientError
+    from bathysphere import getDriver
+    from bathysphere.models import Locations, TaskingCapabilities
 
-#     path = Path(source)
-#     total = 0
-#     with open(out, mode) as target:
-#         csv = writer(target, delimiter=',')
-#         for simulation in listdir(str(path.absolute())):
-#             try:
-#                 _ = int(simulation)
-#             except ValueError:
-#                 continue
-#             filename = "/".join((str(path.absolute()), simulation, source))
-#             try:
-#                 lines = list(reversed(open(filename, "r").readlines()))
-#             except FileNotFoundError:
-#                 continue
-#             while lines:
-#                 q = list(map(str.strip, lines.pop().split()))
-#                 t = q[0]
-#                 q = q[1:]
-#                 records = []
-#                 while q:
-#                     pid, x, y, z = q[:4]
-#                     records.append([simulation, particle_type, t, pid, f"POINT({x} {y} {z})"])
-#                     q = q[4:]
-
-#                 subtotal = len(records)
-#                 total += subtotal
-#                 csv.writerows(records)
-#             click.secho(f"Simulation {simulation} yielded {subtotal} {particle_type} records", fg="blue")
-   
-#     click.secho(f"Processed {total} total {particle_type} records", fg="blue")
+    secretKeyAlias = "NEO4J_ACCESS_KEY"
+    accessKey = getenv(secretKeyAlias)
+    if accessKey is None:
+        raise EnvironmentError(
+            f"{secretKeyAlias} should be available in local environment"
+        )
+
+    db = getDriver(host, port, accessKey)
+    for cls, by in ((Locations, "location"),):
+        cls.addIndex(db, by)
+        click.secho(f"Index on {cls.__name__}({by})", fg="blue")
+
+    for cls, by in ((TaskingCapabilities, "name"),):
+        try:
+            cls.addConstraint(db, by)
+        except ClientError as ex:
+            if "AlreadyExists" not in (ex.code or ""):
+                raise
+        click.secho(f"Unique constraint on {cls.__name__}({by})", fg="blue")
+
+
+@click.command()
+@click.argument("source")
+@click.argument("name")
+@click.option("--host", default="localhost", help="Neo4j instance hostname")
+@click.option("--port", default=7687, help="Neo4j instance `bolt` port")
+@click.option("--crs", default="cartesian", help="Vertex coordinates, `cartesian` or `wgs-84`")
+@click.option("--chunk-size", default=10000, help="Rows written in each transaction")
+def mesh(source: str, name: str, host: str, port: int, crs: str, chunk_size: int) -> None:
+    """
+    Load a triangular mesh from a 2DM or NumPy `.npz` file, as `Nodes` and `Elements`
+    with their topology.
+    """
+    from os import getenv
+    from bathysphere import getDriver
+    from bathysphere.mesh import readMesh, loadMesh
+
+    secretKeyAlias = "NEO4J_ACCESS_KEY"
+    accessKey = getenv(secretKeyAlias)
+    if accessKey is None:
+        raise EnvironmentError(
+            f"{secretKeyAlias} should be available in local environment"
+        )
+
+    vertices, elements = readMesh(source)
+    click.secho(f"Read {len(vertices)} vertices and {len(elements)} elements", fg="yellow")
+    db = getDriver(host, port, accessKey)
+    for step, stats in loadMesh(db, name, vertices, elements, crs, chunk_size).items():
+        click.secho(
+            f"{step}: {stats['count']} in {stats['seconds']:.1f}s ({stats['rate']:.0f}/s)",
+            fg="blue"
+        )
+
+
+@click.command()
+@click.argument("source")
+@click.argument("filename")
+@click.argument("particle_type")
+@click.option("--out", default="./particles.csv", help="Output target")
+@click.option("--mode", default="w", help="Write(w) or Append(a)")
+@click.option("--graph", is_flag=True, help="Load into the graph instead of writing CSV")
+@click.option("--host", default="localhost", help="Neo4j instance hostname")
+@click.option("--port", default=7687, help="Neo4j instance `bolt` port")
+@click.option("--chunk-size", default=10000, help="Rows written in each transaction")
+@click.option("--workers", default=None, type=int, help="Processes, one simulation each")
+def particles(
+    source: str, filename: str, particle_type: str, out: str, mode: str, graph: bool,
+    host: str, port: int, chunk_size: int, workers: int
+) -> None:
+    """
+    Convert lagrangian particle data stored in table format to a format
+    for ingestion into the databases, or load it into the graph.
+
+    Every numbered directory under SOURCE is a simulation, with tracks in FILENAME.
+    """
+    from os import getenv
+    from bathysphere.particles import toCsv, toGraph
+
+    if graph:
+        secretKeyAlias = "NEO4J_ACCESS_KEY"
+        accessKey = getenv(secretKeyAlias)
+        if accessKey is None:
+            raise EnvironmentError(
+                f"{secretKeyAlias} should be available in local environment"
+            )
+        results = toGraph(
+            source, filename, particle_type, host, port, accessKey, chunk_size, workers
+        )
+    else:
+        results = toCsv(source, filename, particle_type, out, mode, workers)
+
+    total = 0
+    for simulation, subtotal in results:
+        total += subtotal
+        click.secho(f"Simulation {simulation} yielded {subtotal} {particle_type} records", fg="blue")
+    click.secho(f"Processed {total} total {particle_type} records", fg="blue")
 
 
 cli.add_command(serve)
@@ -238,6 +323,9 @@ cli.add_command(start)
 cli.add_command(build)
 cli.add_command(up)
 cli.add_command(providers)
+cli.add_command(index)
+cli.add_command(mesh)
+cli.add_command(particles)
 cli.add_command(test)
 
 if __name__ == "__main__":